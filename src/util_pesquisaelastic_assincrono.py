@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+# Execução assíncrona (asyncio) das queries criadas pelo componente PesquisaElasticFacil
+# - PoolConexoesElastic: conexões HTTP/1.1 keep-alive reaproveitadas entre as requisições (asyncio streams,
+#   sem dependências externas), com limite de conexões abertas
+# - ExecutorAssincrono: executa as pesquisas compiladas com limite de concorrência (semáforo),
+#   tempo limite por requisição e cancelamento - a conexão de uma requisição cancelada ou com tempo
+#   esgotado é fechada, e o elastic cancela a pesquisa quando a conexão é fechada
+# - mensagem_erro: converte os erros do elastic e da compilação nas mensagens para o usuário
+#   (ex. maxClauseCount dos curingas, como no serviço de exemplo docs/servico_exemplo.md)
+# O retorno de cada pesquisa tem o formato de documentos_do_retorno e a chave erro quando houver erro
+# Exemplo:
+#   async with ExecutorAssincrono('http://localhost:9200', index='meu_indice', concorrencia=8, timeout=10) as executor:
+#       retorno = await executor.pesquisar('dano adj2 moral')
+#       retornos = await executor.pesquisar_todas([pe1, grupos, ('dano moral', {'size': 10})])
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - pool de conexões, concorrência, tempo limite e mensagens de erro
+# Ver 0.1.1 - 18/10/2026 - corpo das requisições com a query em bytes guardada nas pesquisas (corpo_bytes_da_pesquisa)
+
+import asyncio
+import base64
+import json
+import ssl as _ssl
+from time import perf_counter
+from urllib.parse import urlsplit, quote
+from util_pesquisaelastic_facil import PesquisaElasticFacil
+from util_pesquisaelastic_execucao import corpo_bytes_da_pesquisa, campo_texto_da_pesquisa, documentos_do_retorno
+
+MSG_ERRO_CURINGAS = 'Provavelmente foi usado um curinga * ou ? que faria retornar um número muito grande de termos, simplifique os curingas da consulta.'
+MSG_ERRO_TEMPO = 'A pesquisa passou do tempo limite de {} segundos, simplifique os critérios, os curingas ou as distâncias de proximidade.'
+MSG_ERRO_CONEXAO = 'Não foi possível conectar ao elastic, tente novamente em alguns instantes.'
+MSG_ERRO_ELASTIC = 'Erro na pesquisa: {}'
+ERRO_RESPOSTA_HTTP = 'PoolConexoesElastic: resposta HTTP inválida: {}'
+
+# trechos do erro do elastic (em minúsculas) e a mensagem para o usuário
+ERROS_CURINGAS = ('maxclausecount', 'too_many_clauses', 'too_many_nested_clauses', 'toocomplextodeterminize', 'determinized states')
+
+class ErroHttpElastic(Exception):
+    def __init__(self, status, retorno):
+        self.status = status
+        self.retorno = retorno
+        super().__init__(f'HTTP {status}: {json.dumps(retorno, ensure_ascii=False)[:1000]}')
+
+# motivo do erro do elastic com os caused_by
+def motivo_erro_elastic(retorno):
+    erro = retorno.get('error', retorno) if isinstance(retorno, dict) else retorno
+    if not isinstance(erro, dict):
+        return str(erro)
+    motivos = []
+    while isinstance(erro, dict):
+        if erro.get('reason'):
+            motivos.append(str(erro.get('reason')))
+        for causa in erro.get('root_cause', []) or []:
+            if isinstance(causa, dict) and causa.get('reason'):
+                motivos.append(str(causa.get('reason')))
+        erro = erro.get('caused_by')
+    return ' | '.join(motivos) or json.dumps(erro, ensure_ascii=False)
+
+# mensagem para o usuário do erro da compilação, da requisição ou do elastic
+def mensagem_erro(erro, timeout = None):
+    if isinstance(erro, asyncio.TimeoutError):
+        return MSG_ERRO_TEMPO.format(timeout)
+    if isinstance(erro, (ConnectionError, OSError)):
+        return MSG_ERRO_CONEXAO
+    if isinstance(erro, ErroHttpElastic):
+        motivo = motivo_erro_elastic(erro.retorno)
+    else:
+        # erros da compilação dos critérios já são mensagens para o usuário
+        motivo = str(erro)
+        if isinstance(erro, (ValueError, KeyError)):
+            return motivo.strip("'")
+    _motivo = motivo.lower()
+    if any(_ in _motivo for _ in ERROS_CURINGAS):
+        return MSG_ERRO_CURINGAS
+    return MSG_ERRO_ELASTIC.format(motivo)
+
+###########################################################
+# Pool de conexões HTTP/1.1 keep-alive com o elastic
+# url: http(s)://host:porta - usuario/senha para autenticação básica
+# maximo_conexoes: limite de conexões abertas ao mesmo tempo
+# estatísticas: conexoes_criadas, requisicoes e conexoes_abertas
+#----------------------------------------------------------
+class PoolConexoesElastic():
+    def __init__(self, url = 'http://localhost:9200', maximo_conexoes = 10, usuario = None, senha = None, ssl = None, cabecalhos = None):
+        _url = urlsplit(url)
+        self.https = _url.scheme == 'https'
+        self.host = _url.hostname or 'localhost'
+        self.porta = _url.port or (443 if self.https else 9200)
+        self.ssl = (ssl or _ssl.create_default_context()) if self.https else None
+        self.maximo_conexoes = max(1, int(maximo_conexoes))
+        self.cabecalhos = {'Host': f'{self.host}:{self.porta}', 'Content-Type': 'application/json',
+                           'Accept': 'application/json', 'Connection': 'keep-alive'}
+        if usuario is not None:
+            _auth = base64.b64encode(f'{usuario}:{senha or ""}'.encode('utf-8')).decode('ascii')
+            self.cabecalhos['Authorization'] = f'Basic {_auth}'
+        self.cabecalhos.update(cabecalhos or {})
+        self.__livres__ = []
+        self.__semaforo__ = None
+        self.conexoes_criadas = 0
+        self.conexoes_abertas = 0
+        self.requisicoes = 0
+
+    # o semáforo é criado no loop em execução
+    def __get_semaforo__(self):
+        if self.__semaforo__ is None:
+            self.__semaforo__ = asyncio.Semaphore(self.maximo_conexoes)
+        return self.__semaforo__
+
+    # retorna a conexão e se ela foi reaproveitada do pool
+    async def __abrir__(self, reaproveitar = True):
+        if reaproveitar and self.__livres__:
+            return self.__livres__.pop(), True
+        conexao = await asyncio.open_connection(self.host, self.porta, ssl=self.ssl)
+        self.conexoes_criadas += 1
+        self.conexoes_abertas += 1
+        return conexao, False
+
+    def __fechar__(self, conexao):
+        self.conexoes_abertas -= 1
+        try:
+            conexao[1].close()
+        except Exception:
+            pass
+
+    # retorna (status, retorno json) - a conexão volta ao pool apenas se a resposta foi lida completa
+    async def requisicao(self, metodo, caminho, corpo = None):
+        if isinstance(corpo, (dict, list)):
+            corpo = json.dumps(corpo, ensure_ascii=False)
+        corpo = corpo.encode('utf-8') if isinstance(corpo, str) else (corpo or b'')
+        cabecalhos = dict(self.cabecalhos)
+        cabecalhos['Content-Length'] = str(len(corpo))
+        envio = f'{metodo} {caminho} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in cabecalhos.items()) + '\r\n'
+        async with self.__get_semaforo__():
+            reaproveitar = True
+            while True:
+                conexao, reaproveitada = await self.__abrir__(reaproveitar)
+                manter = False
+                try:
+                    reader, writer = conexao
+                    writer.write(envio.encode('latin-1') + corpo)
+                    await writer.drain()
+                    status, manter, dados = await self.__resposta__(reader)
+                    self.requisicoes += 1
+                    break
+                except ConnectionError:
+                    # conexão do pool fechada pelo elastic (keep-alive expirado): repete com uma nova
+                    if not reaproveitada:
+                        raise
+                    reaproveitar = False
+                finally:
+                    # erro, cancelamento ou tempo limite no meio da resposta: a conexão é descartada
+                    if manter:
+                        self.__livres__.append(conexao)
+                    else:
+                        self.__fechar__(conexao)
+        try:
+            retorno = json.loads(dados.decode('utf-8')) if dados else {}
+        except ValueError:
+            # proxy ou balanceador com resposta em texto
+            retorno = {'error': {'reason': dados.decode('utf-8', errors='replace')[:1000]}}
+        return status, retorno
+
+    async def __resposta__(self, reader):
+        linha = await reader.readline()
+        if not linha:
+            raise ConnectionResetError(ERRO_RESPOSTA_HTTP.format('conexão fechada'))
+        partes = linha.decode('latin-1').split(' ', 2)
+        if len(partes) < 2 or not partes[1].isdigit():
+            raise ConnectionError(ERRO_RESPOSTA_HTTP.format(linha[:100]))
+        status = int(partes[1])
+        cabecalhos = {}
+        while True:
+            linha = await reader.readline()
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        manter = cabecalhos.get('connection', '').lower() != 'close' and partes[0] != 'HTTP/1.0'
+        if cabecalhos.get('transfer-encoding', '').lower() == 'chunked':
+            dados = b''
+            while True:
+                tamanho = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if tamanho == 0:
+                    await reader.readline()
+                    break
+                dados += await reader.readexactly(tamanho)
+                await reader.readline()
+        elif 'content-length' in cabecalhos:
+            dados = await reader.readexactly(int(cabecalhos['content-length']))
+        else:
+            dados = await reader.read()
+            manter = False
+        return status, manter, dados
+
+    async def fechar(self):
+        while self.__livres__:
+            conexao = self.__livres__.pop()
+            self.__fechar__(conexao)
+            try:
+                await conexao[1].wait_closed()
+            except Exception:
+                pass
+
+###########################################################
+# Executor assíncrono das pesquisas
+# conexao: url do elastic ou PoolConexoesElastic
+# concorrencia: pesquisas em execução ao mesmo tempo (semáforo)
+# timeout: segundos de cada requisição (None sem limite)
+# pesquisas: PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada, query (dict) ou critérios (str)
+# opções de cada pesquisa: index, size, from, highlight (True usa o campo de texto da pesquisa), campo_texto e timeout
+#----------------------------------------------------------
+class ExecutorAssincrono():
+    def __init__(self, conexao = 'http://localhost:9200', index = None, concorrencia = 8, timeout = 30, size = 100, highlight = True,
+                 campo_texto = 'texto', **opcoes_pool):
+        self.pool = conexao if isinstance(conexao, PoolConexoesElastic) else \
+                    PoolConexoesElastic(conexao, maximo_conexoes=opcoes_pool.pop('maximo_conexoes', concorrencia), **opcoes_pool)
+        self.index = index
+        self.concorrencia = max(1, int(concorrencia))
+        self.timeout = timeout
+        self.size = size
+        self.highlight = highlight
+        self.campo_texto = campo_texto
+        self.__semaforo__ = None
+        self.pesquisas = 0
+        self.erros = 0
+        self.em_execucao = 0
+        self.maximo_em_execucao = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.fechar()
+
+    async def fechar(self):
+        await self.pool.fechar()
+
+    def __get_semaforo__(self):
+        if self.__semaforo__ is None:
+            self.__semaforo__ = asyncio.Semaphore(self.concorrencia)
+        return self.__semaforo__
+
+    # caminho e corpo (bytes) da requisição _search de uma pesquisa
+    def requisicao_pesquisa(self, pesquisa, index = None, size = None, highlight = None, campo_texto = None, **opcoes):
+        if isinstance(pesquisa, str):
+            pesquisa = PesquisaElasticFacil(pesquisa, campo_texto=campo_texto or self.campo_texto)
+        campo_texto = campo_texto or campo_texto_da_pesquisa(pesquisa)
+        highlight = self.highlight if highlight is None else highlight
+        campo_highlight = (highlight if isinstance(highlight, str) else campo_texto) if highlight else ''
+        size = self.size if size is None else size
+        corpo = corpo_bytes_da_pesquisa(pesquisa, campo_highlight, size, opcoes.get('from'))
+        index = index or self.index
+        caminho = f'/{quote(str(index), safe=",*")}/_search' if index else '/_search'
+        return caminho, corpo, campo_highlight or campo_texto
+
+    # retorna {'documentos', 'total_documentos', 'took', 'segundos'} e erro se houver
+    # timeout -1 usa o timeout do executor e None não limita o tempo
+    # o cancelamento da tarefa (task.cancel()) é propagado e a conexão em uso é fechada
+    async def pesquisar(self, pesquisa, timeout = -1, **opcoes):
+        timeout = self.timeout if timeout == -1 else timeout
+        inicio = perf_counter()
+        async with self.__get_semaforo__():
+            self.pesquisas += 1
+            self.em_execucao += 1
+            self.maximo_em_execucao = max(self.maximo_em_execucao, self.em_execucao)
+            try:
+                caminho, corpo, campo = self.requisicao_pesquisa(pesquisa, **opcoes)
+                status, retorno = await asyncio.wait_for(self.pool.requisicao('POST', caminho, corpo), timeout)
+                if status >= 400:
+                    raise ErroHttpElastic(status, retorno)
+                res = documentos_do_retorno(retorno, campo)
+                res['took'] = retorno.get('took')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.erros += 1
+                res = {'documentos': [], 'total_documentos': 0, 'erro': mensagem_erro(e, timeout)}
+            finally:
+                self.em_execucao -= 1
+        res['segundos'] = perf_counter() - inicio
+        return res
+
+    # executa as pesquisas (ou tuplas (pesquisa, opções)) e retorna os resultados na mesma ordem
+    async def pesquisar_todas(self, pesquisas, **opcoes_padrao):
+        tarefas = []
+        for item in pesquisas:
+            pesquisa, opcoes = item if isinstance(item, tuple) else (item, {})
+            _opcoes = dict(opcoes_padrao)
+            _opcoes.update(opcoes or {})
+            tarefas.append(self.pesquisar(pesquisa, **_opcoes))
+        return await asyncio.gather(*tarefas)
+
+    def resumo(self):
+        return {'pesquisas': self.pesquisas, 'erros': self.erros, 'maximo_em_execucao': self.maximo_em_execucao,
+                'conexoes_criadas': self.pool.conexoes_criadas, 'conexoes_abertas': self.pool.conexoes_abertas,
+                'requisicoes': self.pool.requisicoes}
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Teste Execução assíncrona:
+# - servidor HTTP local no lugar do elastic (ThreadingHTTPServer com keep-alive)
+# - concorrência limitada, conexões reaproveitadas e resultados na ordem das pesquisas
+# - tempo limite, cancelamento e mensagens de erro para o usuário
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil
+from util_pesquisaelastic_canonico import avaliar_query
+from util_pesquisaelastic_assincrono import ExecutorAssincrono, PoolConexoesElastic, ErroHttpElastic, mensagem_erro
+from util_pesquisaelastic_assincrono import MSG_ERRO_CURINGAS, MSG_ERRO_TEMPO, MSG_ERRO_CONEXAO
+
+DOCUMENTOS = {'1': {'texto': 'o dano moral foi comprovado', 'tipo': 'x'},
+              '2': {'texto': 'o dano material e o lento processo', 'tipo': 'y'},
+              '3': {'texto': 'danos morais e esteticos', 'tipo': 'x'}}
+
+ERRO_MAX_CLAUSE = {'error': {'root_cause': [{'type': 'runtime_exception', 'reason': '[texto:/dan.{0,4}o/ ] exceeds maxClauseCount [ Boolean maxClauseCount is set to 1024]'}],
+                             'type': 'search_phase_execution_exception', 'reason': 'all shards failed'}, 'status': 400}
+
+# servidor no lugar do elastic: documentos encontrados com o avaliador local das queries
+# pesquisas com o termo "lento" demoram 0.5s e com "dan????" (dan.{0,4}) retornam o erro de maxClauseCount
+class ElasticLocal(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    conexoes = set()
+    requisicoes = []
+    trava = threading.Lock()
+    em_execucao = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.trava:
+            ElasticLocal.conexoes.add(self.client_address)
+            ElasticLocal.requisicoes.append((self.path, corpo))
+        texto = json.dumps(corpo)
+        if 'lento' in texto:
+            time.sleep(0.5)
+        if 'dan.{0,4}' in texto:
+            return self.responder(400, ERRO_MAX_CLAUSE)
+        hits = [{'_id': k, '_score': 1.0, '_source': dict(v)} for k, v in DOCUMENTOS.items() if avaliar_query(corpo, v)]
+        hits = hits[corpo.get('from', 0):corpo.get('from', 0) + corpo.get('size', 10)]
+        self.responder(200, {'took': 1, 'hits': {'total': {'value': len(hits)}, 'hits': hits}}, chunked = self.path.startswith('/chunked'))
+        # keep-alive expirado: a conexão é fechada sem avisar o cliente
+        self.close_connection = self.path.startswith('/fechar')
+
+    def responder(self, status, retorno, chunked = False):
+        dados = json.dumps(retorno).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(dados), 16):
+                parte = dados[i:i + 16]
+                self.wfile.write(f'{len(parte):x}\r\n'.encode('ascii') + parte + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+class ServidorLocal(ThreadingHTTPServer):
+    daemon_threads = True
+    # conexões fechadas pelo cliente no tempo limite/cancelamento
+    def handle_error(self, request, client_address):
+        pass
+
+class Teste(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.servidor = ServidorLocal(('127.0.0.1', 0), ElasticLocal)
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}'
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def setUp(self):
+        ElasticLocal.conexoes = set()
+        ElasticLocal.requisicoes = []
+
+    def teste_1_pesquisas(self):
+        pesquisas = ['dano adj2 moral', (PesquisaElasticFacil('dano*'), {'size': 1}),
+                     GruposPesquisaElasticFacil('dano* .tipo.(x)'), ({'query': {'term': {'tipo': 'y'}}}, {'highlight': False}),
+                     ('dano*', {'index': 'chunked'})] * 5
+        async def executar():
+            async with ExecutorAssincrono(self.url, index='meu_indice', concorrencia=2) as executor:
+                retornos = await executor.pesquisar_todas(pesquisas)
+                return retornos, executor.resumo(), executor
+        retornos, resumo, executor = asyncio.run(executar())
+        ids = [[_['id'] for _ in r['documentos']] for r in retornos[:5]]
+        self.assertEqual(ids, [['1'], ['1'], ['1', '3'], ['2'], ['1', '2', '3']])
+        for i, retorno in enumerate(retornos):
+            self.assertEqual([_['id'] for _ in retorno['documentos']], ids[i % 5])
+            self.assertFalse('erro' in retorno)
+        # concorrência limitada e conexões reaproveitadas
+        self.assertEqual(resumo['pesquisas'], 25)
+        self.assertEqual(resumo['requisicoes'], 25)
+        self.assertLessEqual(resumo['maximo_em_execucao'], 2)
+        self.assertLessEqual(resumo['conexoes_criadas'], 2)
+        self.assertLessEqual(len(ElasticLocal.conexoes), 2)
+        self.assertEqual(resumo['conexoes_abertas'], resumo['conexoes_criadas'])
+        self.assertEqual(executor.resumo()['conexoes_abertas'], 0)
+        # corpo das requisições com size, highlight e índice
+        caminho, corpo = ElasticLocal.requisicoes[0]
+        self.assertEqual(caminho, '/meu_indice/_search')
+        self.assertEqual(corpo['size'], 100)
+        self.assertTrue('highlight' in corpo)
+        self.assertEqual(sorted({_[0] for _ in ElasticLocal.requisicoes}), ['/chunked/_search', '/meu_indice/_search'])
+        self.assertFalse(any('highlight' in c for _, c in ElasticLocal.requisicoes if c['query'] == {'term': {'tipo': 'y'}}))
+
+    def teste_2_erros(self):
+        async def executar():
+            async with ExecutorAssincrono(self.url, index='meu_indice', timeout=0.2) as executor:
+                retornos = await executor.pesquisar_todas(['dan????', 'lento', '(dano moral', 'dano', ('lento', {'timeout': None})])
+                return retornos, executor.resumo()
+        retornos, resumo = asyncio.run(executar())
+        # a conexão da pesquisa com tempo esgotado foi descartada
+        self.assertEqual(retornos[0]['erro'], MSG_ERRO_CURINGAS)
+        self.assertEqual(retornos[1]['erro'], MSG_ERRO_TEMPO.format(0.2))
+        self.assertTrue('Parênteses' in retornos[2]['erro'])
+        self.assertFalse('erro' in retornos[3])
+        self.assertFalse('erro' in retornos[4])
+        self.assertEqual(resumo['erros'], 3)
+        self.assertEqual(resumo['conexoes_abertas'], resumo['conexoes_criadas'] - 1)
+        # elastic indisponível
+        async def indisponivel():
+            async with ExecutorAssincrono('http://127.0.0.1:1', timeout=2) as executor:
+                return await executor.pesquisar('dano')
+        self.assertEqual(asyncio.run(indisponivel())['erro'], MSG_ERRO_CONEXAO)
+        self.assertEqual(mensagem_erro(ErroHttpElastic(500, {'error': {'reason': 'falha'}})), 'Erro na pesquisa: falha')
+
+    def teste_3_cancelamento(self):
+        async def executar():
+            pool = PoolConexoesElastic(self.url, maximo_conexoes=1)
+            executor = ExecutorAssincrono(pool, index='meu_indice')
+            tarefa = asyncio.create_task(executor.pesquisar('lento'))
+            await asyncio.sleep(0.1)
+            tarefa.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await tarefa
+            abertas = pool.conexoes_abertas
+            # o pool continua disponível com uma nova conexão
+            retorno = await executor.pesquisar('dano adj2 moral')
+            # conexão do pool fechada pelo servidor é substituída
+            await executor.pesquisar('dano', index='fechar')
+            await asyncio.sleep(0.1)
+            repetida = await executor.pesquisar('dano adj2 moral')
+            await executor.fechar()
+            return abertas, retorno, repetida, executor.resumo()
+        abertas, retorno, repetida, resumo = asyncio.run(executar())
+        self.assertEqual(abertas, 0)
+        self.assertEqual([_['id'] for _ in retorno['documentos']], ['1'])
+        self.assertEqual(repetida, dict(retorno, segundos=repetida['segundos']))
+        self.assertEqual(resumo['conexoes_criadas'], 3)
+        self.assertEqual(resumo['erros'], 0)
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks do componente PesquisaElasticFacil
+# - corpus (util_pesquisaelastic_benchmark_corpus.json): critérios com todas as famílias de operadores
+#   ADJ/PROX/COM, curingas, números, aspas, grupos NÃO, CONTÉM automático, .campo.() e ranges
+# - entradas sintéticas para escala: profundidade de parênteses, quantidade de termos e listas de OU
+# - para cada cenário: operações por segundo, latência p50/p99, pico de memória (bytes) e blocos
+#   de memória retidos por pesquisa (alocados na compilação e ainda vivos: query retornada e caches)
+# - os tempos são comparados como razões em relação a uma referência medida no mesmo processo,
+#   intercalada com as medições de cada cenário (funcao_referencia: regex + json sem o componente),
+#   a base vale em outras máquinas e a variação de velocidade da máquina durante a execução se cancela
+#   pico_bytes e blocos_retidos_por_pesquisa são absolutos (dependem apenas da versão do python)
+# - compara com a base gravada (util_pesquisaelastic_benchmark_base.json) e falha se
+#   algum cenário piorar mais que a tolerância (%)
+# - benchmark_tokens: chamadas de regex e tempo por pesquisa com e sem a tabela de tokens (Operadores.tipo_token)
+#   - sem tabela: o token é classificado a cada chamada dos métodos de Operadores
+#   - por pesquisa: a tabela é limpa antes de cada pesquisa (cada token é classificado uma vez por pesquisa)
+#   - com tabela: a tabela é mantida entre as pesquisas
+# Uso:
+#   python util_pesquisaelastic_benchmark.py                  -> roda e compara com a base
+#   python util_pesquisaelastic_benchmark.py --salvar-base    -> roda e grava a nova base
+#   python util_pesquisaelastic_benchmark.py --tolerancia 30 --repeticoes 50
+#   python util_pesquisaelastic_benchmark.py --tokens         -> benchmark da tabela de tokens
+
+import os
+import re
+import gc
+import sys
+import json
+import cProfile
+import pstats
+import tracemalloc
+from time import perf_counter_ns
+from timeit import default_timer as timer
+import util_pesquisaelastic_facil
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, Operadores
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_CORPUS = os.path.join(PASTA, 'util_pesquisaelastic_benchmark_corpus.json')
+ARQUIVO_BASE = os.path.join(PASTA, 'util_pesquisaelastic_benchmark_base.json')
+TOLERANCIA_PADRAO = 25 # % de piora aceita em relação à base
+TAMANHOS_ESCALA = (4, 16, 64)
+# medidas que pioram quando diminuem (as demais pioram quando aumentam)
+MEDIDAS_MAIOR_MELHOR = ('ops_s', 'ops_relativo')
+
+# critérios de exemplo (README)
+CRITERIOS_EXEMPLO = (
+    'dano adj2 "moral" "dano" prox10 "moral" prox5 material mora*',
+    'dano prox5 moral dano adj20 material estetico',
+    'termo1 prox10 termo2 adj3 termo3',
+    'termo1 prox5 termo2 prox10 termo3',
+    '"dano" adj1 "moral" adj1 estético',
+    'estetic?? ou ??ativ? ou mora$',
+    '(aposentadoria adj3 invalidez) ou (pensao prox10 morte) nao professor',
+    'dano e (moral ou material) nao estetico',
+    'art 123.456 adj2 lei 8.112/90',
+    '"dano moral',
+)
+
+def carregar_corpus(arquivo = ARQUIVO_CORPUS):
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+###########################################################
+# Entradas sintéticas para avaliar a escala da compilação
+#----------------------------------------------------------
+# termo0 ou (termo1 e (termo2 ou (... (termoN adj2 finalN))))
+def criterio_profundidade(n):
+    criterio = f'termo{n} adj2 final{n}'
+    for i in range(n-1, -1, -1):
+        op = 'ou' if i % 2 == 0 else 'e'
+        criterio = f'termo{i} {op} ({criterio})'
+    return criterio
+
+# termo0 prox5 termo1 termo2 prox5 termo3 ... (pares de proximidade unidos por E)
+def criterio_tokens(n):
+    return ' '.join(f'termo{i} prox5' if i % 2 == 0 and i < n-1 else f'termo{i}' for i in range(n))
+
+# termo0 ou termo1 ou ... ou termo{n-1}
+def criterio_lista_ou(n):
+    return ' ou '.join(f'termo{i}' for i in range(n))
+
+# referência de velocidade da máquina: tokens com regex e ida e volta em json sem o componente
+RE_REFERENCIA = re.compile(r'\w+|[()"$?*]')
+def funcao_referencia(criterio):
+    tokens = RE_REFERENCIA.findall(criterio)
+    query = {'query': {'bool': {'must': [{'term': {'texto': _}} for _ in tokens]}}}
+    return json.loads(json.dumps(query))
+
+# cenários: nome => (função que compila um critério, critérios)
+def cenarios(corpus = None, tamanhos = TAMANHOS_ESCALA):
+    corpus = carregar_corpus() if corpus is None else corpus
+    campos = corpus.get('campos_disponiveis', {})
+    pesquisa = lambda c: PesquisaElasticFacil(c).criterios_elastic
+    grupos = lambda c: GruposPesquisaElasticFacil(c, campos_disponiveis=campos).as_query()
+    res = {'corpus_pesquisas': (pesquisa, corpus['pesquisas']),
+           'corpus_grupos': (grupos, corpus['grupos'])}
+    for n in tamanhos:
+        res[f'profundidade_{n}'] = (pesquisa, [criterio_profundidade(n)])
+        res[f'tokens_{n}'] = (pesquisa, [criterio_tokens(n)])
+        res[f'lista_ou_{n}'] = (pesquisa, [criterio_lista_ou(n)])
+    return res
+
+###########################################################
+# Medições de um cenário
+# ops_s: pesquisas compiladas por segundo
+# p50_us e p99_us: latência por pesquisa em microssegundos
+# pico_bytes: maior pico de memória alocada em bytes (tracemalloc) ao compilar uma pesquisa do cenário
+# blocos_retidos_por_pesquisa: média de blocos de memória alocados durante a compilação que continuam vivos
+#   depois dela (tracemalloc, com as queries retornadas mantidas) - os temporários ficam no pico_bytes
+#----------------------------------------------------------
+def percentil(valores_ordenados, p):
+    i = min(len(valores_ordenados) - 1, int(len(valores_ordenados) * p / 100))
+    return valores_ordenados[i]
+
+# cada cenário tem pelo menos amostras_minimas medições para estabilizar o p99
+# cada medição é seguida de uma medição da funcao_referencia (ref_ops_s, ref_p50_us, ref_p99_us
+# e razao_p50: mediana das razões entre cada medição e a referência medida junto com ela)
+def medir(funcao, entradas, repeticoes = 100, amostras_minimas = 1000):
+    for entrada in entradas:
+        funcao(entrada) # aquecimento
+    repeticoes = max(repeticoes, -(-amostras_minimas // len(entradas)))
+    tempos, referencias = [], []
+    n_referencia = len(CRITERIOS_EXEMPLO)
+    # como no timeit, o gc não interfere nas medições
+    gc.collect()
+    gc_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeticoes):
+            for entrada in entradas:
+                inicio = perf_counter_ns()
+                funcao(entrada)
+                meio = perf_counter_ns()
+                funcao_referencia(CRITERIOS_EXEMPLO[len(tempos) % n_referencia])
+                fim = perf_counter_ns()
+                tempos.append(meio - inicio)
+                referencias.append(fim - meio)
+    finally:
+        if gc_ativo:
+            gc.enable()
+    razoes = sorted(t / max(1, r) for t, r in zip(tempos, referencias))
+    tempos.sort()
+    referencias.sort()
+    picos = []
+    tracemalloc.start()
+    try:
+        # clear_traces zera a memória e o pico rastreados (reset_peak só existe a partir do python 3.9)
+        for entrada in entradas:
+            tracemalloc.clear_traces()
+            funcao(entrada)
+            picos.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.clear_traces()
+        retornos = [funcao(entrada) for entrada in entradas]
+        blocos = sum(_.count for _ in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del retornos
+    return {'ops_s': round(len(tempos) / (sum(tempos) / 1e9), 1),
+            'p50_us': round(percentil(tempos, 50) / 1000, 1),
+            'p99_us': round(percentil(tempos, 99) / 1000, 1),
+            'pico_bytes': max(picos),
+            'blocos_retidos_por_pesquisa': round(blocos / len(entradas), 1),
+            'ref_ops_s': round(len(referencias) / (sum(referencias) / 1e9), 1),
+            'ref_p50_us': round(percentil(referencias, 50) / 1000, 1),
+            'ref_p99_us': round(percentil(referencias, 99) / 1000, 1),
+            'razao_p50': round(percentil(razoes, 50), 4)}
+
+# medidas absolutas dos cenários (com a referência de cada um)
+def executar_benchmark(repeticoes = 100, corpus = None, tamanhos = TAMANHOS_ESCALA):
+    return {nome: medir(funcao, entradas, repeticoes) for nome, (funcao, entradas) in cenarios(corpus, tamanhos).items()}
+
+# tempos como razões em relação à referência medida junto com cada cenário (gravados na base e comparados)
+def relativizar(resultado):
+    res = {}
+    for nome, m in resultado.items():
+        res[nome] = {'ops_relativo': round(m['ops_s'] / m['ref_ops_s'], 4),
+                     'p50_relativo': m['razao_p50'],
+                     'p99_relativo': round(m['p99_us'] / m['ref_p99_us'], 4),
+                     'pico_bytes': m['pico_bytes'],
+                     'blocos_retidos_por_pesquisa': m['blocos_retidos_por_pesquisa']}
+    return res
+
+###########################################################
+# Comparação com a base gravada
+# retorna a lista de regressões (cenário, medida, base, atual, variação %)
+# ops_s e ops_relativo pioram quando diminuem, as outras medidas pioram quando aumentam
+#----------------------------------------------------------
+def comparar_com_base(resultado, base, tolerancia = TOLERANCIA_PADRAO):
+    regressoes = []
+    for nome, medidas in resultado.items():
+        if nome not in base:
+            continue
+        for medida, valor in medidas.items():
+            valor_base = base[nome].get(medida)
+            if not valor_base:
+                continue
+            variacao = (valor - valor_base) / valor_base * 100
+            piora = -variacao if medida in MEDIDAS_MAIOR_MELHOR else variacao
+            if piora > tolerancia:
+                regressoes.append((nome, medida, valor_base, valor, round(variacao, 1)))
+    return regressoes
+
+def salvar_base(resultado, arquivo = ARQUIVO_BASE):
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2)
+
+def carregar_base(arquivo = ARQUIVO_BASE):
+    if not os.path.isfile(arquivo):
+        return {}
+    with open(arquivo, encoding='utf-8') as f:
+        return json.load(f)
+
+###########################################################
+# Benchmark da tabela de tokens
+#----------------------------------------------------------
+# executa as pesquisas criando a query (limpar_tabela: limpa a tabela de tokens antes de cada pesquisa)
+def executar(criterios, repeticoes, limpar_tabela = False):
+    for _ in range(repeticoes):
+        for criterio in criterios:
+            if limpar_tabela:
+                Operadores.TABELA_TIPOS.clear()
+            PesquisaElasticFacil(criterio).criterios_elastic
+
+# executa as pesquisas e retorna a quantidade de chamadas de métodos de regex (re.Pattern)
+def contar_regex(criterios, repeticoes = 1, limpar_tabela = False):
+    perfil = cProfile.Profile()
+    perfil.enable()
+    executar(criterios, repeticoes, limpar_tabela)
+    perfil.disable()
+    stats = pstats.Stats(perfil).stats
+    return sum(v[1] for k, v in stats.items() if k[2].find('re.Pattern') >= 0)
+
+# tempo médio em microssegundos por pesquisa
+def tempo_por_pesquisa(criterios, repeticoes = 100, limpar_tabela = False):
+    inicio = timer()
+    executar(criterios, repeticoes, limpar_tabela)
+    return (timer() - inicio) / (repeticoes * len(criterios)) * 1e6
+
+# compara a tabela de tokens desativada (classifica o token a cada chamada) e ativa
+def benchmark_tokens(criterios = CRITERIOS_EXEMPLO, repeticoes = 100):
+    tamanho = Operadores.TAMANHO_TABELA_TIPOS
+    res = {}
+    try:
+        for nome, _tamanho, limpar in (('sem tabela', 0, False),
+                                       ('por pesquisa', tamanho or 20000, True),
+                                       ('com tabela', tamanho or 20000, False)):
+            Operadores.TAMANHO_TABELA_TIPOS = _tamanho
+            Operadores.TABELA_TIPOS.clear()
+            executar(criterios, 1) # aquece a tabela
+            regex = contar_regex(criterios, repeticoes, limpar) / (repeticoes * len(criterios))
+            res[nome] = {'regex_por_pesquisa': round(regex, 1),
+                         'us_por_pesquisa': round(tempo_por_pesquisa(criterios, repeticoes, limpar), 1)}
+    finally:
+        Operadores.TAMANHO_TABELA_TIPOS = tamanho
+    return res
+
+if __name__ == "__main__":
+    import argparse
+    util_pesquisaelastic_facil.PRINT_WARNING = False
+    parser = argparse.ArgumentParser(description='Benchmark da compilação de queries do PesquisaElasticFacil')
+    parser.add_argument('--repeticoes', type=int, default=100, help='repetições de cada cenário')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO, help='%% de piora aceita em relação à base')
+    parser.add_argument('--base', default=ARQUIVO_BASE, help='arquivo json com a base de comparação')
+    parser.add_argument('--salvar-base', action='store_true', help='grava o resultado como nova base')
+    parser.add_argument('--tokens', action='store_true', help='benchmark da tabela de tokens')
+    args = parser.parse_args()
+
+    if args.tokens:
+        for nome, valores in benchmark_tokens(repeticoes=args.repeticoes).items():
+            print(f'{nome:>12}: {valores["regex_por_pesquisa"]:>6} chamadas de regex por pesquisa | {valores["us_por_pesquisa"]:>7} us por pesquisa')
+        sys.exit(0)
+
+    absoluto = executar_benchmark(repeticoes=args.repeticoes)
+    resultado = relativizar(absoluto)
+    print(f'{"cenário":<18} {"ops/s":>10} {"p50 us":>9} {"p99 us":>9} {"p50 rel":>8} {"pico bytes":>11} {"retidos":>8}')
+    for nome, m in absoluto.items():
+        print(f'{nome:<18} {m["ops_s"]:>10} {m["p50_us"]:>9} {m["p99_us"]:>9} {m["razao_p50"]:>8} {m["pico_bytes"]:>11} {m["blocos_retidos_por_pesquisa"]:>8}')
+    if args.salvar_base:
+        salvar_base(resultado, args.base)
+        print(f'Base gravada em {args.base}')
+        sys.exit(0)
+    base = carregar_base(args.base)
+    if not base:
+        print(f'Base não encontrada em {args.base}, use --salvar-base para criá-la')
+        sys.exit(0)
+    regressoes = comparar_com_base(resultado, base, args.tolerancia)
+    for nome, medida, valor_base, valor, variacao in regressoes:
+        print(f'REGRESSÃO {nome}.{medida}: base {valor_base} -> {valor} ({variacao:+}%)')
+    if regressoes:
+        sys.exit(1)
+    print(f'Sem regressões acima de {args.tolerancia}% em relação à base')
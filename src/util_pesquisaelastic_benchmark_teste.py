@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Teste Benchmark:
+# - corpus e entradas sintéticas compilam sem erros
+# - comparação com a base identifica as regressões acima da tolerância
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+import util_pesquisaelastic_facil
+from util_pesquisaelastic_benchmark import cenarios, medir, comparar_com_base, carregar_base, relativizar
+
+# base, resultado, tolerância, regressões esperadas (cenário, medida)
+TESTES_COMPARACAO = (
+    ({'a': {'ops_s': 100, 'p99_us': 10}}, {'a': {'ops_s': 90, 'p99_us': 11}}, 25, []),
+    ({'a': {'ops_s': 100, 'p99_us': 10}}, {'a': {'ops_s': 70, 'p99_us': 11}}, 25, [('a', 'ops_s')]),
+    ({'a': {'ops_s': 100, 'p99_us': 10}}, {'a': {'ops_s': 200, 'p99_us': 13}}, 25, [('a', 'p99_us')]),
+    ({'a': {'ops_s': 100, 'pico_bytes': 1000}}, {'a': {'ops_s': 100, 'pico_bytes': 1200}}, 10, [('a', 'pico_bytes')]),
+    ({}, {'a': {'ops_s': 1}}, 25, []),
+    ({'a': {'ops_relativo': 0.5, 'p50_relativo': 2.0}}, {'a': {'ops_relativo': 0.3, 'p50_relativo': 2.1}}, 25, [('a', 'ops_relativo')]),
+    ({'a': {'ops_relativo': 0.5, 'blocos_retidos_por_pesquisa': 20}}, {'a': {'ops_relativo': 0.6, 'blocos_retidos_por_pesquisa': 30}}, 25, [('a', 'blocos_retidos_por_pesquisa')]),
+)
+
+class Teste(unittest.TestCase):
+
+    def teste_1_cenarios(self):
+        util_pesquisaelastic_facil.PRINT_WARNING = False
+        for nome, (funcao, entradas) in cenarios(tamanhos=(2, 8)).items():
+            with self.subTest(f'Cenário {nome}'):
+                for entrada in entradas:
+                    self.assertIsNotNone(funcao(entrada))
+        funcao, entradas = cenarios(tamanhos=())['corpus_pesquisas']
+        res = medir(funcao, entradas[:2], repeticoes=2, amostras_minimas=4)
+        self.assertEqual(set(res.keys()), {'ops_s', 'p50_us', 'p99_us', 'pico_bytes', 'blocos_retidos_por_pesquisa',
+                                           'ref_ops_s', 'ref_p50_us', 'ref_p99_us', 'razao_p50'})
+        self.assertLessEqual(res['p50_us'], res['p99_us'])
+        self.assertGreater(res['blocos_retidos_por_pesquisa'], 0)
+        # a base gravada tem todos os cenários com os tempos relativos à referência
+        base = carregar_base()
+        self.assertEqual(set(base.keys()), set(cenarios().keys()))
+        self.assertTrue(all(set(_) == {'ops_relativo', 'p50_relativo', 'p99_relativo', 'pico_bytes', 'blocos_retidos_por_pesquisa'} for _ in base.values()))
+
+    def teste_3_relativo(self):
+        # a mesma máquina duas vezes mais lenta tem os mesmos valores relativos
+        rapida = {'a': {'ops_s': 250, 'p50_us': 40, 'p99_us': 100, 'pico_bytes': 500, 'blocos_retidos_por_pesquisa': 12,
+                        'ref_ops_s': 1000, 'ref_p50_us': 10, 'ref_p99_us': 20, 'razao_p50': 4.0}}
+        lenta = {nome: dict(m, ops_s=m['ops_s'] / 2, p50_us=m['p50_us'] * 2, p99_us=m['p99_us'] * 2,
+                            ref_ops_s=m['ref_ops_s'] / 2, ref_p50_us=m['ref_p50_us'] * 2, ref_p99_us=m['ref_p99_us'] * 2)
+                 for nome, m in rapida.items()}
+        self.assertEqual(relativizar(rapida), relativizar(lenta))
+        self.assertEqual(relativizar(rapida), {'a': {'ops_relativo': 0.25, 'p50_relativo': 4.0, 'p99_relativo': 5.0,
+                                                     'pico_bytes': 500, 'blocos_retidos_por_pesquisa': 12}})
+        self.assertEqual(comparar_com_base(relativizar(lenta), relativizar(rapida)), [])
+
+    def teste_2_comparacao(self):
+        for i, teste in enumerate(TESTES_COMPARACAO):
+            with self.subTest(f'Comparação {i}'):
+                base, resultado, tolerancia, esperado = teste
+                regressoes = comparar_com_base(resultado, base, tolerancia)
+                self.assertEqual([(_[0], _[1]) for _ in regressoes], esperado)
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
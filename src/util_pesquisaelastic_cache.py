@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+# Cache das respostas do elastic para as queries criadas pelo componente PesquisaElasticFacil
+# - chave_resposta: hash (sha256) do json canônico da query (chaves ordenadas) com index, size, from e highlight
+#   canonizar=True usa também a forma canônica (util_pesquisaelastic_canonico) - os documentos encontrados
+#   são os mesmos mas o score pode mudar, use apenas quando a ordem não depender do score
+# - BackendMemoria e BackendArquivo: armazenamento das respostas com limite de quantidade e de bytes,
+#   removendo as menos usadas recentemente
+# - CacheRespostasElastic: ttl e invalidação pela geração do índice - o chamador informa um token que muda
+#   a cada refresh/carga do índice (ex. data da última carga, _seq_no máximo, contador de refresh)
+#   e as respostas de gerações anteriores são descartadas
+# - estatisticas(): hits, misses, hit_rate, expirados, invalidados, evictions e took_economizado
+#   (soma do took em ms das respostas servidas pelo cache, tempo de cluster economizado)
+# Respostas com timed_out ou falhas de shards não são armazenadas
+# Exemplo:
+#   cache = CacheRespostasElastic(BackendArquivo('./cache_respostas'), ttl=600)
+#   cache.atualizar_geracao('2026-10-18 06:00', index='meu_indice')
+#   retorno = cache.pesquisar(es, pe, 'meu_indice', size=20, highlight=True)
+#   print(cache.estatisticas())
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - backends memória e arquivo, ttl e geração do índice
+# Ver 0.1.1 - 18/10/2026 - ttl=0 expira as respostas (apenas None não expira)
+
+import os
+import json
+import hashlib
+from time import time
+from threading import Lock
+from collections import OrderedDict
+from util_pesquisaelastic_canonico import canonizar_query
+from util_pesquisaelastic_execucao import query_da_pesquisa, campo_texto_da_pesquisa
+
+###########################################################
+# Chave das respostas
+# highlight: campo do highlight, True (campo de texto da pesquisa) ou ConfigHighlight (usa chave())
+#----------------------------------------------------------
+def chave_resposta(query, index = None, size = None, desde = None, highlight = None, canonizar = False):
+    if canonizar:
+        query = canonizar_query(query)
+    if hasattr(highlight, 'chave'):
+        highlight = highlight.chave()
+    if isinstance(index, (list, tuple)):
+        index = ','.join(sorted(map(str, index)))
+    dados = json.dumps([query, index, size, desde, highlight], sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(dados.encode('utf-8')).hexdigest()
+
+# respostas incompletas não são armazenadas
+def resposta_completa(retorno):
+    if not isinstance(retorno, dict) or 'error' in retorno or retorno.get('timed_out'):
+        return False
+    return not (retorno.get('_shards') or {}).get('failed')
+
+###########################################################
+# Backends - itens: chave >> (validade, geracao, dados json em bytes)
+# tamanho_maximo: quantidade de respostas e tamanho_maximo_bytes: soma dos bytes das respostas (None sem limite)
+# guardar retorna a quantidade de respostas removidas para respeitar os limites
+#----------------------------------------------------------
+class BackendMemoria():
+    def __init__(self, tamanho_maximo = 1000, tamanho_maximo_bytes = None):
+        self.tamanho_maximo = max(1, int(tamanho_maximo))
+        self.tamanho_maximo_bytes = tamanho_maximo_bytes
+        self.__itens__ = OrderedDict()
+        self.tamanho_bytes = 0
+
+    def __len__(self):
+        return len(self.__itens__)
+
+    def obter(self, chave):
+        item = self.__itens__.get(chave)
+        if item is not None:
+            self.__itens__.move_to_end(chave)
+        return item
+
+    def guardar(self, chave, validade, geracao, dados):
+        self.remover(chave)
+        self.__itens__[chave] = (validade, geracao, dados)
+        self.tamanho_bytes += len(dados)
+        removidos = 0
+        while len(self.__itens__) > 1 and (len(self.__itens__) > self.tamanho_maximo or
+                                           (self.tamanho_maximo_bytes and self.tamanho_bytes > self.tamanho_maximo_bytes)):
+            _, item = self.__itens__.popitem(last=False)
+            self.tamanho_bytes -= len(item[2])
+            removidos += 1
+        return removidos
+
+    def remover(self, chave):
+        item = self.__itens__.pop(chave, None)
+        if item is not None:
+            self.tamanho_bytes -= len(item[2])
+
+    def limpar(self):
+        self.__itens__.clear()
+        self.tamanho_bytes = 0
+
+# um arquivo por resposta (<chave>.json) - a data de modificação registra o último uso
+# a escrita usa um arquivo temporário e os.replace para não deixar respostas incompletas
+class BackendArquivo():
+    def __init__(self, pasta, tamanho_maximo = 10000, tamanho_maximo_bytes = None):
+        self.pasta = pasta
+        self.tamanho_maximo = max(1, int(tamanho_maximo))
+        self.tamanho_maximo_bytes = tamanho_maximo_bytes
+        os.makedirs(pasta, exist_ok=True)
+
+    def __arquivo__(self, chave):
+        return os.path.join(self.pasta, f'{chave}.json')
+
+    def __arquivos__(self):
+        res = []
+        for nome in os.listdir(self.pasta):
+            if not nome.endswith('.json'):
+                continue
+            try:
+                info = os.stat(os.path.join(self.pasta, nome))
+            except FileNotFoundError:
+                continue
+            res.append((info.st_mtime_ns, info.st_size, nome))
+        return res
+
+    def __len__(self):
+        return len(self.__arquivos__())
+
+    @property
+    def tamanho_bytes(self):
+        return sum(_[1] for _ in self.__arquivos__())
+
+    def obter(self, chave):
+        arquivo = self.__arquivo__(chave)
+        try:
+            with open(arquivo, 'rb') as f:
+                cabecalho = json.loads(f.readline())
+                dados = f.read()
+            os.utime(arquivo)
+        except (FileNotFoundError, ValueError):
+            return None
+        return (cabecalho.get('validade'), cabecalho.get('geracao'), dados)
+
+    def guardar(self, chave, validade, geracao, dados):
+        arquivo = self.__arquivo__(chave)
+        temporario = f'{arquivo}.{os.getpid()}.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(json.dumps({'validade': validade, 'geracao': geracao}).encode('utf-8') + b'\n')
+            f.write(dados)
+        os.replace(temporario, arquivo)
+        # a resposta recém gravada não é removida
+        arquivos = sorted(self.__arquivos__())
+        quantidade = len(arquivos)
+        total_bytes = sum(_[1] for _ in arquivos)
+        arquivos = [_ for _ in arquivos if _[2] != f'{chave}.json']
+        removidos = 0
+        while arquivos and (quantidade > self.tamanho_maximo or
+                            (self.tamanho_maximo_bytes and total_bytes > self.tamanho_maximo_bytes)):
+            _, tamanho, nome = arquivos.pop(0)
+            self.remover(nome[:-5])
+            quantidade -= 1
+            total_bytes -= tamanho
+            removidos += 1
+        return removidos
+
+    def remover(self, chave):
+        try:
+            os.remove(self.__arquivo__(chave))
+        except FileNotFoundError:
+            pass
+
+    def limpar(self):
+        for _, _, nome in self.__arquivos__():
+            self.remover(nome[:-5])
+
+###########################################################
+# Cache das respostas
+# backend: BackendMemoria (padrão) ou BackendArquivo
+# ttl: segundos de validade das respostas (None sem limite, 0 não reaproveita as respostas)
+# canonizar: usa a forma canônica da query na chave (ver chave_resposta)
+#----------------------------------------------------------
+class CacheRespostasElastic():
+    def __init__(self, backend = None, ttl = 300, canonizar = False):
+        self.backend = backend if backend is not None else BackendMemoria()
+        self.ttl = ttl
+        self.canonizar = canonizar
+        self.geracoes = {} # index: token da geração (None para todos os índices)
+        self.__lock__ = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.invalidados = 0
+        self.evictions = 0
+        self.took_economizado = 0
+
+    # token da geração do índice - as respostas de outras gerações são descartadas
+    def atualizar_geracao(self, geracao, index = None):
+        with self.__lock__:
+            self.geracoes[self.__nome_index__(index)] = None if geracao is None else str(geracao)
+
+    def __nome_index__(self, index):
+        if isinstance(index, (list, tuple)):
+            return ','.join(sorted(map(str, index)))
+        return index
+
+    def __geracao__(self, index):
+        index = self.__nome_index__(index)
+        return self.geracoes.get(index, self.geracoes.get(None))
+
+    def chave(self, query, index = None, size = None, desde = None, highlight = None):
+        return chave_resposta(query, index=index, size=size, desde=desde, highlight=highlight, canonizar=self.canonizar)
+
+    # retorna a resposta armazenada ou None
+    def get(self, query, index = None, size = None, desde = None, highlight = None):
+        chave = self.chave(query, index, size, desde, highlight)
+        with self.__lock__:
+            item = self.backend.obter(chave)
+            if item is not None:
+                validade, geracao, dados = item
+                if geracao != self.__geracao__(index):
+                    self.backend.remover(chave)
+                    self.invalidados += 1
+                elif validade is not None and validade <= time():
+                    self.backend.remover(chave)
+                    self.expirados += 1
+                else:
+                    retorno = json.loads(dados.decode('utf-8'))
+                    self.hits += 1
+                    self.took_economizado += int(retorno.get('took') or 0)
+                    return retorno
+            self.misses += 1
+        return None
+
+    # armazena a resposta completa do elastic - retorna True se foi armazenada
+    def put(self, query, retorno, index = None, size = None, desde = None, highlight = None):
+        if not resposta_completa(retorno):
+            return False
+        chave = self.chave(query, index, size, desde, highlight)
+        dados = json.dumps(retorno, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        validade = None if self.ttl is None else time() + self.ttl
+        with self.__lock__:
+            self.evictions += self.backend.guardar(chave, validade, self.__geracao__(index), dados)
+        return True
+
+    # executa a pesquisa com cliente.search(index, body) apenas se a resposta não estiver no cache
+    # pesquisa: PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada ou a query (dict)
+    # highlight: True usa o campo de texto da pesquisa ou o nome do campo
+    def pesquisar(self, cliente, pesquisa, index, size = None, desde = None, highlight = None):
+        campo_highlight = (highlight if isinstance(highlight, str) else campo_texto_da_pesquisa(pesquisa)) if highlight else ''
+        corpo = dict(query_da_pesquisa(pesquisa, campo_highlight))
+        if size is not None:
+            corpo['size'] = size
+        if desde is not None:
+            corpo['from'] = desde
+        retorno = self.get(corpo, index)
+        if retorno is None:
+            retorno = cliente.search(index=index, body=corpo)
+            self.put(corpo, retorno, index)
+        return retorno
+
+    def clear(self):
+        with self.__lock__:
+            self.backend.limpar()
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {'tamanho': len(self.backend), 'tamanho_bytes': self.backend.tamanho_bytes,
+                'hits': self.hits, 'misses': self.misses, 'expirados': self.expirados,
+                'invalidados': self.invalidados, 'evictions': self.evictions,
+                'took_economizado': self.took_economizado,
+                'hit_rate': self.hits / total if total else 0.0}
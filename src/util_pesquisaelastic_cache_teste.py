@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Teste Cache de respostas:
+# - chave das respostas com o json canônico, index, size, from e highlight
+# - backends memória e arquivo com limite de quantidade e de bytes (menos usadas recentemente)
+# - ttl, geração do índice, respostas incompletas e estatísticas
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import os
+import json
+import operator
+import tempfile
+import unittest
+from unittest.mock import patch
+from util_pesquisaelastic_facil import PesquisaElasticFacil, CacheQueriesElastic, ConfigHighlight
+from util_pesquisaelastic_cache import CacheRespostasElastic, BackendMemoria, BackendArquivo, chave_resposta
+import util_pesquisaelastic_cache
+
+QUERY_A = {'query': {'bool': {'must': [{'term': {'texto': 'dano'}}, {'term': {'texto': 'moral'}}]}}}
+QUERY_A_ORDEM = json.loads('{"query": {"bool": {"must": [{"term": {"texto": "dano"}}, {"term": {"texto": "moral"}}]}}}')
+
+# query, opções, mesma chave da QUERY_A sem opções
+TESTES_CHAVE = (
+    (QUERY_A_ORDEM, {}, True),
+    ({'size': 10, **QUERY_A}, {}, False),
+    (QUERY_A, {'index': 'outro'}, False),
+    (QUERY_A, {'size': 10}, False),
+    (QUERY_A, {'desde': 10}, False),
+    (QUERY_A, {'highlight': 'texto'}, False),
+    (QUERY_A, {'highlight': ConfigHighlight()}, False),
+    ({'query': {'bool': {'must': [{'term': {'texto': 'moral'}}, {'term': {'texto': 'dano'}}]}}}, {}, False),
+)
+
+# cliente elastic com as respostas contadas
+class ElasticContador():
+    def __init__(self, timed_out = False):
+        self.buscas = []
+        self.timed_out = timed_out
+
+    def search(self, index, body):
+        self.buscas.append((index, body))
+        return {'took': 15, 'timed_out': self.timed_out, '_shards': {'total': 1, 'failed': 0},
+                'hits': {'total': {'value': 1}, 'hits': [{'_id': str(len(self.buscas)), '_source': {'texto': 'dano'}}]}}
+
+def resposta(n, tamanho = 10):
+    return {'took': n, 'hits': {'hits': [{'_id': str(n), '_source': {'texto': 'x' * tamanho}}]}}
+
+class Teste(unittest.TestCase):
+
+    def teste_1_chave(self):
+        chave = chave_resposta(QUERY_A)
+        for query, opcoes, esperado in TESTES_CHAVE:
+            with self.subTest(f'Chave: {query} {opcoes}'):
+                self.assertEqual(chave_resposta(query, **opcoes) == chave, esperado)
+        # a forma canônica agrupa critérios equivalentes
+        a = PesquisaElasticFacil(':dano OU moral OU dano').criterios_elastic
+        b = PesquisaElasticFacil(':moral OU dano').criterios_elastic
+        self.assertNotEqual(chave_resposta(a), chave_resposta(b))
+        self.assertEqual(chave_resposta(a, canonizar=True), chave_resposta(PesquisaElasticFacil(':dano OU moral').criterios_elastic, canonizar=True))
+        # queries imutáveis do cache de queries
+        compilada = CacheQueriesElastic().get_pesquisa('dano E moral')
+        self.assertEqual(chave_resposta(compilada.criterios_elastic), chave_resposta(json.loads(json.dumps(compilada.criterios_elastic))))
+
+    def teste_2_backends(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            for backend in (BackendMemoria(tamanho_maximo=3), BackendArquivo(pasta, tamanho_maximo=3)):
+                with self.subTest(f'Backend: {type(backend).__name__}'):
+                    cache = CacheRespostasElastic(backend, ttl=None)
+                    for i in range(3):
+                        cache.put({'q': i}, resposta(i))
+                    # a resposta 0 foi usada e a 1 é a menos usada recentemente
+                    self.assertEqual(cache.get({'q': 0}), resposta(0))
+                    cache.put({'q': 3}, resposta(3))
+                    self.assertEqual([cache.get({'q': i}) is not None for i in range(4)], [True, False, True, True])
+                    self.assertEqual(cache.estatisticas()['evictions'], 1)
+                    self.assertEqual(len(backend), 3)
+                    # limite de bytes
+                    backend.tamanho_maximo_bytes = backend.tamanho_bytes
+                    cache.put({'q': 4}, resposta(4, tamanho=100))
+                    self.assertLessEqual(backend.tamanho_bytes, backend.tamanho_maximo_bytes + 200)
+                    self.assertEqual(cache.get({'q': 4}), resposta(4, tamanho=100))
+                    self.assertLess(len(backend), 3)
+                    # uma resposta maior que o limite continua armazenada sozinha
+                    backend.tamanho_maximo_bytes = 10
+                    cache.put({'q': 5}, resposta(5, tamanho=100))
+                    self.assertEqual(len(backend), 1)
+                    cache.clear()
+                    self.assertEqual((len(backend), backend.tamanho_bytes), (0, 0))
+            # respostas gravadas por outro processo são lidas do arquivo
+            BackendArquivo(pasta).guardar(chave_resposta({'q': 9}), None, None, json.dumps(resposta(9)).encode('utf-8'))
+            self.assertEqual(CacheRespostasElastic(BackendArquivo(pasta)).get({'q': 9}), resposta(9))
+            self.assertEqual([_ for _ in os.listdir(pasta) if _.endswith('.tmp')], [])
+
+    def teste_3_ttl_geracao(self):
+        agora = [1000.0]
+        with patch.object(util_pesquisaelastic_cache, 'time', lambda: agora[0]):
+            cache = CacheRespostasElastic(ttl=60)
+            cache.atualizar_geracao('g1', index='indice')
+            cache.put(QUERY_A, resposta(1), index='indice')
+            cache.put(QUERY_A, resposta(2), index='outro')
+            self.assertEqual(cache.get(QUERY_A, index='indice'), resposta(1))
+            agora[0] += 61
+            self.assertEqual(cache.get(QUERY_A, index='indice'), None)
+            self.assertEqual(cache.estatisticas()['expirados'], 1)
+            # nova geração do índice descarta apenas as respostas do índice
+            cache.put(QUERY_A, resposta(3), index='indice')
+            cache.atualizar_geracao('g2', index='indice')
+            self.assertEqual(cache.get(QUERY_A, index='indice'), None)
+            self.assertEqual(cache.get(QUERY_A, index='outro'), None) # expirada
+            cache.put(QUERY_A, resposta(4), index='outro')
+            cache.atualizar_geracao('g2', index='indice')
+            self.assertEqual(cache.get(QUERY_A, index='outro'), resposta(4))
+            # geração padrão dos índices sem geração própria
+            cache.atualizar_geracao('geral')
+            self.assertEqual(cache.get(QUERY_A, index='outro'), None)
+            self.assertEqual(cache.estatisticas()['invalidados'], 2)
+            # ttl=0 não reaproveita e apenas None não expira
+            cache = CacheRespostasElastic(ttl=0)
+            cache.put(QUERY_A, resposta(5))
+            self.assertEqual(cache.get(QUERY_A), None)
+            cache = CacheRespostasElastic(ttl=None)
+            cache.put(QUERY_A, resposta(6))
+            agora[0] += 10 ** 9
+            self.assertEqual(cache.get(QUERY_A), resposta(6))
+        # o cache não é um inteiro para o protocolo __index__
+        with self.assertRaises(TypeError):
+            operator.index(CacheRespostasElastic())
+
+    def teste_4_pesquisar(self):
+        cliente = ElasticContador()
+        cache = CacheRespostasElastic()
+        pe = PesquisaElasticFacil('dano adj2 moral')
+        for _ in range(4):
+            retorno = cache.pesquisar(cliente, pe, 'indice', size=20, highlight=True)
+        cache.pesquisar(cliente, pe, 'indice', size=20)
+        cache.pesquisar(cliente, pe, 'indice', size=20, highlight='titulo')
+        self.assertEqual(len(cliente.buscas), 3)
+        self.assertEqual(retorno['hits']['hits'][0]['_id'], '1')
+        index, corpo = cliente.buscas[0]
+        self.assertEqual((index, corpo['size'], list(corpo['highlight']['fields'])), ('indice', 20, ['texto']))
+        self.assertEqual(list(cliente.buscas[2][1]['highlight']['fields']), ['titulo'])
+        # a resposta do cache é uma cópia
+        retorno['hits']['hits'].clear()
+        self.assertEqual(len(cache.pesquisar(cliente, pe, 'indice', size=20, highlight=True)['hits']['hits']), 1)
+        estatisticas = cache.estatisticas()
+        self.assertEqual((estatisticas['hits'], estatisticas['misses'], estatisticas['took_economizado']), (4, 3, 60))
+        self.assertAlmostEqual(estatisticas['hit_rate'], 4 / 7)
+        # respostas incompletas não são armazenadas
+        cliente = ElasticContador(timed_out=True)
+        cache.pesquisar(cliente, {'query': {'match_all': {}}}, 'indice')
+        cache.pesquisar(cliente, {'query': {'match_all': {}}}, 'indice')
+        self.assertEqual(len(cliente.buscas), 2)
+        self.assertFalse(cache.put(QUERY_A, {'error': 'x'}))
+        self.assertFalse(cache.put(QUERY_A, {'_shards': {'failed': 1}}))
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
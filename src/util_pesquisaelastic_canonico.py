@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+# Forma canônica das queries criadas pelo componente PesquisaElasticFacil
+# - canonizar_query: simplifica a query sem alterar os documentos encontrados
+#   - bool dentro de must/filter sem should é incorporado ao bool externo (must, filter e must_not)
+#   - bool com apenas should dentro de should ou must_not é incorporado ao should ou must_not externo
+#   - cláusulas repetidas em must, filter, should e must_not são removidas
+#   - term do mesmo campo em should ou must_not são agrupados em um terms
+#   - bool com uma única cláusula em must, filter ou should é substituído pela cláusula
+# - relatorio_canonizacao: tamanho (bytes do json) e cláusulas antes e depois
+# - avaliar_query: avaliador local de queries em documentos tokenizados, usado para
+#   conferir que a query canônica encontra os mesmos documentos (verificar_equivalencia)
+# O score pode mudar (terms tem score constante e should opcionais são agrupados),
+# os documentos encontrados não mudam.
+# Exemplo:
+#   query, relatorio = canonizar(pe.criterios_elastic)
+#   print(relatorio['reducao_bytes'])
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - forma canônica e avaliador local
+# Ver 0.1.1 - 18/10/2026 - should obrigatório sem must/filter e repetições do should com minimum_should_match
+
+import re
+import json
+import random
+from util_pesquisaelastic_facil import contar_clausulas
+
+CHAVES_BOOL = ('must', 'filter', 'should', 'must_not')
+
+# chave de comparação das cláusulas (a ordem das chaves não altera a cláusula)
+def _chave(clausula):
+    return json.dumps(clausula, sort_keys=True, ensure_ascii=False)
+
+###########################################################
+# Forma canônica
+#----------------------------------------------------------
+def canonizar_query(query):
+    if isinstance(query, dict) and 'query' in query:
+        res = dict(query)
+        res['query'] = _canonizar(query['query'])
+        return res
+    return _canonizar(query)
+
+def canonizar(query):
+    canonica = canonizar_query(query)
+    return canonica, relatorio_canonizacao(query, canonica)
+
+def relatorio_canonizacao(antes, depois):
+    bytes_antes = len(_chave(antes).encode('utf-8'))
+    bytes_depois = len(_chave(depois).encode('utf-8'))
+    return {'bytes_antes': bytes_antes, 'bytes_depois': bytes_depois,
+            'clausulas_antes': contar_clausulas(antes), 'clausulas_depois': contar_clausulas(depois),
+            'reducao_bytes': round((bytes_antes - bytes_depois) / bytes_antes * 100, 1) if bytes_antes else 0.0}
+
+def _canonizar(no):
+    if isinstance(no, (list, tuple)):
+        return [_canonizar(_) for _ in no]
+    if not isinstance(no, dict):
+        return no
+    res = {k: _canonizar(v) for k, v in no.items()}
+    if isinstance(res.get('bool'), dict) and len(res) == 1:
+        return _canonizar_bool(res['bool'])
+    return res
+
+# bool sem opções (minimum_should_match, boost, etc) - pode ser incorporado ou substituído
+def _bool_simples(clausula):
+    if not isinstance(clausula, dict) or len(clausula) != 1 or not isinstance(clausula.get('bool'), dict):
+        return None
+    _bool = clausula['bool']
+    return _bool if all(k in CHAVES_BOOL for k in _bool) else None
+
+def _canonizar_bool(_bool):
+    opcoes = {k: v for k, v in _bool.items() if k not in CHAVES_BOOL}
+    grupos = {k: list(_bool.get(k) or []) for k in CHAVES_BOOL}
+    for k in CHAVES_BOOL:
+        if isinstance(_bool.get(k), dict):
+            grupos[k] = [_bool[k]]
+    # incorpora os bools internos
+    originais = {k: list(grupos[k]) for k in CHAVES_BOOL}
+    for chave in ('must', 'filter'):
+        novos = []
+        for clausula in grupos[chave]:
+            interno = _bool_simples(clausula)
+            if interno is not None and not interno.get('should'):
+                novos.extend(_lista(interno.get('must')) if chave == 'must' else _lista(interno.get('must')) + _lista(interno.get('filter')))
+                if chave == 'must':
+                    grupos['filter'].extend(_lista(interno.get('filter')))
+                grupos['must_not'].extend(_lista(interno.get('must_not')))
+            else:
+                novos.append(clausula)
+        grupos[chave] = novos
+    # sem must/filter o should passa a ser obrigatório - mantém os bools internos
+    if originais['should'] and 'minimum_should_match' not in opcoes and not (grupos['must'] or grupos['filter']):
+        grupos = originais
+    for chave in ('should', 'must_not'):
+        novos = []
+        for clausula in grupos[chave]:
+            interno = _bool_simples(clausula)
+            if interno is not None and list(interno) == ['should'] and not (chave == 'should' and 'minimum_should_match' in opcoes):
+                novos.extend(_lista(interno['should']))
+            else:
+                novos.append(clausula)
+        grupos[chave] = novos
+    # remove repetidas e agrupa os terms (com minimum_should_match as repetições do should contam)
+    for chave in CHAVES_BOOL:
+        if chave != 'should' or 'minimum_should_match' not in opcoes:
+            grupos[chave] = _sem_repetidas(grupos[chave])
+    if 'minimum_should_match' not in opcoes:
+        grupos['should'] = _agrupar_terms(grupos['should'])
+    grupos['must_not'] = _agrupar_terms(grupos['must_not'])
+    # uma única cláusula obrigatória ou opcional
+    if not opcoes:
+        ativos = [k for k in CHAVES_BOOL if grupos[k]]
+        if len(ativos) == 1 and ativos[0] in ('must', 'should') and len(grupos[ativos[0]]) == 1:
+            return grupos[ativos[0]][0]
+    res = {k: grupos[k] for k in CHAVES_BOOL if grupos[k]}
+    res.update(opcoes)
+    return {'bool': res}
+
+def _lista(valor):
+    if not valor:
+        return []
+    return list(valor) if isinstance(valor, (list, tuple)) else [valor]
+
+def _sem_repetidas(clausulas):
+    vistas = set()
+    res = []
+    for clausula in clausulas:
+        chave = _chave(clausula)
+        if chave not in vistas:
+            vistas.add(chave)
+            res.append(clausula)
+    return res
+
+# valor de {"term": {"campo": valor}} ou {"term": {"campo": {"value": valor}}} sem outras opções
+def _campo_valor_term(clausula):
+    if not isinstance(clausula, dict) or len(clausula) != 1:
+        return None
+    if isinstance(clausula.get('term'), dict) and len(clausula['term']) == 1:
+        campo, valor = list(clausula['term'].items())[0]
+        if isinstance(valor, dict):
+            if list(valor) != ['value']:
+                return None
+            valor = valor['value']
+        return campo, [valor]
+    if isinstance(clausula.get('terms'), dict) and len(clausula['terms']) == 1:
+        campo, valores = list(clausula['terms'].items())[0]
+        if isinstance(valores, (list, tuple)):
+            return campo, list(valores)
+    return None
+
+# term e terms do mesmo campo viram um único terms na posição do primeiro
+def _agrupar_terms(clausulas):
+    campos = {}
+    for clausula in clausulas:
+        campo_valor = _campo_valor_term(clausula)
+        if campo_valor is not None:
+            campos[campo_valor[0]] = campos.get(campo_valor[0], 0) + 1
+    if not any(n > 1 for n in campos.values()):
+        return clausulas
+    res = []
+    valores = {}
+    for clausula in clausulas:
+        campo_valor = _campo_valor_term(clausula)
+        if campo_valor is None or campos[campo_valor[0]] == 1:
+            res.append(clausula)
+            continue
+        campo, _valores = campo_valor
+        if campo not in valores:
+            valores[campo] = []
+            res.append({'terms': {campo: valores[campo]}})
+        valores[campo].extend(_ for _ in _valores if _ not in valores[campo])
+    return res
+
+###########################################################
+# Avaliador local
+# documento: {campo: 'texto' ou [tokens]} - os tokens são comparados em minúsculas
+# campos raw usam o campo principal e campos reverse os tokens invertidos do campo principal
+# se não existirem no documento
+# suporta bool, term, terms, wildcard, regexp, prefix, range, match_all, match_none,
+# span_near, span_term, span_multi, span_or e field_masking_span
+#----------------------------------------------------------
+class ErroAvaliacao(ValueError):
+    pass
+
+def avaliar_query(query, documento):
+    if isinstance(query, dict) and 'query' in query:
+        query = query['query']
+    return _avaliar(query, documento)
+
+def _tokens(documento, campo):
+    if campo in documento:
+        valor = documento[campo]
+    elif campo.endswith('.reverse'):
+        return [_[::-1] for _ in _tokens(documento, campo[:-len('.reverse')])]
+    elif campo.find('.') >= 0:
+        valor = documento.get(campo.split('.')[0], [])
+    else:
+        valor = []
+    if isinstance(valor, str):
+        valor = valor.split()
+    return [str(_).lower() for _ in valor]
+
+def _campo_opcoes(corpo):
+    campo, opcoes = list(corpo.items())[0]
+    if not isinstance(opcoes, dict):
+        opcoes = {'value': opcoes}
+    return campo, opcoes
+
+def _padrao_wildcard(valor):
+    return re.compile(''.join('.*' if c == '*' else '.' if c == '?' else re.escape(c) for c in valor), re.DOTALL)
+
+def _termo_confere(tipo, opcoes):
+    valor = str(opcoes.get('value', ''))
+    if opcoes.get('case_insensitive'):
+        valor = valor.lower()
+    if tipo == 'term':
+        return lambda t: t == valor.lower()
+    if tipo == 'prefix':
+        return lambda t: t.startswith(valor)
+    padrao = _padrao_wildcard(valor) if tipo == 'wildcard' else re.compile(valor)
+    return lambda t: padrao.fullmatch(t) is not None
+
+def _avaliar(no, documento):
+    tipo, corpo = list(no.items())[0]
+    if tipo == 'bool':
+        must = _lista(corpo.get('must')) + _lista(corpo.get('filter'))
+        should = _lista(corpo.get('should'))
+        if not all(_avaliar(_, documento) for _ in must):
+            return False
+        if any(_avaliar(_, documento) for _ in _lista(corpo.get('must_not'))):
+            return False
+        minimo = corpo.get('minimum_should_match')
+        minimo = int(minimo) if minimo is not None else (1 if should and not must else 0)
+        return sum(1 for _ in should if _avaliar(_, documento)) >= minimo
+    if tipo == 'match_all':
+        return True
+    if tipo == 'match_none':
+        return False
+    if tipo == 'constant_score':
+        return _avaliar(corpo['filter'], documento)
+    if tipo in ('term', 'wildcard', 'regexp', 'prefix'):
+        campo, opcoes = _campo_opcoes(corpo)
+        confere = _termo_confere(tipo, opcoes)
+        return any(confere(_) for _ in _tokens(documento, campo))
+    if tipo == 'terms':
+        campo, valores = list(corpo.items())[0]
+        valores = {str(_).lower() for _ in valores}
+        return any(_ in valores for _ in _tokens(documento, campo))
+    if tipo == 'range':
+        campo, limites = list(corpo.items())[0]
+        valores = documento.get(campo, [])
+        valores = valores if isinstance(valores, (list, tuple)) else [valores]
+        testes = {'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b, 'lt': lambda a, b: a < b, 'lte': lambda a, b: a <= b}
+        return any(all(testes[k](str(valor), str(v)) for k, v in limites.items() if k in testes) for valor in valores)
+    if tipo.startswith('span_') or tipo == 'field_masking_span':
+        return any(_spans(no, documento))
+    raise ErroAvaliacao(f'avaliar_query: tipo de query não suportado "{tipo}"')
+
+# spans (início, fim) encontrados no documento
+def _spans(no, documento):
+    tipo, corpo = list(no.items())[0]
+    if tipo == 'span_term':
+        campo, opcoes = _campo_opcoes(corpo)
+        confere = _termo_confere('term', opcoes)
+        return [(i, i + 1) for i, t in enumerate(_tokens(documento, campo)) if confere(t)]
+    if tipo == 'span_multi':
+        _tipo, _corpo = list(corpo['match'].items())[0]
+        campo, opcoes = _campo_opcoes(_corpo)
+        confere = _termo_confere(_tipo, opcoes)
+        return [(i, i + 1) for i, t in enumerate(_tokens(documento, campo)) if confere(t)]
+    if tipo == 'field_masking_span':
+        return _spans(corpo['query'], documento)
+    if tipo == 'span_or':
+        return sorted({_ for clausula in corpo['clauses'] for _ in _spans(clausula, documento)})
+    if tipo == 'span_near':
+        return _spans_near([_spans(_, documento) for _ in corpo['clauses']], corpo.get('slop', 0), corpo.get('in_order', True))
+    raise ErroAvaliacao(f'avaliar_query: tipo de span não suportado "{tipo}"')
+
+def _spans_near(clausulas, slop, em_ordem):
+    res = set()
+    def _combinar(i, escolhidos):
+        if i == len(clausulas):
+            if em_ordem:
+                distancia = sum(escolhidos[j + 1][0] - escolhidos[j][1] for j in range(len(escolhidos) - 1))
+            else:
+                inicio, fim = min(_[0] for _ in escolhidos), max(_[1] for _ in escolhidos)
+                distancia = (fim - inicio) - sum(_[1] - _[0] for _ in escolhidos)
+            if distancia <= slop:
+                res.add((min(_[0] for _ in escolhidos), max(_[1] for _ in escolhidos)))
+            return
+        for span in clausulas[i]:
+            if em_ordem and escolhidos and span[0] < escolhidos[-1][1]:
+                continue
+            if not em_ordem and any(span[0] < _[1] and _[0] < span[1] for _ in escolhidos):
+                continue
+            _combinar(i + 1, escolhidos + [span])
+    _combinar(0, [])
+    return sorted(res)
+
+###########################################################
+# Conferência da forma canônica com documentos aleatórios
+# os documentos usam os termos das queries, variações dos curingas e termos de ruído
+# retorna a lista de documentos em que as queries divergem (vazia se forem equivalentes)
+#----------------------------------------------------------
+RUIDO = ('lorem', 'ipsum', 'dolor', 'amet')
+
+def vocabulario_query(query, res = None):
+    res = set() if res is None else res
+    if isinstance(query, dict):
+        for tipo, corpo in query.items():
+            if tipo in ('term', 'span_term', 'wildcard', 'regexp', 'prefix') and isinstance(corpo, dict) and len(corpo) == 1:
+                campo, opcoes = _campo_opcoes(corpo)
+                valor = str(opcoes.get('value', '')).lower()
+                limpo = re.sub(r'\.\{0,\d+\}|\.\*|[*?]|_\?', '', valor)
+                res.update((limpo, limpo + 'x', 'x' + limpo, valor.replace('_?', '_')))
+                if tipo == 'prefix' and campo.endswith('.reverse'):
+                    res.update((limpo[::-1], 'x' + limpo[::-1]))
+            elif tipo == 'range' and isinstance(corpo, dict):
+                for limites in corpo.values():
+                    res.update(f'{v}{_}' for k, v in limites.items() if k in ('gt', 'gte', 'lt', 'lte') for _ in ('', '0', '~'))
+            elif tipo == 'terms' and isinstance(corpo, dict):
+                for valores in corpo.values():
+                    res.update(str(_).lower() for _ in valores)
+            else:
+                vocabulario_query(corpo, res)
+    elif isinstance(query, (list, tuple)):
+        for _ in query:
+            vocabulario_query(_, res)
+    return res
+
+def campos_query(query, res = None):
+    res = set() if res is None else res
+    if isinstance(query, dict):
+        for tipo, corpo in query.items():
+            if tipo in ('term', 'terms', 'span_term', 'wildcard', 'regexp', 'prefix', 'range') and isinstance(corpo, dict) and len(corpo) == 1:
+                res.add(list(corpo)[0].split('.')[0])
+            else:
+                campos_query(corpo, res)
+    elif isinstance(query, (list, tuple)):
+        for _ in query:
+            campos_query(_, res)
+    return res
+
+def documentos_aleatorios(query, quantidade = 500, semente = 0, tamanho_maximo = 8):
+    aleatorio = random.Random(semente)
+    vocabulario = sorted(vocabulario_query(query) | set(RUIDO))
+    campos = sorted(campos_query(query)) or ['texto']
+    return [{campo: [aleatorio.choice(vocabulario) for _ in range(aleatorio.randint(1, tamanho_maximo))] for campo in campos}
+            for _ in range(quantidade)]
+
+def verificar_equivalencia(query_a, query_b, documentos = None, quantidade = 500, semente = 0):
+    documentos = documentos_aleatorios(query_a, quantidade, semente) if documentos is None else documentos
+    return [doc for doc in documentos if avaliar_query(query_a, doc) != avaliar_query(query_b, doc)]
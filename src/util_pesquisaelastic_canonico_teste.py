@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Teste Forma canônica:
+# - avaliador local de queries (bool, termos, curingas e spans)
+# - forma canônica das queries com o relatório de redução
+# - equivalência da forma canônica com documentos aleatórios
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import json
+import random
+import unittest
+from copy import deepcopy
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_canonico import canonizar, canonizar_query, avaliar_query, verificar_equivalencia, documentos_aleatorios
+
+# query, documento, encontrado
+TESTES_AVALIADOR = (
+    ({'term': {'texto': 'dano'}}, {'texto': 'o dano moral'}, True),
+    ({'terms': {'texto': ['x', 'moral']}}, {'texto': 'o dano moral'}, True),
+    ({'wildcard': {'texto': {'value': 'mor?l*', 'case_insensitive': True}}}, {'texto': 'o dano MORAIS'}, False),
+    ({'wildcard': {'texto': {'value': 'mor?l*', 'case_insensitive': True}}}, {'texto': 'o dano MORALMENTE'}, True),
+    ({'regexp': {'texto': {'value': 'da.{0,2}o'}}}, {'texto': 'o danno moral'}, True),
+    ({'prefix': {'texto.reverse': {'value': 'ona'}}}, {'texto': 'o dano moral'}, True),
+    ({'range': {'data': {'gte': '2020-01-01', 'lt': '2021'}}}, {'data': '2020-05-01'}, True),
+    ({'range': {'data': {'gte': '2020-01-01', 'lt': '2021'}}}, {'data': '2021-05-01'}, False),
+    ({'bool': {'must_not': [{'term': {'texto': 'x'}}]}}, {'texto': 'o dano'}, True),
+    ({'bool': {'must': [{'term': {'texto': 'o'}}], 'should': [{'term': {'texto': 'x'}}]}}, {'texto': 'o dano'}, True),
+    ({'bool': {'should': [{'term': {'texto': 'o'}}, {'term': {'texto': 'x'}}], 'minimum_should_match': 2}}, {'texto': 'o dano'}, False),
+    ({'span_near': {'clauses': [{'span_term': {'texto': 'dano'}}, {'span_term': {'texto': 'moral'}}], 'slop': 0, 'in_order': True}}, {'texto': 'o dano moral'}, True),
+    ({'span_near': {'clauses': [{'span_term': {'texto': 'dano'}}, {'span_term': {'texto': 'moral'}}], 'slop': 0, 'in_order': True}}, {'texto': 'o moral dano'}, False),
+    ({'span_near': {'clauses': [{'span_term': {'texto': 'dano'}}, {'span_term': {'texto': 'moral'}}], 'slop': 0, 'in_order': False}}, {'texto': 'o moral dano'}, True),
+    ({'span_near': {'clauses': [{'span_term': {'texto': 'dano'}}, {'span_term': {'texto': 'moral'}}], 'slop': 1, 'in_order': True}}, {'texto': 'dano x y moral'}, False),
+    ({'span_near': {'clauses': [{'span_near': {'clauses': [{'span_term': {'texto': 'a'}}, {'span_term': {'texto': 'b'}}], 'slop': 0, 'in_order': True}},
+                                {'span_or': {'clauses': [{'span_term': {'texto': 'c'}}, {'span_multi': {'match': {'prefix': {'texto': {'value': 'd'}}}}}]}}],
+                    'slop': 1, 'in_order': True}}, {'texto': 'a b x dx'}, True),
+)
+
+TERMO_A, TERMO_B = {'term': {'texto': 'a'}}, {'term': {'texto': 'b'}}
+
+# critérios ou query, query canônica (None para não comparar), cláusulas antes, cláusulas depois
+TESTES_CANONICO = (
+    (':dano E moral E dano', {'bool': {'must': [{'term': {'texto': 'dano'}}, {'term': {'texto': 'moral'}}]}}, 3, 2),
+    (':dano OU moral OU material', {'terms': {'texto': ['dano', 'moral', 'material']}}, 3, 1),
+    (':(dano OU moral) OU (material OU dano)', {'terms': {'texto': ['dano', 'moral', 'material']}}, 4, 1),
+    (':dano E (moral E (material E estetico))', None, 4, 4),
+    (':NAO (a OU b) NAO (c OU d) x', {'bool': {'must': [{'term': {'texto': 'x'}}], 'must_not': [{'terms': {'texto': ['a', 'b', 'c', 'd']}}]}}, 5, 2),
+    (':dano adj2 moral OU dano adj2 moral', None, 4, 2),
+    (':(a adj2 b) OU c OU d', None, 4, 3),
+    (':dano* adj3 estet* OU $ano', None, 3, 3),
+    (':a E (b OU (c E d)) NAO f', None, 5, 5),
+    ('dano', {'term': {'texto': 'dano'}}, 1, 1),
+    # queries prontas: o bool interno do must não é incorporado se o should ficar obrigatório
+    ({'query': {'bool': {'must': [{'bool': {'must_not': [TERMO_A]}}], 'should': [TERMO_B]}}},
+     {'bool': {'must': [{'bool': {'must_not': [TERMO_A]}}], 'should': [TERMO_B]}}, 2, 2),
+    ({'query': {'bool': {'must': [{'bool': {'must': [TERMO_A]}}], 'should': [TERMO_B]}}},
+     {'bool': {'must': [TERMO_A], 'should': [TERMO_B]}}, 2, 2),
+    # com minimum_should_match as repetições do should contam
+    ({'query': {'bool': {'should': [TERMO_A, TERMO_A, TERMO_B], 'minimum_should_match': 2}}},
+     {'bool': {'should': [TERMO_A, TERMO_A, TERMO_B], 'minimum_should_match': 2}}, 3, 3),
+)
+
+VOCABULARIO = ('dano', 'moral', 'mora*', 'material', 'estetic?', 'a', 'b', 'c')
+OPERADORES = (' E ', ' OU ', ' NAO ', ' ADJ2 ', ' PROX3 ')
+
+# critérios aleatórios com operadores e parênteses
+def criterios_aleatorios(aleatorio, profundidade = 0):
+    partes = []
+    for i in range(aleatorio.randint(1, 4)):
+        if i:
+            partes.append(aleatorio.choice(OPERADORES))
+        if profundidade < 2 and aleatorio.random() < 0.3:
+            partes.append(f'({criterios_aleatorios(aleatorio, profundidade + 1)})')
+        else:
+            partes.append(aleatorio.choice(VOCABULARIO))
+    return ''.join(partes)
+
+class Teste(unittest.TestCase):
+
+    def teste_1_avaliador(self):
+        for query, documento, esperado in TESTES_AVALIADOR:
+            with self.subTest(f'Avaliador: {query} >> {documento}'):
+                self.assertEqual(avaliar_query({'query': query}, documento), esperado)
+
+    def teste_2_canonico(self):
+        for criterios, esperado, antes, depois in TESTES_CANONICO:
+            with self.subTest(f'Canônico: {criterios}'):
+                query = criterios if isinstance(criterios, dict) else PesquisaElasticFacil(criterios).criterios_elastic
+                original = deepcopy(query)
+                canonica, relatorio = canonizar(query)
+                self.assertEqual(query, original)
+                if esperado is not None:
+                    self.assertEqual(canonica['query'], esperado)
+                self.assertEqual((relatorio['clausulas_antes'], relatorio['clausulas_depois']), (antes, depois))
+                self.assertGreaterEqual(relatorio['reducao_bytes'], 0)
+                self.assertEqual(canonizar_query(canonica), canonica)
+                self.assertEqual(verificar_equivalencia(query, canonica), [])
+        # queries imutáveis do cache
+        query = CacheQueriesElastic().get_pesquisa(':dano OU moral').criterios_elastic
+        self.assertEqual(canonizar_query(query), {'query': {'terms': {'texto': ['dano', 'moral']}}})
+        # grupos com filtros e campos diferentes
+        grupos = GruposPesquisaElasticFacil('.texto.(dano OU moral) .data.(>=2020-01-01) .tipo.(:x OU y) .texto.(:x NAO a NAO b)',
+                                            campos_disponiveis={'texto': '', 'data': 'dt', 'tipo': ''})
+        query = grupos.as_query()
+        canonica, relatorio = canonizar(query)
+        self.assertEqual(relatorio['clausulas_depois'], 5)
+        self.assertEqual(verificar_equivalencia(query, canonica), [])
+        # o avaliador identifica uma forma canônica incorreta
+        errada = json.loads(json.dumps(canonica).replace('"must_not"', '"should"'))
+        self.assertNotEqual(verificar_equivalencia(query, errada), [])
+
+    def teste_3_equivalencia(self):
+        aleatorio = random.Random(42)
+        for i in range(150):
+            criterios = ':' + criterios_aleatorios(aleatorio)
+            with self.subTest(f'Equivalência: {criterios}'):
+                try:
+                    query = PesquisaElasticFacil(criterios).criterios_elastic
+                except Exception:
+                    # grupos com operadores simples e de proximidade juntos
+                    continue
+                canonica = canonizar_query(query)
+                documentos = documentos_aleatorios(query, 200, semente=i)
+                self.assertEqual(verificar_equivalencia(query, canonica, documentos), [])
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
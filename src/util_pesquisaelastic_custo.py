@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+# Estimativa do custo das queries criadas pelo componente PesquisaElasticFacil
+# A análise é estática (sem consultar o elastic) e percorre a query de as_query/criterios_elastic:
+# - curingas no início do termo (*ano, ?ano, $ano, .*ano): obrigam o elastic a percorrer todo o dicionário de termos
+# - tamanho do autômato das regexp (curingas ? viram .{0,n} e cada posição opcional multiplica os estados)
+# - span_multi: curingas e regexp dentro de ADJ/PROX são expandidos em todos os termos encontrados
+# - distância (slop) dos span_near, mais cara quando combinada com span_multi
+# - quantidade de cláusulas e de termos do more_like_this
+# Os pontos de cada item somados definem a classe de custo: baixo, medio, alto ou proibitivo
+# PoliticaCusto aplica uma ação às pesquisas que atingirem a classe limite:
+# - rejeitar: levanta ErroCustoQuery com a mensagem para o usuário
+# - avisar: inclui a mensagem em avisos e retorna a query sem alteração
+# - reescrever: retorna uma cópia da query com a expansão dos curingas dos span_multi limitada
+#   (rewrite top_terms_N), slop e max_query_terms limitados e a mensagem em avisos
+# Exemplo:
+#   politica = PoliticaCusto(acao='reescrever', classe_limite='alto')
+#   pe = PesquisaElasticFacil('*$ca???sa?? prox80 dano')
+#   query, custo = politica.admitir(pe)
+#   print(custo.classe, custo.pontos, pe.avisos)
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - estimativa de custo e políticas de admissão
+
+import re
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada, contar_clausulas
+
+# classes de custo e os pontos mínimos de cada uma
+CLASSES_CUSTO = (('baixo', 0), ('medio', 20), ('alto', 60), ('proibitivo', 150))
+# pontos de cada item da query
+PESOS_CUSTO = {'curinga_inicial': 60,   # por termo com curinga no início
+               'curinga': 2,            # por curinga no meio ou fim do termo
+               'estado_automato': 3,    # por posição com curinga no autômato da regexp
+               'span_multi': 10,        # por span_multi
+               'slop': 0.2,             # por unidade de slop, multiplicado pelos span_multi do span_near + 1
+               'clausula': 1,           # por cláusula final da query
+               'termo_mlt': 1}          # por termo do more_like_this (max_query_terms)
+ACOES_CUSTO = ('rejeitar', 'avisar', 'reescrever')
+CONSULTAS_MULTI_TERMOS = ('wildcard', 'regexp', 'prefix')
+
+ERRO_ACAO_CUSTO = f'PoliticaCusto: ação inválida, use uma das ações: {ACOES_CUSTO}'
+ERRO_CLASSE_CUSTO = f'PoliticaCusto: classe inválida, use uma das classes: {tuple(_[0] for _ in CLASSES_CUSTO)}'
+MSG_CUSTO_REJEITADO = 'Pesquisa muito custosa ({}), simplifique os curingas ou reduza as distâncias de proximidade: {}'
+MSG_CUSTO_AVISO = 'A pesquisa pode demorar ({}): {}'
+MSG_CUSTO_REESCRITO = 'A pesquisa foi simplificada para reduzir o custo: {}'
+
+# curingas de regexp (.*, .{0,n}, .+, .) e de wildcard (*, ?)
+RE_CURINGA_REGEXP = re.compile(r'\.(?:\{(\d*),?(\d*)\}|[*+?])?')
+RE_CURINGA_WILDCARD = re.compile(r'[*?]')
+
+class ErroCustoQuery(ValueError):
+    def __init__(self, msg, custo):
+        super().__init__(msg)
+        self.custo = custo
+
+###########################################################
+# Resultado da análise de custo de uma query
+#----------------------------------------------------------
+class CustoQuery():
+    __slots__ = ('pontos', 'classe', 'curingas_iniciais', 'curingas', 'tamanho_automato', 'span_multi',
+                 'maior_slop', 'clausulas', 'termos_mlt', 'detalhes')
+
+    def __init__(self):
+        self.pontos = 0
+        self.classe = CLASSES_CUSTO[0][0]
+        self.curingas_iniciais = 0
+        self.curingas = 0
+        self.tamanho_automato = 0 # maior quantidade de posições com curinga em uma regexp
+        self.span_multi = 0
+        self.maior_slop = 0
+        self.clausulas = 0
+        self.termos_mlt = 0
+        self.detalhes = [] # descrição dos itens mais custosos
+
+    def as_dict(self):
+        return {_: getattr(self, _) for _ in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f'CustoQuery({self.classe}, pontos={self.pontos})'
+
+# retorna a classe dos pontos
+def classe_custo(pontos):
+    res = CLASSES_CUSTO[0][0]
+    for classe, minimo in CLASSES_CUSTO:
+        if pontos >= minimo:
+            res = classe
+    return res
+
+def indice_classe(classe):
+    for i, (_classe, _) in enumerate(CLASSES_CUSTO):
+        if _classe == classe:
+            return i
+    raise ValueError(ERRO_CLASSE_CUSTO)
+
+# valor do termo de wildcard/regexp/prefix: {"campo": "valor"} ou {"campo": {"value": "valor"}}
+def _valor_multi_termos(clausula):
+    for valor in clausula.values():
+        if isinstance(valor, dict):
+            return str(valor.get('value', ''))
+        return str(valor)
+    return ''
+
+# quantidade de posições com curinga da regexp (.{0,3} são 3 posições, .* e .+ uma posição)
+def tamanho_automato_regexp(valor):
+    res = 0
+    for m in RE_CURINGA_REGEXP.finditer(valor):
+        minimo, maximo = m.group(1), m.group(2)
+        res += max(1, int(maximo or minimo or 1)) if m.group(0).startswith('.{') else 1
+    return res
+
+###########################################################
+# Analisa a query (dict com ou sem a chave query) e retorna o CustoQuery
+#----------------------------------------------------------
+def analisar_custo(query, pesos = None):
+    _pesos = dict(PESOS_CUSTO)
+    _pesos.update(pesos or {})
+    custo = CustoQuery()
+    _analisar(query, custo, _pesos, False)
+    custo.clausulas = contar_clausulas(query)
+    custo.pontos += custo.clausulas * _pesos['clausula']
+    custo.pontos = round(custo.pontos, 1)
+    custo.classe = classe_custo(custo.pontos)
+    return custo
+
+def _analisar(no, custo, pesos, em_span):
+    if isinstance(no, (list, tuple)):
+        for _ in no:
+            _analisar(_, custo, pesos, em_span)
+        return
+    if not isinstance(no, dict):
+        return
+    for chave, valor in no.items():
+        if chave in CONSULTAS_MULTI_TERMOS and isinstance(valor, dict):
+            _analisar_multi_termos(chave, _valor_multi_termos(valor), custo, pesos, em_span)
+        elif chave == 'span_multi':
+            custo.span_multi += 1
+            custo.pontos += pesos['span_multi']
+            _analisar(valor, custo, pesos, True)
+        elif chave == 'span_near' and isinstance(valor, dict):
+            slop = int(valor.get('slop', 0) or 0)
+            custo.maior_slop = max(custo.maior_slop, slop)
+            multi = sum(1 for _ in valor.get('clauses', []) if isinstance(_, dict) and 'span_multi' in _)
+            custo.pontos += slop * pesos['slop'] * (multi + 1)
+            if multi and slop >= 10:
+                custo.detalhes.append(f'proximidade {slop + 1} com {multi} curinga(s)')
+            _analisar(valor.get('clauses', []), custo, pesos, True)
+        elif chave == 'more_like_this' and isinstance(valor, dict):
+            termos = int(valor.get('max_query_terms') or 25)
+            termos = min(termos, len(str(valor.get('like', '')).split()) or termos)
+            custo.termos_mlt = max(custo.termos_mlt, termos)
+            custo.pontos += termos * pesos['termo_mlt']
+        else:
+            _analisar(valor, custo, pesos, em_span)
+
+def _analisar_multi_termos(tipo, valor, custo, pesos, em_span):
+    if tipo == 'regexp':
+        inicial = valor.startswith('.')
+        tamanho = tamanho_automato_regexp(valor)
+        custo.tamanho_automato = max(custo.tamanho_automato, tamanho)
+        custo.curingas += tamanho
+        custo.pontos += tamanho * pesos['estado_automato'] * (2 if em_span else 1)
+    elif tipo == 'wildcard':
+        inicial = valor[:1] in ('*', '?')
+        curingas = len(RE_CURINGA_WILDCARD.findall(valor))
+        custo.curingas += curingas
+        custo.pontos += curingas * pesos['curinga']
+    else:
+        inicial = False
+    if inicial:
+        custo.curingas_iniciais += 1
+        custo.pontos += pesos['curinga_inicial'] * (2 if em_span else 1)
+        custo.detalhes.append(f'curinga no início do termo "{valor}"')
+
+###########################################################
+# Política de admissão das queries pelo custo
+# acao: rejeitar, avisar ou reescrever (ver ACOES_CUSTO)
+# classe_limite: menor classe em que a ação é aplicada
+# top_terms: quantidade de termos dos curingas em span_multi (rewrite top_terms_N) na reescrita
+# slop_maximo e max_query_terms: limites aplicados na reescrita
+#----------------------------------------------------------
+class PoliticaCusto():
+    def __init__(self, acao = 'avisar', classe_limite = 'alto', top_terms = 1000, slop_maximo = 50, max_query_terms = 30, pesos = None):
+        if acao not in ACOES_CUSTO:
+            raise ValueError(ERRO_ACAO_CUSTO)
+        self.acao = acao
+        self.classe_limite = classe_limite
+        self.__indice_limite__ = indice_classe(classe_limite)
+        self.top_terms = top_terms
+        self.slop_maximo = slop_maximo
+        self.max_query_terms = max_query_terms
+        self.pesos = pesos
+
+    def avaliar(self, query):
+        return analisar_custo(query, self.pesos)
+
+    def atinge_limite(self, custo):
+        return indice_classe(custo.classe) >= self.__indice_limite__
+
+    # aplica a política à pesquisa (PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada ou a query)
+    # retorna (query, custo) - a query recebida não é alterada, a reescrita retorna uma cópia
+    # as mensagens são incluídas nos avisos da pesquisa quando ela tiver uma lista de avisos
+    def admitir(self, pesquisa, campo_highlight = ''):
+        query = self.__query__(pesquisa, campo_highlight)
+        custo = self.avaliar(query)
+        if not self.atinge_limite(custo):
+            return query, custo
+        detalhes = ', '.join(custo.detalhes) or f'{custo.pontos} pontos'
+        if self.acao == 'rejeitar':
+            raise ErroCustoQuery(MSG_CUSTO_REJEITADO.format(custo.classe, detalhes), custo)
+        if self.acao == 'reescrever':
+            alteracoes = []
+            query = self.reescrever(query, alteracoes)
+            if any(alteracoes):
+                self.__avisar__(pesquisa, MSG_CUSTO_REESCRITO.format(', '.join(alteracoes)))
+                return query, custo
+        self.__avisar__(pesquisa, MSG_CUSTO_AVISO.format(custo.classe, detalhes))
+        return query, custo
+
+    def __query__(self, pesquisa, campo_highlight):
+        if isinstance(pesquisa, PesquisaElasticFacil):
+            return pesquisa.criterios_elastic_highlight if campo_highlight else pesquisa.criterios_elastic
+        if isinstance(pesquisa, (GruposPesquisaElasticFacil, PesquisaCompilada)):
+            return pesquisa.as_query(campo_highlight) or {}
+        return pesquisa
+
+    def __avisar__(self, pesquisa, msg):
+        avisos = getattr(pesquisa, 'avisos', None)
+        if isinstance(avisos, list):
+            avisos.append(msg)
+
+    # retorna uma cópia da query com os limites da política
+    # alteracoes: lista que recebe a descrição de cada alteração
+    def reescrever(self, query, alteracoes = None):
+        alteracoes = [] if alteracoes is None else alteracoes
+        return self.__reescrever__(query, False, alteracoes)
+
+    def __reescrever__(self, no, em_span, alteracoes):
+        if isinstance(no, (list, tuple)):
+            return [self.__reescrever__(_, em_span, alteracoes) for _ in no]
+        if not isinstance(no, dict):
+            return no
+        res = {}
+        for chave, valor in no.items():
+            if chave in CONSULTAS_MULTI_TERMOS and em_span and isinstance(valor, dict):
+                valor = {campo: self.__limitar_termos__(opcoes, alteracoes) for campo, opcoes in valor.items()}
+            elif chave == 'span_multi':
+                valor = self.__reescrever__(valor, True, alteracoes)
+            elif chave == 'span_near' and isinstance(valor, dict):
+                valor = dict(valor)
+                slop = valor.get('slop', 0) or 0
+                if self.slop_maximo is not None and slop > self.slop_maximo:
+                    valor['slop'] = self.slop_maximo
+                    alteracoes.append(f'proximidade {slop + 1} limitada a {self.slop_maximo + 1}')
+                valor['clauses'] = self.__reescrever__(valor.get('clauses', []), True, alteracoes)
+            elif chave == 'more_like_this' and isinstance(valor, dict):
+                valor = dict(valor)
+                termos = valor.get('max_query_terms')
+                if self.max_query_terms and (not termos or termos > self.max_query_terms):
+                    valor['max_query_terms'] = self.max_query_terms
+                    alteracoes.append(f'termos do CONTÉM limitados a {self.max_query_terms}')
+            else:
+                valor = self.__reescrever__(valor, em_span, alteracoes)
+            res[chave] = valor
+        return res
+
+    # curingas em span_multi expandem no máximo top_terms termos
+    def __limitar_termos__(self, opcoes, alteracoes):
+        opcoes = dict(opcoes) if isinstance(opcoes, dict) else {'value': opcoes}
+        if self.top_terms and 'rewrite' not in opcoes:
+            opcoes['rewrite'] = f'top_terms_{self.top_terms}'
+            msg = f'curingas em proximidade limitados a {self.top_terms} termos'
+            if msg not in alteracoes:
+                alteracoes.append(msg)
+        return opcoes
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Teste Custo:
+# - classes de custo das queries (curingas iniciais, regexp, span_multi, slop, cláusulas e more_like_this)
+# - políticas de admissão: rejeitar, avisar e reescrever
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_custo import analisar_custo, tamanho_automato_regexp, PoliticaCusto, ErroCustoQuery
+
+CAMPOS_DISPONIVEIS = {'texto':'raw','tipo':''}
+
+# critérios, classe, curingas iniciais, span_multi, maior slop
+TESTES_CLASSES = (
+    ('dano moral', 'baixo', 0, 0, 0),
+    ('art 123.456 adj2 lei 8.112/90', 'baixo', 0, 1, 1),
+    ('contém: dano moral e material', 'baixo', 0, 0, 0),
+    ('mora* adj2 dan*', 'medio', 0, 2, 1),
+    ('dano prox80 mora*', 'medio', 0, 1, 79),
+    ('$ano', 'alto', 1, 0, 0),
+    ('*$ca???sa??', 'alto', 1, 0, 0),
+    ('estetic?? ou ??ativ? ou mora$', 'alto', 1, 0, 0),
+    ('mora$ adj2 dan* prox30 estet?', 'alto', 0, 4, 29),
+    ('$ano prox20 ?ativo*', 'proibitivo', 2, 2, 19),
+    ('*$ca???sa?? adj5 dan*', 'proibitivo', 1, 2, 4),
+)
+
+TESTES_AUTOMATO = (
+    ('estetic.{0,2}', 2),
+    ('.*ca.{0,3}sa.{0,2}', 6),
+    ('123_?456', 0),
+    ('a.b.+', 2),
+)
+
+class Teste(unittest.TestCase):
+
+    def teste_1_classes(self):
+        for criterios, classe, iniciais, span_multi, slop in TESTES_CLASSES:
+            with self.subTest(f'Custo: {criterios}'):
+                custo = analisar_custo(PesquisaElasticFacil(criterios).criterios_elastic)
+                self.assertEqual(custo.classe, classe, str(custo.as_dict()))
+                self.assertEqual(custo.curingas_iniciais, iniciais)
+                self.assertEqual(custo.span_multi, span_multi)
+                self.assertEqual(custo.maior_slop, slop)
+        for valor, tamanho in TESTES_AUTOMATO:
+            with self.subTest(f'Autômato: {valor}'):
+                self.assertEqual(tamanho_automato_regexp(valor), tamanho)
+
+    def teste_2_politicas(self):
+        # abaixo do limite a query é retornada sem avisos
+        pe = PesquisaElasticFacil('dano moral')
+        query, custo = PoliticaCusto('rejeitar').admitir(pe)
+        self.assertIs(query, pe.criterios_elastic)
+        self.assertEqual(pe.avisos, [])
+        # rejeitar
+        with self.assertRaises(ErroCustoQuery) as erro:
+            PoliticaCusto('rejeitar', classe_limite='proibitivo').admitir(PesquisaElasticFacil('$ano prox20 ?ativo*'))
+        self.assertEqual(erro.exception.custo.classe, 'proibitivo')
+        self.assertIn('curinga no início do termo "*ano"', str(erro.exception))
+        # avisar
+        pe = PesquisaElasticFacil('$ano')
+        query, custo = PoliticaCusto('avisar').admitir(pe)
+        self.assertIs(query, pe.criterios_elastic)
+        self.assertEqual(pe.avisos, ['A pesquisa pode demorar (alto): curinga no início do termo "*ano"'])
+        # reescrever sem alterações possíveis avisa
+        pe = PesquisaElasticFacil('$ano')
+        query, custo = PoliticaCusto('reescrever').admitir(pe)
+        self.assertEqual(query, pe.criterios_elastic)
+        self.assertEqual(len(pe.avisos), 1)
+        # reescrever limita os span_multi e o slop sem alterar a query da pesquisa
+        pe = CacheQueriesElastic().get_pesquisa('$ano prox80 ?ativo*')
+        query, custo = PoliticaCusto('reescrever', top_terms=100).admitir(pe)
+        span_near = query['query']['span_near']
+        self.assertEqual(span_near['slop'], 50)
+        self.assertEqual(span_near['clauses'][0]['span_multi']['match']['wildcard']['texto']['rewrite'], 'top_terms_100')
+        self.assertEqual(pe.criterios_elastic['query']['span_near']['slop'], 79)
+        self.assertNotIn('rewrite', pe.criterios_elastic['query']['span_near']['clauses'][0]['span_multi']['match']['wildcard']['texto'])
+        self.assertEqual(pe.avisos, ()) # avisos do cache não são alterados
+        self.assertLess(analisar_custo(query).pontos, custo.pontos)
+        # grupos e more_like_this
+        grupos = GruposPesquisaElasticFacil('.texto.(dano prox90 mora*) .tipo.(x)', campos_disponiveis=CAMPOS_DISPONIVEIS)
+        query, custo = PoliticaCusto('reescrever', classe_limite='medio').admitir(grupos)
+        self.assertEqual(query['query']['bool']['must'][0]['span_near']['slop'], 50)
+        self.assertEqual(len(grupos.avisos), 1)
+        mlt = PesquisaElasticFacil('contém: ' + ' '.join(f'termo{i}' for i in range(80))).criterios_elastic
+        query = PoliticaCusto(max_query_terms=20).reescrever(mlt)
+        self.assertEqual(query['query']['more_like_this']['max_query_terms'], 20)
+        with self.assertRaises(ValueError):
+            PoliticaCusto('ignorar')
+        with self.assertRaises(ValueError):
+            PoliticaCusto(classe_limite='enorme')
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+# Execução das queries criadas pelo componente PesquisaElasticFacil
+# - escrever_msearch: cria o corpo NDJSON do _msearch com várias pesquisas em uma única requisição
+# - separar_retorno_msearch: separa o retorno do _msearch em resultados por pesquisa
+# - documentos_do_retorno: prepara os documentos retornados pelo elastic (mesmo formato do serviço de exemplo)
+# - ExportacaoPesquisa: exporta todos os documentos de uma pesquisa com point in time e search_after
+# - escrever_jsonl e escrever_csv: gravam os documentos exportados sem mantê-los em memória
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - _msearch
+# Ver 0.1.1 - 18/10/2026 - highlight de outros campos com o ConfigHighlight da pesquisa
+# Ver 0.1.2 - 18/10/2026 - exportação com point in time e search_after
+# Ver 0.1.3 - 18/10/2026 - corpo_bytes_da_pesquisa: corpo em bytes com a query serializada uma vez por pesquisa
+# Ver 0.1.4 - 18/10/2026 - _msearch com os corpos em bytes das pesquisas
+
+import csv
+import json
+from io import TextIOBase
+from time import perf_counter
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada
+from util_pesquisaelastic_facil import highlight_campo, query_em_bytes, juntar_query_bytes
+
+OPCOES_PADRAO_MSEARCH = {'index': None, 'size': 100, 'from': None, 'highlight': True, 'campo_texto': None}
+QUERY_SEM_CRITERIOS = {"query": {"match_none": {}}}
+QUERY_SEM_CRITERIOS_BYTES = query_em_bytes(QUERY_SEM_CRITERIOS)
+
+###########################################################
+# retorna a query de uma pesquisa com ou sem highlight
+# pesquisa pode ser PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada ou a própria query (dict)
+# campo_highlight vazio retorna a query sem highlight
+# a query retornada não deve ser alterada (pode ser compartilhada com a pesquisa ou com o cache)
+#----------------------------------------------------------
+def query_da_pesquisa(pesquisa, campo_highlight = ''):
+    if isinstance(pesquisa, PesquisaElasticFacil):
+        if not campo_highlight:
+            return pesquisa.criterios_elastic
+        if campo_highlight == pesquisa.campo_texto:
+            return pesquisa.criterios_elastic_highlight
+        query = dict(pesquisa.criterios_elastic)
+        query['highlight'] = highlight_campo(campo_highlight, pesquisa.highlight)
+        query['_source'] = [""]
+        return query
+    if isinstance(pesquisa, (GruposPesquisaElasticFacil, PesquisaCompilada)):
+        query = pesquisa.as_query(campo_highlight)
+        return QUERY_SEM_CRITERIOS if query is None else query
+    if isinstance(pesquisa, dict):
+        return pesquisa
+    raise TypeError(f'Tipo de pesquisa não reconhecido: {type(pesquisa)}')
+
+# corpo da pesquisa em bytes (UTF-8) com size e from - as pesquisas guardam a query e o highlight
+# serializados e apenas size/from são incluídos a cada chamada (queries em dict são serializadas)
+def corpo_bytes_da_pesquisa(pesquisa, campo_highlight = '', size = None, desde = None):
+    if isinstance(pesquisa, PesquisaElasticFacil):
+        return pesquisa.corpo_bytes(size, desde, campo_highlight or None)
+    if isinstance(pesquisa, (GruposPesquisaElasticFacil, PesquisaCompilada)):
+        corpo = pesquisa.corpo_bytes(size, desde, campo_highlight)
+        return juntar_query_bytes(QUERY_SEM_CRITERIOS_BYTES, size, desde) if corpo is None else corpo
+    corpo = dict(query_da_pesquisa(pesquisa, campo_highlight))
+    if size is not None:
+        corpo['size'] = size
+    if desde is not None:
+        corpo['from'] = desde
+    return query_em_bytes(corpo)
+
+# campo de texto padrão de cada tipo de pesquisa
+def campo_texto_da_pesquisa(pesquisa):
+    if isinstance(pesquisa, GruposPesquisaElasticFacil):
+        return pesquisa.campo_texto_padrao
+    return getattr(pesquisa, 'campo_texto', 'texto')
+
+###########################################################
+# Cria o corpo NDJSON do _msearch com as pesquisas recebidas
+# - pesquisas: iterável com pesquisas ou tuplas (pesquisa, opções)
+# - opções de cada pesquisa (ou padrão para todas nos parâmetros):
+#   index, size, from, highlight (True usa o campo de texto da pesquisa ou o nome do campo)
+#   e campo_texto (campo do highlight e dos documentos no retorno)
+# - saida: objeto com write (arquivo binário, BytesIO, arquivo em modo texto, StringIO) ou o nome do arquivo
+# Cada pesquisa é escrita com o corpo em bytes guardado na pesquisa (corpo_bytes_da_pesquisa),
+# sem serializar a query novamente e sem manter as queries em memória.
+# linhas_msearch retorna as linhas em bytes (UTF-8)
+# Retorna a lista com o campo de texto de cada pesquisa para usar em separar_retorno_msearch
+# Exemplo:
+#   with open('msearch.ndjson', 'wb') as f:
+#       campos = escrever_msearch([pe1, (pe2, {'size': 10}), grupos], f, index='meu_indice')
+#   retorno = es.msearch(body=open('msearch.ndjson', 'rb').read())
+#   resultados = separar_retorno_msearch(retorno, campos)
+#----------------------------------------------------------
+def linhas_msearch(pesquisas, campos = None, **opcoes_padrao):
+    _padrao = dict(OPCOES_PADRAO_MSEARCH)
+    _padrao.update(opcoes_padrao)
+    cabecalhos = {}
+    for item in pesquisas:
+        if isinstance(item, tuple):
+            pesquisa, opcoes = item
+            _opcoes = dict(_padrao)
+            _opcoes.update(opcoes or {})
+        else:
+            pesquisa, _opcoes = item, _padrao
+        campo_texto = _opcoes.get('campo_texto') or campo_texto_da_pesquisa(pesquisa)
+        highlight = _opcoes.get('highlight')
+        campo_highlight = (highlight if isinstance(highlight, str) else campo_texto) if highlight else ''
+        index = _opcoes.get('index') or None
+        cabecalho = cabecalhos.get(index)
+        if cabecalho is None:
+            cabecalho = cabecalhos[index] = query_em_bytes({'index': index} if index else {}) + b'\n'
+        # a query da pesquisa não é alterada, size e from entram nos bytes guardados na pesquisa
+        corpo = corpo_bytes_da_pesquisa(pesquisa, campo_highlight, _opcoes.get('size'), _opcoes.get('from'))
+        if campos is not None:
+            campos.append(campo_highlight or campo_texto)
+        yield cabecalho
+        yield corpo + b'\n'
+
+def escrever_msearch(pesquisas, saida, **opcoes_padrao):
+    campos = []
+    linhas = linhas_msearch(pesquisas, campos, **opcoes_padrao)
+    if isinstance(saida, str):
+        with open(saida, 'wb') as f:
+            f.writelines(linhas)
+    elif isinstance(saida, TextIOBase):
+        saida.writelines(_.decode('utf-8') for _ in linhas)
+    else:
+        saida.writelines(linhas)
+    return campos
+
+###########################################################
+# Prepara os documentos retornados pelo elastic
+# o texto do highlight é concatenado e o _source é incluído no documento
+# retorna {'documentos': [...], 'total_documentos': n}
+#----------------------------------------------------------
+def documentos_do_retorno(retorno, campo_texto = 'texto'):
+    hits = retorno.get('hits',{}).get('hits',[])
+    total = retorno.get('hits',{}).get('total',{})
+    total = total.get('value',0) if isinstance(total, dict) else int(total or 0)
+    documentos = []
+    for doc in hits:
+        txt = doc.get('highlight',{}).get(campo_texto,[])
+        _source = dict(doc.get('_source',{}))
+        if any(txt):
+            txt = ' <small><b>[..]</b></small> '.join(txt)
+            _source.pop(campo_texto,None)
+        else:
+            txt = _source.pop(campo_texto,'')
+        txt = txt.replace('<em>','<mark>').replace('</em>','</mark>')
+        _doc = {'id' : doc.get('_id',{}),
+                'score' : doc.get('_score',{}),
+                campo_texto : txt}
+        _doc.update(_source)
+        documentos.append(_doc)
+    return {'documentos' : documentos, 'total_documentos': total}
+
+# separa o retorno do _msearch na mesma ordem das pesquisas
+# campos: campo de texto de cada pesquisa (retorno de escrever_msearch) ou um campo para todas
+# pesquisas com erro retornam documentos vazios e a chave erro
+def separar_retorno_msearch(retorno, campos = 'texto'):
+    respostas = retorno.get('responses',[])
+    res = []
+    for i, resposta in enumerate(respostas):
+        campo = campos if isinstance(campos, str) else campos[i]
+        if 'error' in resposta:
+            erro = resposta['error']
+            erro = erro.get('reason', str(erro)) if isinstance(erro, dict) else str(erro)
+            res.append({'documentos': [], 'total_documentos': 0, 'erro': erro})
+            continue
+        res.append(documentos_do_retorno(resposta, campo))
+    return res
+
+###########################################################
+# Exportação de todos os documentos de uma pesquisa
+# abre um point in time (PIT) no índice e pagina com search_after em uma ordenação estável
+# (_shard_doc ou a ordenação informada), os documentos são retornados um a um
+# e apenas uma página fica em memória
+# - cliente: Elasticsearch (open_point_in_time, search e close_point_in_time)
+# - pesquisa: PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada ou a query (dict)
+# - campos: campos do _source exportados (None para todos)
+# - limite: quantidade máxima de documentos (None para todos)
+# estatísticas: total, documentos, paginas (documentos, segundos e took de cada página) e resumo()
+# Exemplo:
+#   exportacao = ExportacaoPesquisa(es, pe, 'meu_indice', campos=['id_doc', 'dt_rg_protocolo'])
+#   escrever_jsonl(exportacao, 'exportacao.jsonl')
+#   print(exportacao.resumo())
+#----------------------------------------------------------
+ORDENACAO_EXPORTACAO = [{'_shard_doc': 'asc'}]
+
+class ExportacaoPesquisa():
+    def __init__(self, cliente, pesquisa, index, campos = None, tamanho_pagina = 1000, ordenacao = None, keep_alive = '1m', limite = None):
+        self.cliente = cliente
+        self.index = index
+        self.query = query_da_pesquisa(pesquisa).get('query', {'match_all': {}})
+        self.campos = list(campos) if campos is not None else None
+        self.tamanho_pagina = max(1, int(tamanho_pagina))
+        self.ordenacao = list(ordenacao) if ordenacao else list(ORDENACAO_EXPORTACAO)
+        self.keep_alive = keep_alive
+        self.limite = limite
+        self.total = None
+        self.documentos = 0
+        self.paginas = []
+
+    # corpo da pesquisa de uma página - o total é contado apenas na primeira
+    def __corpo__(self, pit, search_after):
+        corpo = {'query': self.query, 'size': self.tamanho_pagina, 'sort': self.ordenacao,
+                 'pit': {'id': pit, 'keep_alive': self.keep_alive},
+                 'track_total_hits': search_after is None}
+        if self.campos is not None:
+            corpo['_source'] = self.campos
+        if search_after is not None:
+            corpo['search_after'] = search_after
+        if self.limite is not None:
+            corpo['size'] = max(1, min(self.tamanho_pagina, self.limite - self.documentos))
+        return corpo
+
+    def __iter__(self):
+        pit = self.cliente.open_point_in_time(index=self.index, keep_alive=self.keep_alive)['id']
+        try:
+            search_after = None
+            while self.limite is None or self.documentos < self.limite:
+                inicio = perf_counter()
+                retorno = self.cliente.search(body=self.__corpo__(pit, search_after))
+                hits = retorno.get('hits', {}).get('hits', [])
+                self.paginas.append({'documentos': len(hits), 'segundos': perf_counter() - inicio, 'took': retorno.get('took')})
+                if self.total is None:
+                    total = retorno.get('hits', {}).get('total', {})
+                    self.total = total.get('value', 0) if isinstance(total, dict) else int(total or 0)
+                # o id do PIT pode mudar a cada página
+                pit = retorno.get('pit_id', pit)
+                for hit in hits:
+                    self.documentos += 1
+                    yield documento_exportado(hit)
+                if len(hits) < self.tamanho_pagina or not hits:
+                    break
+                search_after = hits[-1]['sort']
+        finally:
+            self.cliente.close_point_in_time(body={'id': pit})
+
+    def resumo(self):
+        segundos = sum(_['segundos'] for _ in self.paginas)
+        return {'total': self.total, 'documentos': self.documentos, 'paginas': len(self.paginas),
+                'segundos': segundos, 'documentos_segundo': self.documentos / segundos if segundos else 0.0,
+                'maior_pagina_segundos': max((_['segundos'] for _ in self.paginas), default=0.0)}
+
+# documento exportado com o id e o _source
+def documento_exportado(hit):
+    doc = {'id': hit.get('_id')}
+    doc.update(hit.get('_source', {}))
+    return doc
+
+# grava os documentos em JSON Lines - saida: nome do arquivo ou objeto com write
+# retorna a quantidade de documentos gravados
+def escrever_jsonl(documentos, saida):
+    if isinstance(saida, str):
+        with open(saida, 'w', encoding='utf-8') as f:
+            return escrever_jsonl(documentos, f)
+    qtd = 0
+    for doc in documentos:
+        saida.write(json.dumps(doc, ensure_ascii=False) + '\n')
+        qtd += 1
+    return qtd
+
+# grava os documentos em CSV - colunas: nomes das colunas (padrão: campos do primeiro documento)
+# listas e dicionários são gravados em JSON
+def escrever_csv(documentos, saida, colunas = None, delimitador = ';'):
+    if isinstance(saida, str):
+        with open(saida, 'w', encoding='utf-8', newline='') as f:
+            return escrever_csv(documentos, f, colunas, delimitador)
+    escritor = None
+    qtd = 0
+    for doc in documentos:
+        if escritor is None:
+            colunas = list(colunas) if colunas else list(doc.keys())
+            escritor = csv.DictWriter(saida, fieldnames=colunas, delimiter=delimitador, extrasaction='ignore')
+            escritor.writeheader()
+        escritor.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v for k, v in doc.items()})
+        qtd += 1
+    return qtd
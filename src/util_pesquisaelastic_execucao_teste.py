@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Teste Execução:
+# - _msearch: corpo NDJSON e separação do retorno por pesquisa
+# - exportação com point in time e search_after em um cliente local (ElasticLocal)
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+import csv
+import json
+from io import StringIO, BytesIO
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_execucao import escrever_msearch, separar_retorno_msearch, linhas_msearch
+from util_pesquisaelastic_execucao import corpo_bytes_da_pesquisa, query_da_pesquisa
+from util_pesquisaelastic_execucao import ExportacaoPesquisa, escrever_jsonl, escrever_csv
+from util_pesquisaelastic_canonico import avaliar_query
+
+CAMPOS_DISPONIVEIS = {'texto':'raw','CAMPO':'raw','DATA':'','TIPO':''}
+
+# pesquisa, opções, cabeçalho esperado, chaves do corpo esperadas
+TESTES_MSEARCH = (
+    (PesquisaElasticFacil('dano adj2 moral'), None, {'index': 'indice'}, ['query', 'highlight', '_source', 'size']),
+    (PesquisaElasticFacil('dano adj2 moral'), {'highlight': False, 'size': 10, 'from': 20}, {'index': 'indice'}, ['query', 'size', 'from']),
+    (PesquisaElasticFacil('dano moral', campo_texto='ementa'), {'index': 'outro'}, {'index': 'outro'}, ['query', 'highlight', '_source', 'size']),
+    (GruposPesquisaElasticFacil('.DATA.(>2021-01-01) .texto.(dano moral)', campos_disponiveis=CAMPOS_DISPONIVEIS), None, {'index': 'indice'}, ['query', 'highlight', '_source', 'size']),
+    (GruposPesquisaElasticFacil('', campos_disponiveis=CAMPOS_DISPONIVEIS), None, {'index': 'indice'}, ['query', 'size']),
+    (CacheQueriesElastic().get_pesquisa('dano ou moral'), {'highlight': 'ementa'}, {'index': 'indice'}, ['query', 'highlight', '_source', 'size']),
+    ({'query': {'match_all': {}}}, {'index': None}, {}, ['query', 'size']),
+)
+
+RETORNO_MSEARCH = {'responses': [
+    {'hits': {'total': {'value': 2}, 'hits': [
+        {'_id': '1', '_score': 2.5, '_source': {'texto': 'dano moral', 'tipo': 'a'}, 'highlight': {'texto': ['<em>dano</em> moral', 'outro <em>dano</em>']}},
+        {'_id': '2', '_score': 1.5, '_source': {'texto': 'sem grifo'}}]}},
+    {'error': {'type': 'search_phase_execution_exception', 'reason': 'all shards failed'}, 'status': 400},
+    {'hits': {'total': {'value': 0}, 'hits': []}},
+]}
+
+###########################################################
+# Cliente local com a API de point in time e search_after do elastic
+# os documentos são filtrados com o avaliador local (util_pesquisaelastic_canonico)
+#----------------------------------------------------------
+class ElasticLocal():
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.pits = {}
+        self.corpos = []
+
+    def open_point_in_time(self, index, keep_alive):
+        pit = f'pit-{len(self.pits)}'
+        self.pits[pit] = list(self.documentos) # visão estável do índice
+        return {'id': pit}
+
+    def close_point_in_time(self, body):
+        self.pits.pop(body['id'])
+        return {'succeeded': True}
+
+    def search(self, body):
+        self.corpos.append(body)
+        documentos = self.pits[body['pit']['id']]
+        hits = [{'_id': doc['id'], '_source': {k: v for k, v in doc.items() if k != 'id' and (body.get('_source') is None or k in body['_source'])},
+                 'sort': [i]} for i, doc in enumerate(documentos) if avaliar_query(body['query'], doc)]
+        total = len(hits)
+        inicio = body.get('search_after', [-1])[0]
+        hits = [_ for _ in hits if _['sort'][0] > inicio][:body['size']]
+        # um novo id de PIT a cada página
+        pit = body['pit']['id'] + '+'
+        self.pits[pit] = self.pits.pop(body['pit']['id'])
+        retorno = {'took': 1, 'pit_id': pit, 'hits': {'hits': hits}}
+        if body['track_total_hits']:
+            retorno['hits']['total'] = {'value': total, 'relation': 'eq'}
+        return retorno
+
+DOCUMENTOS_EXPORTACAO = [{'id': str(i), 'texto': 'dano moral' if i % 3 else 'dano material', 'ano': str(2000 + i % 25), 'tags': ['a', str(i)]}
+                         for i in range(250)]
+
+class Teste(unittest.TestCase):
+
+    def teste_1_msearch(self):
+        saida = StringIO()
+        campos = escrever_msearch([(_[0], _[1]) for _ in TESTES_MSEARCH], saida, index='indice')
+        linhas = saida.getvalue().split('\n')
+        self.assertEqual(linhas[-1], '') # termina com quebra de linha
+        self.assertEqual(len(linhas) - 1, len(TESTES_MSEARCH) * 2)
+        self.assertEqual(campos, ['texto', 'texto', 'ementa', 'texto', 'texto', 'ementa', 'texto'])
+        for i, teste in enumerate(TESTES_MSEARCH):
+            with self.subTest(f'Msearch {i}'):
+                pesquisa, opcoes, cabecalho, chaves = teste
+                self.assertDictEqual(json.loads(linhas[i*2]), cabecalho)
+                corpo = json.loads(linhas[i*2+1])
+                self.assertEqual(list(corpo.keys()), chaves)
+        # a query da pesquisa não é alterada com size/from
+        pe = TESTES_MSEARCH[0][0]
+        self.assertNotIn('size', pe.criterios_elastic_highlight)
+        self.assertEqual(json.loads(linhas[1])['highlight']['fields'].keys(), {'texto'})
+        self.assertEqual(json.loads(linhas[11])['highlight']['fields'].keys(), {'ementa'})
+        self.assertEqual(json.loads(linhas[9])['query'], {'match_none': {}})
+        # gerador de linhas sem manter as pesquisas
+        self.assertEqual(len(list(linhas_msearch(iter([TESTES_MSEARCH[0][0]])))), 2)
+        # saída binária com os mesmos corpos em bytes das pesquisas
+        binaria = BytesIO()
+        escrever_msearch([(_[0], _[1]) for _ in TESTES_MSEARCH], binaria, index='indice')
+        self.assertEqual(binaria.getvalue().decode('utf-8'), saida.getvalue())
+        self.assertEqual(binaria.getvalue().split(b'\n')[1], corpo_bytes_da_pesquisa(pe, 'texto', size=100))
+        # corpo em bytes igual à query com size e from
+        for pesquisa, _, _, _ in TESTES_MSEARCH:
+            for campo in ('', 'texto', 'ementa'):
+                with self.subTest(f'Bytes {pesquisa} {campo}'):
+                    esperado = dict(query_da_pesquisa(pesquisa, campo), size=10, **{'from': 5})
+                    self.assertEqual(json.loads(corpo_bytes_da_pesquisa(pesquisa, campo, size=10, desde=5)), esperado)
+
+    def teste_2_retorno(self):
+        res = separar_retorno_msearch(RETORNO_MSEARCH, ['texto', 'texto', 'texto'])
+        self.assertEqual(len(res), 3)
+        self.assertEqual(res[0]['total_documentos'], 2)
+        self.assertEqual(res[0]['documentos'][0], {'id': '1', 'score': 2.5, 'tipo': 'a',
+                         'texto': '<mark>dano</mark> moral <small><b>[..]</b></small> outro <mark>dano</mark>'})
+        self.assertEqual(res[0]['documentos'][1]['texto'], 'sem grifo')
+        self.assertEqual(res[1], {'documentos': [], 'total_documentos': 0, 'erro': 'all shards failed'})
+        self.assertEqual(res[2], {'documentos': [], 'total_documentos': 0})
+        # o retorno do elastic não é alterado
+        self.assertIn('texto', RETORNO_MSEARCH['responses'][0]['hits']['hits'][0]['_source'])
+
+    def teste_3_exportacao(self):
+        cliente = ElasticLocal(DOCUMENTOS_EXPORTACAO)
+        exportacao = ExportacaoPesquisa(cliente, PesquisaElasticFacil('dano adj1 moral'), 'indice', tamanho_pagina=40)
+        documentos = iter(exportacao)
+        self.assertEqual(next(documentos), {'id': '1', 'texto': 'dano moral', 'ano': '2001', 'tags': ['a', '1']})
+        self.assertEqual(len(exportacao.paginas), 1) # os documentos são lidos por página
+        documentos = [_['id'] for _ in documentos]
+        esperados = [_['id'] for _ in DOCUMENTOS_EXPORTACAO if _['texto'] == 'dano moral']
+        self.assertEqual(['1'] + documentos, esperados)
+        self.assertEqual((exportacao.total, exportacao.documentos, len(exportacao.paginas)), (166, 166, 5))
+        self.assertEqual(cliente.pits, {}) # PIT fechado
+        self.assertEqual(cliente.corpos[0]['sort'], [{'_shard_doc': 'asc'}])
+        self.assertNotIn('search_after', cliente.corpos[0])
+        self.assertEqual(cliente.corpos[1]['search_after'], [59])
+        self.assertEqual(cliente.corpos[1]['pit']['id'], 'pit-0+')
+        self.assertEqual([_['track_total_hits'] for _ in cliente.corpos], [True, False, False, False, False])
+        resumo = exportacao.resumo()
+        self.assertEqual((resumo['documentos'], resumo['paginas']), (166, 5))
+        # limite, campos e grupos - o PIT é fechado ao interromper a leitura
+        grupos = GruposPesquisaElasticFacil('.texto.(dano) .ano.(>=2020)', campos_disponiveis={'texto': '', 'ano': ''})
+        exportacao = ExportacaoPesquisa(cliente, grupos, 'indice', campos=['ano'], tamanho_pagina=10, limite=25)
+        documentos = list(exportacao)
+        self.assertEqual(len(documentos), 25)
+        self.assertEqual([_['documentos'] for _ in exportacao.paginas], [10, 10, 5])
+        self.assertEqual(documentos[0], {'id': '20', 'ano': '2020'})
+        for doc in ExportacaoPesquisa(cliente, grupos, 'indice', tamanho_pagina=10):
+            break
+        self.assertEqual(cliente.pits, {})
+        # nenhum documento
+        exportacao = ExportacaoPesquisa(cliente, PesquisaElasticFacil('xyz'), 'indice')
+        self.assertEqual((list(exportacao), exportacao.total, len(exportacao.paginas)), ([], 0, 1))
+
+    def teste_4_escritores(self):
+        documentos = [{'id': '1', 'texto': 'dano; moral', 'tags': ['a', 'b']}, {'id': '2', 'texto': 'x', 'outro': 1}]
+        saida = StringIO()
+        self.assertEqual(escrever_jsonl(iter(documentos), saida), 2)
+        self.assertEqual([json.loads(_) for _ in saida.getvalue().splitlines()], documentos)
+        saida = StringIO()
+        self.assertEqual(escrever_csv(iter(documentos), saida), 2)
+        linhas = list(csv.reader(StringIO(saida.getvalue()), delimiter=';'))
+        self.assertEqual(linhas, [['id', 'texto', 'tags'], ['1', 'dano; moral', '["a", "b"]'], ['2', 'x', '']])
+        saida = StringIO()
+        escrever_csv(documentos, saida, colunas=['id', 'outro'], delimitador=',')
+        self.assertEqual(saida.getvalue().splitlines(), ['id,outro', '1,', '2,1'])
+        self.assertEqual(escrever_csv([], StringIO()), 0)
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -33,14 +33,54 @@
 #                        - mensagens e alertas para apresentação ao usuário
 # Ver 0.2.1 - 25/10/2021 - .raw ou raw nos sufixos
 # Ver 0.3.0 - 26/10/2021 - testes unitários e pequenas correções na tokenização
+# Ver 0.4.0 - 18/10/2026 - cache LRU de queries compiladas (CacheQueriesElastic) com TTL e queries imutáveis
+# Ver 0.4.1 - 18/10/2026 - ParserPesquisaElastic: análise dos critérios em uma leitura criando uma árvore de nós
+# Ver 0.4.2 - 18/10/2026 - queries construídas no primeiro acesso, highlight sem deepcopy e __slots__
+# Ver 0.4.3 - 18/10/2026 - tabela de tokens classificados (TipoToken) usada por Operadores e pelo parser
+# Ver 0.4.4 - 18/10/2026 - compilar_lote: compilação de muitos critérios com pool de processos opcional
+# Ver 0.4.5 - 18/10/2026 - observadores da compilação com duração das etapas (EventoCompilacao)
+# Ver 0.4.6 - 18/10/2026 - sufixo_campo_reverso: curingas no início do termo pesquisados com prefix no campo reverso
+# Ver 0.4.7 - 18/10/2026 - numeros_como_termos: números sem curingas pesquisados com as formas indexadas (terms/span_or)
+# Ver 0.4.8 - 18/10/2026 - ConfigMultiTermos: rewrite e max_determinized_states dos curingas por formato, pesquisa e campo
+# Ver 0.4.9 - 18/10/2026 - GruposPesquisaElasticFacil: contexto_filtro (bool.filter) para intervalos, valores e campos de filtro e constant_score
+# Ver 0.4.10 - 18/10/2026 - ConfigHighlight: highlight unified/fvh, fragmentos, marcações e highlight_query só com os critérios de texto
+# Ver 0.4.11 - 18/10/2026 - acentos e minúsculas com as tabelas de util_pesquisaelastic_normalizacao (mesma dobra dos documentos)
+# Ver 0.4.12 - 18/10/2026 - query em bytes (UTF-8) serializada uma vez por pesquisa, orjson opcional e size/from/highlight sem serializar a query novamente
+# Ver 0.4.13 - 18/10/2026 - termos_chave: CONTÉM: com os termos chave extraídos localmente (util_pesquisaelastic_termos)
+# Ver 0.4.14 - 18/10/2026 - normalização NFKD quando util_pesquisaelastic_normalizacao não estiver disponível
+# Ver 0.4.15 - 18/10/2026 - ParserPesquisaElastic cria os nós durante a leitura do texto e a query é montada apenas pela árvore
 #
-# TODO: 
+# TODO:
 # - ampliar casos de teste
- 
+
 import re
-from unicodedata import normalize
+import sys
 import json
+import warnings
 from copy import deepcopy
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, perf_counter_ns
+from functools import partial
+from itertools import product
+from multiprocessing import Pool
+# normalização compartilhada com os documentos (util_pesquisaelastic_normalizacao)
+# sem o módulo o componente continua funcionando com a normalização NFKD
+try:
+    from util_pesquisaelastic_normalizacao import remover_acentos, minusculas_sem_acentos
+except ImportError:
+    from unicodedata import normalize
+    def remover_acentos(texto):
+        if texto.isascii():
+            return texto
+        return normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
+    def minusculas_sem_acentos(texto):
+        return remover_acentos(texto).lower()
+# serialização rápida opcional das queries em bytes (ver query_em_bytes)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 CRITERIO_CAMPO_HIGHLIGHT = {"require_field_match": False,"max_analyzed_offset": 1000000}
 ERRO_PARENTESES_FALTA_FECHAR = 'Parênteses incompletos nos critérios de pesquisa - falta fechamento de parênteses.'
@@ -52,6 +92,8 @@ ERRO_OPERADOR_OU_CAMPO_RAIZ = 'Não são aceitos operadores OU entre critérios
 
 PRINT_DEBUG = False
 PRINT_WARNING = True
+# observadores da compilação das pesquisas (ver EventoCompilacao e registrar_observador)
+OBSERVADORES_COMPILACAO = []
 
 ###########################################################
 # Controla o uso de operadores válidos nas pesquisas, 
@@ -83,22 +125,39 @@ class Operadores():
     RE_OPERADOR_RANGE = re.compile(r'>=|<=|>|<|lte|gte|lt|gt', re.IGNORECASE)
     OPERADOR_PADRAO = 'E'
     OPERADOR_ADJ1 = 'ADJ1'
+    OPERADOR_NAO = 'NAO'
+    OPERADORES_SIMPLES = frozenset(('e','ou','não','nao','com','and','or','not'))
+    # tabela de tokens já classificados (ver TipoToken) - é limpa ao atingir o tamanho máximo
+    # TAMANHO_TABELA_TIPOS = 0 desativa a tabela e classifica o token a cada chamada
+    TABELA_TIPOS = {}
+    TAMANHO_TABELA_TIPOS = 20000
+    # números com mais formas que o máximo continuam sendo pesquisados com regexp (ver formas_termo_numerico)
+    MAXIMO_FORMAS_NUMERICAS = 64
+    RE_VALOR_NUMERICO_FORMAS = re.compile(r'\d+(?:_\?\d+)*$')
+
+    # retorna a classificação do token, criando e guardando na tabela se ainda não existir
+    @classmethod
+    def tipo_token(self, token):
+        tipo = self.TABELA_TIPOS.get(token)
+        if tipo is None:
+            tipo = TipoToken(token)
+            if self.TAMANHO_TABELA_TIPOS > 0:
+                if len(self.TABELA_TIPOS) >= self.TAMANHO_TABELA_TIPOS:
+                    self.TABELA_TIPOS.clear()
+                self.TABELA_TIPOS[sys.intern(token)] = tipo
+        return tipo
+
     # retorna true se o token recebido é um critério conhecido
     @classmethod
     def e_operador(self,token):
         if type(token) is not str:
             return False
-        if token.lower() in ('e','ou','não','nao','com','and','or','not'):
-           return True
-        if self.RE_TOKEN_CRITERIOS.match(token):
-            #print('Critério: ', token, f'({self.n_do_criterio(token)})')
-            return True
-        return False
+        return self.tipo_token(token).e_operador
 
     # retorna true se o token recebido é um ADJ
     @classmethod
     def e_operador_adj(self,token):
-        return self.RE_TOKEN_ADJ.match(token)
+        return self.tipo_token(token).e_adj
 
     # retorna true se o token recebido é um ADJ
     @classmethod
@@ -108,64 +167,55 @@ class Operadores():
     # retorna true se o token recebido é um ADJ
     @classmethod
     def e_operador_ou(self,token):
-        return self.RE_TOKEN_OU.match(token)
+        return self.tipo_token(token).e_ou
 
     # retorna true se o token recebido é um ADJ
     @classmethod
     def e_operador_e(self,token):
-        return self.RE_TOKEN_E.match(token)
+        return self.tipo_token(token).e_e
 
     # retorna true se o token recebido é um PROX
     @classmethod
     def e_operador_prox(self,token):
-        return self.RE_TOKEN_PROX.match(token)
+        return self.tipo_token(token).e_prox
 
     # retorna true se o token recebido é um COM
     @classmethod
     def e_operador_com(self,token):
-        return self.RE_TOKEN_COM.match(token)
+        return self.tipo_token(token).e_com
 
     # retorna true se o token é um critério slop
     @classmethod
     def e_operador_slop(self,token):
-        return self.e_operador_adj(token) or self.e_operador_prox(token)
+        return self.tipo_token(token).e_slop
 
     # retorna true se o token é um critério que pode vir antes/depois de parênteses
     @classmethod
     def e_operador_que_pode_antes_depois_parenteses(self,token):
-        return self.e_operador_ou(token) or self.e_operador_nao(token) or self.e_operador_e(token)
+        return self.tipo_token(token).pode_parenteses
 
     # retorna n do critério
     @classmethod
     def n_do_operador(self,token):
-        n = self.RE_TOKEN_N.findall(token)
-        if not any(n):
-            return 1
-        return int(n[0])
+        return self.tipo_token(token).n
 
     # retorno o tipo e o n
     @classmethod
     def get_operador_n(self, token):
-        n = self.n_do_operador(token)
-        criterio = self.RE_TOKEN_N.sub('', token)
-        return criterio, n
+        tipo = self.tipo_token(token)
+        return tipo.operador, tipo.n
 
     # retorno do critério se ele for um critério de agrupamento
     @classmethod
     def get_operador_agrupamento(self, token):
         if type(token) is not str:
             return ''
-        criterio = self.RE_TOKEN_N.sub('', token)
-        if self.RE_TOKEN_CRITERIOS_AGRUPAMENTO.match(criterio):
-            return criterio
-        return ''
+        return self.tipo_token(token).agrupamento
 
     # formatar termos e operadores de pesquisa
     @classmethod
     def formatar_token(self, token):
-        if self.e_operador(token):
-            return self.formatar_operador(token)
-        return self.formatar_termo(token)
+        return self.tipo_token(token).get_formatado()
 
     # formata os tokens e quebra tokens com caracteres estranhos como termo1:termo2
     @classmethod
@@ -280,6 +330,21 @@ class Operadores():
         termo = termo.replace('_!','_?') # curinga de números retornando
         return termo.replace('*','.*')
 
+    # retorna as formas indexadas do valor numérico formatado para pesquisa (ver formatar_termo_numerico_pesquisa)
+    # cada _? pode ou não ter o separador _ no índice: 1_?234_?567 => 1234567, 1234_567, 1_234567, 1_234_567
+    # retorna () se o valor tiver curingas ou se passar de MAXIMO_FORMAS_NUMERICAS formas
+    @classmethod
+    def formas_termo_numerico(self, valor):
+        if not self.RE_VALOR_NUMERICO_FORMAS.match(valor):
+            return ()
+        partes = valor.split('_?')
+        if 2 ** (len(partes) - 1) > self.MAXIMO_FORMAS_NUMERICAS:
+            return ()
+        res = []
+        for separadores in product(('', '_'), repeat=len(partes) - 1):
+            res.append(''.join(p + s for p, s in zip(partes, separadores + ('',))))
+        return tuple(res)
+
     @classmethod
     def formatar_termo_numerico_pesquisa(self, termo):
         if not self.RE_TERMO_NUMERICO.match(termo):
@@ -303,7 +368,7 @@ class Operadores():
 
     @classmethod
     def remover_acentos(self, txt):
-        return normalize('NFKD', txt).encode('ASCII', 'ignore').decode('ASCII')
+        return remover_acentos(txt)
 
     # retorna o campo texto ou o campo texto com o sufico raw se existirem critérios entre aspas
     # unico = True exige que mesmo existindo uma lista de campos, somento o primeiro seja retornado
@@ -327,10 +392,936 @@ class Operadores():
         # o termo pode vir como string ou como uma sublista - ao colocar em uma lista, tem o mesmo comportamento de grupo
         return self.campo_texto_grupo(criterios=[termo], campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw, unico=unico)
 
+    # retorna o campo reverso (ex.: texto.reverse) se o termo for pesquisado no campo texto
+    # o campo raw (termos entre aspas) não tem campo reverso pois subcampos não podem ter subcampos
+    @classmethod
+    def campo_texto_reverso(self, campo_usado, campo_texto, sufixo_campo_reverso):
+        if not sufixo_campo_reverso or campo_usado != campo_texto:
+            return None
+        return f'{campo_texto}{sufixo_campo_reverso}'
+
+    # normaliza o sufixo de campo para começar com ponto
+    @classmethod
+    def sufixo_campo(self, sufixo):
+        sufixo = '' if not sufixo else str(sufixo)
+        return f'.{sufixo}' if sufixo and sufixo[0] != '.' else sufixo
+
     @classmethod
     def contem_operador_agrupado(self, criterios):
         return self.RE_OPERADOR_CAMPOS_GRUPOS.search(criterios)
 
+###########################################################
+# Classificação de um token (termo ou operador) feita uma única vez
+# e guardada na tabela de tokens internados (Operadores.tipo_token)
+# - e_operador e e_adj, e_prox, e_com, e_ou, e_e, e_nao, e_slop: tipo do operador
+# - operador e n: operador sem o n e a distância (ADJ2 => ADJ, 2)
+# - agrupamento: operador de agrupamento (ADJ, PROX, OU) ou vazio
+# - curinga, regex, numerico, aspas: características do termo para a query
+# - get_formatado(), get_tokens(), get_valor() e get_formas(): criados apenas quando usados
+#----------------------------------------------------------
+class TipoToken():
+    __slots__ = ('token', 'e_operador', 'e_adj', 'e_prox', 'e_com', 'e_ou', 'e_e', 'e_nao', 'e_slop',
+                 'pode_parenteses', 'operador', 'n', 'agrupamento',
+                 'curinga', 'regex', 'numerico', 'aspas',
+                 '__formatado__', '__tokens__', '__valor__', '__formas__')
+
+    def __init__(self, token):
+        self.token = token
+        self.__formatado__ = self.__tokens__ = self.__valor__ = self.__formas__ = None
+        # os operadores são um subconjunto dos tokens simples e dos tokens ADJ, PROX e COM
+        self.e_operador = token.lower() in Operadores.OPERADORES_SIMPLES or \
+                          bool(Operadores.RE_TOKEN_CRITERIOS.match(token))
+        if self.e_operador:
+            self.e_adj = bool(Operadores.RE_TOKEN_ADJ.match(token))
+            self.e_prox = bool(Operadores.RE_TOKEN_PROX.match(token))
+            self.e_com = bool(Operadores.RE_TOKEN_COM.match(token))
+            self.e_ou = bool(Operadores.RE_TOKEN_OU.match(token))
+            self.e_e = bool(Operadores.RE_TOKEN_E.match(token))
+        else:
+            self.e_adj = self.e_prox = self.e_com = self.e_ou = self.e_e = False
+        self.e_nao = token == Operadores.OPERADOR_NAO
+        self.e_slop = self.e_adj or self.e_prox
+        self.pode_parenteses = self.e_ou or self.e_nao or self.e_e
+        n = Operadores.RE_TOKEN_N.findall(token)
+        self.n = int(n[0]) if any(n) else 1
+        self.operador = sys.intern(Operadores.RE_TOKEN_N.sub('', token)) if n else token
+        self.agrupamento = self.operador if Operadores.RE_TOKEN_CRITERIOS_AGRUPAMENTO.match(self.operador) else ''
+        # termo para a query (como é usado em PesquisaElasticFacil.as_query_operador)
+        _token = token.lower()
+        self.aspas = token.find('"') >= 0
+        self.curinga = _token.find('*') >= 0
+        self.numerico = bool(Operadores.RE_TERMO_NUMERICO.match(_token))
+        self.regex = _token.find('?') >= 0 or self.numerico
+
+    # token formatado para pesquisa ou apresentação
+    def get_formatado(self):
+        if self.__formatado__ is None:
+            if self.e_operador:
+                self.__formatado__ = sys.intern(Operadores.formatar_operador(self.token))
+            else:
+                self.__formatado__ = Operadores.formatar_termo(self.token)
+        return self.__formatado__
+
+    # tokens pesquisáveis resultantes da formatação (termo1|termo2 => termo1 termo2)
+    def get_tokens(self):
+        if self.__tokens__ is None:
+            _tk = self.get_formatado()
+            if (not _tk) or Operadores.RE_TERMO_SO_CURINGA.match(_tk):
+                self.__tokens__ = ()
+            else:
+                self.__tokens__ = tuple(sys.intern(_) for _ in _tk.split(' ') if not Operadores.RE_TERMO_SO_CURINGA.match(_))
+        return self.__tokens__
+
+    # valor do termo na query: sem acentos e aspas e convertido em regex se necessário
+    def get_valor(self):
+        if self.__valor__ is None:
+            _token = minusculas_sem_acentos(self.token)
+            _token = _token.replace("'",'').replace('"','')
+            if self.regex:
+                _token = Operadores.termo_regex_interroga(_token)
+            self.__valor__ = _token
+        return self.__valor__
+
+    # formas indexadas de um número sem curingas (ver Operadores.formas_termo_numerico) ou ()
+    def get_formas(self):
+        if self.__formas__ is None:
+            if self.numerico and not self.curinga and self.token.find('?') < 0:
+                self.__formas__ = Operadores.formas_termo_numerico(self.get_valor())
+            else:
+                self.__formas__ = ()
+        return self.__formas__
+
+    def __repr__(self) -> str:
+        return f'TipoToken({self.token!r})'
+
+# classificação usada para sublistas e nós (não são operadores)
+TIPO_NAO_TOKEN = TipoToken('')
+
+###########################################################
+# Árvore dos critérios de pesquisa (AST)
+# - NoTermo: termo de pesquisa (com ou sem aspas e curingas)
+# - NoNao: nega o termo ou grupo seguinte
+# - NoE, NoOU: grupos de termos/grupos com o operador E ou OU
+# - NoProximidade: grupos ADJn/PROXn convertidos em span_near
+# - NoFrase: termos entre aspas ("dano moral" ==> "dano" ADJ1 "moral")
+# Os grupos guardam os operadores escritos antes de cada filho para
+# reconstruir os critérios como listas (criterios_listas) ou texto
+#----------------------------------------------------------
+class NoPesquisa():
+    __slots__ = ()
+
+    def as_string(self):
+        res = []
+        self.planificar(res)
+        return ' '.join(res).replace('( ','(').replace(' )',')')
+
+class NoTermo(NoPesquisa):
+    __slots__ = ('termo',)
+
+    def __init__(self, termo):
+        self.termo = termo
+
+    def as_lista(self):
+        return self.termo
+
+    def planificar(self, res):
+        res.append(self.termo)
+
+    def contar_termos(self):
+        return 1
+
+    def __repr__(self) -> str:
+        return f'NoTermo({self.termo!r})'
+
+class NoNao(NoPesquisa):
+    __slots__ = ('filho',)
+
+    def __init__(self, filho):
+        self.filho = filho
+
+    def planificar(self, res):
+        res.append(Operadores.OPERADOR_NAO)
+        self.filho.planificar(res)
+
+    def contar_termos(self):
+        return self.filho.contar_termos()
+
+    def __repr__(self) -> str:
+        return f'NoNao({self.filho!r})'
+
+class NoGrupo(NoPesquisa):
+    # filhos: nós do grupo (NoNao já envolve o nó negado)
+    # operadores: tupla com os operadores escritos antes de cada filho (inclusive o NAO)
+    # operadores_finais: operadores que sobraram no final do grupo
+    # operador e n: operador e maior distância do grupo (Operadores.operador_n_do_grupo)
+    # aspas: algum termo do grupo está entre aspas (campo raw para todos os termos do slop)
+    __slots__ = ('filhos', 'operadores', 'operadores_finais', 'operador', 'n', 'aspas')
+
+    def __init__(self, filhos, operadores, operador, n, aspas, operadores_finais = ()):
+        self.filhos = filhos
+        self.operadores = operadores
+        self.operadores_finais = operadores_finais
+        self.operador = operador
+        self.n = n
+        self.aspas = aspas
+
+    # operadores e filhos na ordem em que foram escritos
+    def __itens__(self):
+        for ops, filho in zip(self.operadores, self.filhos):
+            yield from ops
+            if type(filho) is NoNao:
+                if Operadores.OPERADOR_NAO not in ops:
+                    yield Operadores.OPERADOR_NAO
+                filho = filho.filho
+            yield filho
+        yield from self.operadores_finais
+
+    def as_lista(self):
+        return [_ if type(_) is str else _.as_lista() for _ in self.__itens__()]
+
+    def contar_termos(self):
+        return sum(_.contar_termos() for _ in self.filhos)
+
+    def planificar(self, res):
+        for item in self.__itens__():
+            if type(item) is str:
+                res.append(item)
+            elif isinstance(item, NoGrupo):
+                res.append('(')
+                item.planificar(res)
+                res.append(')')
+            else:
+                res.append(item.termo)
+
+    # monta a condição do elastic para o grupo (must, must_not, should ou span_near de acordo com o operador)
+    # sufixo_campo_reverso: subcampo com os termos invertidos para curingas no início do termo
+    # numeros_como_termos: números sem curingas viram terms/span_or com as formas indexadas
+    # multi_termos: ConfigMultiTermos com os limites da expansão de curingas
+    def as_query(self, campo_texto, sufixo_campo_raw, sufixo_campo_reverso = '', numeros_como_termos = False, multi_termos = None):
+        must, must_not, should, span_near = [], [], [], []
+        operador_grupo = self.operador
+        e_slop = bool(Operadores.e_operador_slop(operador_grupo))
+        e_ou = bool(Operadores.e_operador_ou(operador_grupo))
+        e_e = bool(Operadores.e_operador_e(operador_grupo))
+        _campo_texto_slop = Operadores.campo_texto_grupo(['"'] if self.aspas else [], campo_texto, sufixo_campo_raw, unico = True)
+        _campo_reverso_slop = Operadores.campo_texto_reverso(_campo_texto_slop, campo_texto, sufixo_campo_reverso)
+        for filho in self.filhos:
+            operador_nao = type(filho) is NoNao
+            if operador_nao:
+                filho = filho.filho
+            if isinstance(filho, NoGrupo):
+                grupo_convertido = filho.as_query(campo_texto, sufixo_campo_raw, sufixo_campo_reverso, numeros_como_termos, multi_termos)
+                if operador_nao:
+                    must_not.append(grupo_convertido)
+                elif e_ou:
+                    should.append(grupo_convertido)
+                else:
+                    must.append(grupo_convertido)
+            elif operador_nao:
+                _campo_texto = Operadores.campo_texto_termo(filho.termo, campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw, unico=True)
+                _campo_reverso = Operadores.campo_texto_reverso(_campo_texto, campo_texto, sufixo_campo_reverso)
+                must_not.append(PesquisaElasticFacil.as_query_operador(filho.termo, Operadores.OPERADOR_PADRAO, _campo_texto, _campo_reverso, numeros_como_termos, multi_termos))
+            elif e_slop:
+                span_near.append(PesquisaElasticFacil.as_query_operador(filho.termo, operador_grupo, _campo_texto_slop, _campo_reverso_slop, numeros_como_termos, multi_termos))
+            else:
+                _campo_texto = Operadores.campo_texto_termo(filho.termo, campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw, unico=True)
+                _campo_reverso = Operadores.campo_texto_reverso(_campo_texto, campo_texto, sufixo_campo_reverso)
+                grupo_convertido = PesquisaElasticFacil.as_query_operador(filho.termo, operador_grupo, _campo_texto, _campo_reverso, numeros_como_termos, multi_termos)
+                if e_ou:
+                    should.append(grupo_convertido)
+                elif e_e:
+                    must.append(grupo_convertido)
+        if any(span_near):
+            span_near = {'clauses' : span_near,
+                         'slop' : max(0, self.n -1 ),
+                         'in_order' : bool(Operadores.e_operador_adj(operador_grupo))}
+        return PesquisaElasticFacil.as_bool_must(must = must, must_not = must_not, should=should, span_near=span_near)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.operador}{self.n if self.n>1 else ""}: {list(self.filhos)!r})'
+
+class NoE(NoGrupo):
+    __slots__ = ()
+
+class NoOU(NoGrupo):
+    __slots__ = ()
+
+class NoProximidade(NoGrupo):
+    __slots__ = ()
+
+    @property
+    def em_ordem(self):
+        return bool(Operadores.e_operador_adj(self.operador))
+
+class NoFrase(NoProximidade):
+    __slots__ = ()
+
+###########################################################
+# Constrói a árvore de critérios em uma única leitura do texto escrito pelo usuário
+# - cada parênteses abre um nível (_NivelPesquisa) que recebe os tokens na ordem do texto
+# - ao fechar os parênteses, o nível junta as aspas, formata os tokens, agrupa os operadores,
+#   corrige os operadores e cria os nós - o nível de cima recebe o nível já convertido
+# - parênteses vazios ou desnecessários são removidos ao fechar: (termo) = termo, ((a b)) = (a b)
+# Os tokens são classificados e formatados pela tabela de Operadores.tipo_token
+#----------------------------------------------------------
+class ParserPesquisaElastic():
+    RE_TOKENS = re.compile(r'[()"]|[^\s()"]+')
+    # etapas medidas em cada nível e somadas na compilação
+    ETAPAS_NIVEIS = ('aspas', 'formatacao', 'agrupamento', 'operadores')
+    __slots__ = ('e_subgrupo_pesquisa', 'etapas')
+
+    def __init__(self, e_subgrupo_pesquisa = False):
+        self.e_subgrupo_pesquisa = e_subgrupo_pesquisa
+        self.etapas = None
+
+    # retorna o nó raiz com os critérios (sempre um grupo)
+    # etapas: dicionário que recebe a duração (ns) de cada etapa quando a compilação é observada
+    #   limpeza, aspas, formatacao, agrupamento, operadores (correção dos operadores e nós)
+    #   e arvore (leitura dos parênteses e níveis sem as etapas dos níveis)
+    def analisar(self, criterios, etapas = None):
+        self.etapas = etapas
+        inicio = perf_counter_ns() if etapas is not None else 0
+        texto = Operadores.RE_LIMPAR_CRITERIOS_INICIAIS.sub(' ', str(criterios)).replace("'",'"')
+        inicio = _etapa(etapas, 'limpeza', inicio)
+        no = self.__ler__(texto)
+        if etapas is not None:
+            _etapa(etapas, 'arvore', inicio)
+            etapas['arvore'] -= sum(etapas.get(_, 0) for _ in self.ETAPAS_NIVEIS)
+        return no
+
+    # critérios em listas de tokens sem converter os níveis: cada parênteses vira uma sublista
+    # exemplo:  ((teste1 teste2) e (teste3 teste4) teste5)
+    #   vira :  [['teste1','teste2'], ['teste3', 'teste4'], 'teste5']
+    def listas(self, criterios):
+        comp_msg = f' {ERRO_PARENTESES_CAMPO}' if self.e_subgrupo_pesquisa else ''
+        lista = []
+        pilha = []
+        for x in self.RE_TOKENS.findall(str(criterios).replace("'",'"')):
+            if x == '(':
+                pilha.append(lista)
+                lista = []
+                pilha[-1].append(lista)
+            elif x == ')':
+                if not pilha:
+                    raise ValueError(str(f'{ERRO_PARENTESES_FECHOU_MAIS}{comp_msg}'))
+                lista = pilha.pop()
+            else:
+                lista.append(x)
+        if pilha:
+            raise ValueError(str(f'{ERRO_PARENTESES_FALTA_FECHAR}{comp_msg}'))
+        return lista
+
+    # leitura do texto: os níveis são abertos e fechados nos parênteses
+    def __ler__(self, texto):
+        comp_msg = f' {ERRO_PARENTESES_CAMPO}' if self.e_subgrupo_pesquisa else ''
+        nivel = _NivelPesquisa()
+        pilha = []
+        erro = None # os erros de parênteses têm prioridade sobre os erros dos operadores
+        for x in self.RE_TOKENS.findall(texto):
+            if x == '(':
+                pilha.append(nivel)
+                nivel = _NivelPesquisa()
+            elif x == ')':
+                if not pilha:
+                    raise ValueError(str(f'{ERRO_PARENTESES_FECHOU_MAIS}{comp_msg}'))
+                if erro is None:
+                    try:
+                        self.__fechar_nivel__(nivel)
+                    except Exception as e:
+                        erro = e
+                pai = pilha.pop()
+                pai.tokens.append(nivel)
+                pai.niveis = True
+                nivel = pai
+            else:
+                nivel.tokens.append(x)
+        if pilha:
+            raise ValueError(str(f'{ERRO_PARENTESES_FALTA_FECHAR}{comp_msg}'))
+        if erro is not None:
+            raise erro
+        return self.__raiz__(nivel)
+
+    # nível fechado: conteúdo sem os parênteses desnecessários e valor usado no nível de cima (None se for ignorado)
+    def __fechar_nivel__(self, nivel):
+        valores = nivel.fechar()
+        if valores is None:
+            return
+        nivel.itens = self.__ler_nivel__(valores)
+        inicio = perf_counter_ns() if self.etapas is not None else 0
+        nivel.conteudo = self.__desembrulhar__(nivel.itens)
+        _etapa(self.etapas, 'operadores', inicio)
+        nivel.valor = nivel.conteudo if any(nivel.itens) else None
+
+    # junta os termos entre aspas, formata os tokens e agrupa os valores do nível
+    def __ler_nivel__(self, valores):
+        etapas = self.etapas
+        inicio = perf_counter_ns() if etapas is not None else 0
+        aspas = '"' in valores
+        if aspas:
+            valores = self.__juntar_aspas__(valores)
+        inicio = _etapa(etapas, 'aspas', inicio)
+        itens = self.__formatar__(valores)
+        inicio = _etapa(etapas, 'formatacao', inicio)
+        if aspas:
+            # os termos entre aspas são agrupados como um nível
+            itens = [self.__agrupar__(self.__agrupar__(_)) if type(_) is list else _ for _ in itens]
+        itens = self.__agrupar__(self.__agrupar__(itens))
+        _etapa(etapas, 'agrupamento', inicio)
+        return itens
+
+    # junta os termos entre aspas com ADJ1 (ver PesquisaElasticFacil.quebra_aspas_adj1)
+    # se o último valor for um nível ou lista dentro das aspas, os termos dele ficam entre as aspas
+    # sublista: função aplicada aos níveis e listas fora das aspas (None mantém como estão)
+    def __juntar_aspas__(self, valores, sublista = None):
+        res = []
+        aspas = False
+        aspas_txt = '' # vai acrescentando os termos entre aspas
+        ultimo_i = len(valores)-1
+        for i, tk in enumerate(valores):
+            ultimo_token = i == ultimo_i
+            e_token = type(tk) is str
+            # fim de aspas
+            if (tk == '"' or ultimo_token or not e_token) and aspas and aspas_txt:
+                if ultimo_token:
+                    aspas_txt += f' {tk if e_token else _termos(tk)}'
+                    tk = ''
+                res.append(PesquisaElasticFacil.quebra_aspas_adj1(aspas_txt.strip()))
+                aspas_txt = ''
+                aspas = False
+                tk = '' if tk == '"' else tk
+            if type(tk) is not str:
+                res.append(tk if sublista is None else sublista(tk))
+            elif tk == '"' and not aspas:
+                aspas = True
+                aspas_txt = ''
+            elif aspas:
+                aspas_txt += f' {tk}'
+            elif tk:
+                res.append(tk)
+        if aspas_txt:
+            res.append(PesquisaElasticFacil.quebra_aspas_adj1(aspas_txt.strip()))
+        return res
+
+    # formata os tokens e quebra tokens com caracteres estranhos como termo1|termo2
+    # as listas de termos entre aspas também são formatadas e os níveis continuam como estão
+    def __formatar__(self, valores):
+        itens = []
+        for tk in valores:
+            if type(tk) is str:
+                itens.extend(Operadores.tipo_token(tk).get_tokens())
+            elif type(tk) is list:
+                itens.append(self.__formatar__(tk))
+            else:
+                itens.append(tk)
+        return itens
+
+    # agrupa OU, ADJ e PROX (precedência sobre o E)
+    # exemplos:
+    #   termo1 E termo2 OU termo3 OU termo4 = termo1 E (termo2 OU termo3 OU termo4)
+    #   termo1 OU termo2 termo3 = (termo1 OU termo2) termo3
+    #   termo1 ADJ2 termo2 PROX3 termo3 = (termo1 ADJ2 termo2) (termo2 PROX3 termo3)
+    # o agrupamento é feito duas vezes para agrupar os grupos que ficaram soltos com OU no meio
+    def __agrupar__(self, itens):
+        res = []
+        grupo = []
+        grupo_any = False # equivale a any(grupo), listas e tokens vazios não contam
+        grupo_operador = ''
+        tipos = [Operadores.tipo_token(_) if type(_) is str else TIPO_NAO_TOKEN for _ in itens]
+        tipos.append(TIPO_NAO_TOKEN)
+        for i, token in enumerate(itens):
+            e_op = tipos[i].e_operador
+            e_op_proximo, operador_proximo = tipos[i+1].e_operador, tipos[i+1].agrupamento
+            e_op_anterior = tipos[i-1].e_operador if i > 0 else False
+            # dois operadores seguidos, mantém o segundo
+            if e_op and e_op_proximo:
+                continue
+            # termo com termo ou lista com termo, finaliza o agrupamento
+            if (not e_op_anterior) and (not e_op) and grupo_any:
+                res.append(grupo)
+                grupo_operador = ''
+                grupo, grupo_any = [], False
+            # próximo é um operador mas não é de agrupamento, finaliza o agrupamento com o token
+            if (not operador_proximo) and e_op_proximo and grupo_any:
+                grupo.append(token)
+                res.append(grupo)
+                grupo_operador = ''
+                grupo, grupo_any = [], False
+            elif operador_proximo:
+                if grupo_operador and grupo_operador != operador_proximo:
+                    grupo.append(token)
+                    res.append(grupo)
+                    grupo, grupo_any = [], False
+                    # prox ou adj antes e depois, o token fica compartilhado nos dois grupos
+                    if Operadores.e_operador_slop(operador_proximo) and Operadores.e_operador_slop(grupo_operador):
+                        grupo.append(token)
+                        grupo_any = bool(token)
+                        grupo_operador = operador_proximo
+                    else:
+                        grupo_operador = ''
+                else:
+                    grupo.append(token)
+                    grupo_any = grupo_any or bool(token)
+                    grupo_operador = operador_proximo
+            elif grupo_any:
+                grupo.append(token)
+            else:
+                res.append(token)
+        if grupo_any:
+            res.append(grupo)
+        return res
+
+    # remove as listas de um único item e corrige os operadores da lista que sobrar
+    def __desembrulhar__(self, lista):
+        while type(lista) is list and len(lista) == 1:
+            lista = lista[0]
+        if type(lista) is _NivelPesquisa:
+            return lista.conteudo
+        if type(lista) is str or len(lista) == 0:
+            return lista or None
+        res = self.__valores__(lista)
+        if len(res) == 1:
+            return res[0]
+        itens = self.__corrigir_operadores__(res)
+        return _ListaCorrigida(itens, self.__no__(itens))
+
+    # valores dos tokens, níveis e listas do agrupamento - níveis e listas vazios são ignorados
+    def __valores__(self, lista):
+        res = []
+        for token in lista:
+            if type(token) is _NivelPesquisa:
+                token = token.valor
+                if token is None:
+                    continue
+            elif type(token) is not str:
+                if not any(token):
+                    continue
+                token = self.__desembrulhar__(token)
+                if token is None:
+                    continue
+            res.append(token)
+        return res
+
+    # nó raiz - um termo sozinho também fica em um grupo
+    def __raiz__(self, nivel):
+        valores = nivel.valores()
+        if len(valores) == 1 and type(valores[0]) is _NivelPesquisa:
+            itens = valores[0].itens
+        else:
+            itens = self.__ler_nivel__(valores)
+        inicio = perf_counter_ns() if self.etapas is not None else 0
+        res = self.__valores__(itens)
+        if len(res) == 1 and type(res[0]) is _ListaCorrigida and res[0].algum and isinstance(res[0].no, NoGrupo):
+            # o nó da lista já foi criado ao fechar o nível
+            no = res[0].no
+        else:
+            itens = res[0].itens if len(res) == 1 and type(res[0]) is _ListaCorrigida else self.__corrigir_operadores__(res)
+            no = self.__montar_no__(itens, True)
+        _etapa(self.etapas, 'operadores', inicio)
+        return no
+
+    def __corrigir_operadores__(self, lista):
+        res = []
+        ultimo_i = len(lista) - 1
+        tipos = [Operadores.tipo_token(_) if type(_) is str else TIPO_NAO_TOKEN for _ in lista]
+        for i, token in enumerate(lista):
+            token_anterior = lista[i-1] if i > 0 else ''
+            token_proximo = lista[i+1] if i < ultimo_i else ''
+            tipo = tipos[i]
+            e_op = tipo.e_operador
+            # dois operadores seguidos, mantém o segundo
+            if e_op and i < ultimo_i and tipos[i+1].e_operador:
+                continue
+            # operador no início ou fim do grupo, ignora
+            if (i==0 and e_op and not tipo.e_nao) or (e_op and token_proximo == ''):
+                continue
+            # operador antes ou depois de parênteses, valida o operador
+            if e_op and (not tipo.pode_parenteses) and \
+               (type(token_anterior) is not str or type(token_proximo) is not str):
+                token = Operadores.OPERADOR_PADRAO
+            # inclui o E na falta de operadores entre termos/listas
+            if token_anterior != '' and (not e_op) and (not tipos[i-1].e_operador):
+                res.append(Operadores.OPERADOR_PADRAO)
+            res.append(token)
+        return res
+
+    # nó de uma lista corrigida sem os últimos níveis desnecessários (None se não sobrar nada)
+    def __no__(self, itens):
+        if len(itens) == 1:
+            item = itens[0]
+            return (item or None) if type(item) is str else item.no
+        if not itens:
+            return None
+        return self.__montar_no__(itens, False)
+
+    def __montar_no__(self, itens, raiz):
+        res = []
+        for token in itens:
+            if type(token) is _ListaCorrigida:
+                if not token.algum:
+                    continue
+                token = token.no
+                if token is None:
+                    continue
+            res.append(token)
+        if len(res) == 1 and (isinstance(res[0], NoGrupo) or not raiz):
+            return res[0]
+        return self.__grupo__(res)
+
+    # cria o nó do grupo de acordo com o operador do grupo - ver Operadores.operador_n_do_grupo
+    def __grupo__(self, itens):
+        filhos, operadores = [], []
+        operador, n = Operadores.OPERADOR_PADRAO, 0
+        tem_grupo = tem_slop = tem_simples = aspas = False
+        ops, nao = [], False
+        for token in itens:
+            if isinstance(token, NoGrupo):
+                tem_grupo = True
+                no = token
+            else:
+                tipo = Operadores.tipo_token(token)
+                if tipo.e_operador:
+                    ops.append(token)
+                    if tipo.e_nao:
+                        nao = True
+                        continue
+                    if tipo.e_slop:
+                        tem_slop = True
+                    else:
+                        tem_simples = True
+                    n = max(n, tipo.n)
+                    operador = tipo.operador
+                    continue
+                no = NoTermo(token)
+                aspas = aspas or tipo.aspas
+            filhos.append(NoNao(no) if nao else no)
+            operadores.append(tuple(ops))
+            ops, nao = [], False
+        if tem_slop and (tem_simples or tem_grupo):
+            _grupo = [_.as_lista() if isinstance(_, NoGrupo) else _ for _ in itens]
+            _msg = f'Operadores: foi encontrado um grupo com operadores simples e de proximidade juntos: {_grupo}'
+            raise Exception(_msg)
+        if Operadores.e_operador_slop(operador):
+            classe = NoProximidade
+            if n == 1 and aspas and Operadores.e_operador_adj(operador) and \
+               all(type(_) is NoTermo and _.termo.find('"') >= 0 for _ in filhos):
+                classe = NoFrase
+        elif Operadores.e_operador_ou(operador):
+            classe = NoOU
+        elif Operadores.e_operador_e(operador):
+            classe = NoE
+        else:
+            classe = NoGrupo
+        return classe(tuple(filhos), tuple(operadores), operador, n, aspas, tuple(ops))
+
+# lista com os operadores corrigidos e o nó criado a partir dela
+# algum: a lista tem algum item (lista vazia ou termo vazio não contam)
+class _ListaCorrigida():
+    __slots__ = ('itens', 'algum', 'no')
+
+    def __init__(self, itens, no):
+        self.itens = itens
+        self.algum = any(itens)
+        self.no = no
+
+    def __len__(self):
+        return len(self.itens)
+
+###########################################################
+# Nível de parênteses lido pelo ParserPesquisaElastic
+# - tokens: tokens e níveis de dentro na ordem do texto
+# - algum: o nível tem algum token ou nível de dentro que não está vazio
+# - desembrulhado: valor sem os parênteses (token ou nível de dentro)
+# - convertido: o nível tem itens próprios e é o seu valor desembrulhado (sem referência a si mesmo)
+# - itens: tokens e listas agrupados pelos operadores (níveis convertidos)
+#----------------------------------------------------------
+class _NivelPesquisa():
+    __slots__ = ('tokens', 'niveis', 'algum', 'desembrulhado', 'convertido', 'itens', 'conteudo', 'valor')
+
+    def __init__(self):
+        self.tokens = []
+        self.niveis = False # tem níveis de dentro
+        self.algum = self.convertido = False
+        self.desembrulhado = self.conteudo = self.valor = None
+        self.itens = ()
+
+    def __len__(self):
+        return len(self.itens)
+
+    # tokens e valores dos níveis de dentro que não foram ignorados
+    def valores(self):
+        if not self.niveis:
+            self.algum = bool(self.tokens)
+            return self.tokens
+        res = []
+        for token in self.tokens:
+            if type(token) is str:
+                res.append(token)
+                self.algum = True
+            elif token.tokens:
+                self.algum = True
+                if not token.algum:
+                    continue
+                if token.convertido:
+                    res.append(token)
+                elif token.desembrulhado is not None:
+                    res.append(token.desembrulhado)
+        return res
+
+    # retorna os valores se o nível tiver itens para converter
+    def fechar(self):
+        tokens = self.tokens
+        valores = self.valores()
+        if len(tokens) <= 1:
+            if tokens:
+                token = tokens[0]
+                self.desembrulhado = token if type(token) is str or token.convertido else token.desembrulhado
+            return None
+        if len(valores) == 1:
+            self.desembrulhado = valores[0]
+            return None
+        self.convertido = True
+        return valores
+
+# termos do nível ou lista e dos níveis ou listas de dentro
+def _termos(tokens):
+    if type(tokens) is _NivelPesquisa:
+        tokens = tokens.tokens
+    return ' '.join(_ if type(_) is str else _termos(_) for _ in tokens)
+
+# soma a duração da etapa e retorna o início da próxima - sem etapas não mede nada
+# as etapas dos níveis de parênteses são somadas a cada nível
+def _etapa(etapas, nome, inicio):
+    if etapas is None:
+        return 0
+    agora = perf_counter_ns()
+    etapas[nome] = etapas.get(nome, 0) + agora - inicio
+    return agora
+
+
+###########################################################
+# Observadores da compilação das pesquisas
+# Um observador é uma função (ou objeto chamável) que recebe um EventoCompilacao
+# ao final de cada compilação de PesquisaElasticFacil (inclusive as de grupos).
+# Sem observadores registrados, a compilação não mede nada.
+# - etapas: duração em ns de cada etapa (classificacao, limpeza, aspas, formatacao, agrupamento, operadores,
+#   arvore, inteligente e query) - ver ParserPesquisaElastic.analisar
+# - duracao: duração total em ns
+# - tokens: quantidade de termos, clausulas: quantidade de cláusulas da query
+# - contem_automatico: o critério CONTÉM: foi inserido automaticamente
+# - erro: mensagem de erro se a compilação falhou
+# Exemplo:
+#   registrar_observador(lambda evento: print(evento.etapas))
+#----------------------------------------------------------
+class EventoCompilacao():
+    __slots__ = ('criterios', 'e_subgrupo_pesquisa', 'etapas', 'duracao', 'tokens', 'clausulas',
+                 'contem_automatico', 'pesquisa_inteligente', 'erro')
+
+    def __init__(self, criterios, e_subgrupo_pesquisa = False):
+        self.criterios = criterios
+        self.e_subgrupo_pesquisa = e_subgrupo_pesquisa
+        self.etapas = {}
+        self.duracao = 0
+        self.tokens = 0
+        self.clausulas = 0
+        self.contem_automatico = False
+        self.pesquisa_inteligente = False
+        self.erro = None
+
+    def __repr__(self) -> str:
+        return f'EventoCompilacao({self.criterios!r}, duracao={self.duracao}, etapas={self.etapas})'
+
+def registrar_observador(observador):
+    if observador not in OBSERVADORES_COMPILACAO:
+        OBSERVADORES_COMPILACAO.append(observador)
+
+def remover_observador(observador):
+    if observador in OBSERVADORES_COMPILACAO:
+        OBSERVADORES_COMPILACAO.remove(observador)
+
+# um observador com erro não interrompe a compilação
+def notificar_observadores(evento):
+    for observador in list(OBSERVADORES_COMPILACAO):
+        try:
+            observador(evento)
+        except Exception as e:
+            if PRINT_WARNING: print(f'Observador da compilação com erro: {e}')
+
+# cláusulas finais das queries (termos, curingas, ranges, etc)
+CLAUSULAS_QUERY = frozenset(('term', 'terms', 'wildcard', 'regexp', 'prefix', 'span_term', 'more_like_this',
+                             'range', 'match', 'match_phrase', 'match_none', 'match_all'))
+
+# retorna a quantidade de cláusulas finais da query
+def contar_clausulas(query):
+    if isinstance(query, dict):
+        return sum((1 if k in CLAUSULAS_QUERY else contar_clausulas(v)) for k, v in query.items())
+    if isinstance(query, (list, tuple)):
+        return sum(contar_clausulas(_) for _ in query)
+    return 0
+
+###########################################################
+# Limites da expansão de curingas e regex (wildcard, regexp e prefix)
+# Dentro de ADJ/PROX os curingas ficam em span_multi e o elastic expande todos os
+# termos encontrados, podendo passar do maxClauseCount e consumir muita memória.
+# - rewrite: top_terms_N, top_terms_blended_freqs_N, top_terms_boost_N, etc
+# - max_determinized_states: limite de estados do autômato das regexp
+# Os valores padrão dependem do formato do curinga (FORMATOS_PADRAO):
+#   prefixo (dano*), inicial (*ano), interno (da*no), regex (mora?) e numerico (12_?345*)
+# Os valores de rewrite e max_determinized_states da configuração substituem os padrões
+# de todos os formatos e por_campo substitui os valores de um campo (texto, texto.raw, etc)
+# somente_spans = True aplica o rewrite apenas nos span_multi (fora deles o rewrite
+# padrão do elastic não tem limite de cláusulas), max_determinized_states é aplicado
+# em todas as regexp
+# Exemplo:
+#   config = ConfigMultiTermos(por_campo={'texto.raw': {'rewrite': 'top_terms_100'}})
+#   PesquisaElasticFacil('dano* adj2 mora?', multi_termos=config)
+#----------------------------------------------------------
+class ConfigMultiTermos():
+    FORMATOS_PADRAO = {'prefixo': {'rewrite': 'top_terms_1024'},
+                       'inicial': {'rewrite': 'top_terms_256'},
+                       'interno': {'rewrite': 'top_terms_512'},
+                       'regex': {'rewrite': 'top_terms_512', 'max_determinized_states': 2000},
+                       'numerico': {'rewrite': 'top_terms_256', 'max_determinized_states': 1000}}
+    __slots__ = ('rewrite', 'max_determinized_states', 'por_formato', 'por_campo', 'somente_spans')
+
+    def __init__(self, rewrite = None, max_determinized_states = None, por_formato = None, por_campo = None, somente_spans = True):
+        self.rewrite = rewrite
+        self.max_determinized_states = max_determinized_states
+        self.por_formato = {k: dict(v) for k, v in (por_formato or {}).items()}
+        self.por_campo = {k: dict(v) for k, v in (por_campo or {}).items()}
+        self.somente_spans = bool(somente_spans)
+
+    # chave para o cache de queries
+    def chave(self):
+        _itens = lambda d: tuple(sorted((k, tuple(sorted(v.items()))) for k, v in d.items()))
+        return (self.rewrite, self.max_determinized_states, _itens(self.por_formato), _itens(self.por_campo), self.somente_spans)
+
+    # formato do curinga do termo (ver FORMATOS_PADRAO)
+    @classmethod
+    def formato(self, tipo, valor):
+        if tipo.numerico:
+            return 'numerico'
+        if tipo.regex:
+            return 'regex'
+        if valor[:1] == '*':
+            return 'inicial'
+        if valor.find('*') == len(valor) - 1:
+            return 'prefixo'
+        return 'interno'
+
+    # retorna os parâmetros do formato e do campo (o campo raw usa os valores do campo principal se não tiver os seus)
+    def parametros(self, formato, campo):
+        res = dict(self.FORMATOS_PADRAO.get(formato, {}))
+        res.update(self.por_formato.get(formato, {}))
+        if self.rewrite is not None:
+            res['rewrite'] = self.rewrite
+        if self.max_determinized_states is not None:
+            res['max_determinized_states'] = self.max_determinized_states
+        _campo = self.por_campo.get(campo)
+        if _campo is None:
+            _campo = self.por_campo.get(campo.split('.')[0], {})
+        res.update(_campo)
+        return res
+
+    # inclui os parâmetros nas opções da consulta (wildcard, regexp ou prefix)
+    def aplicar(self, opcoes, consulta, formato, campo, em_span):
+        parametros = self.parametros(formato, campo)
+        if parametros.get('rewrite') and (em_span or not self.somente_spans):
+            opcoes['rewrite'] = parametros['rewrite']
+        if consulta == 'regexp' and parametros.get('max_determinized_states'):
+            opcoes['max_determinized_states'] = parametros['max_determinized_states']
+        return opcoes
+
+    def __repr__(self) -> str:
+        return f'ConfigMultiTermos{self.chave()}'
+
+###########################################################
+# Configuração do highlight (criterios_elastic_highlight e as_query com campo_highlight)
+# tipo unified ou fvh usam os offsets indexados (term_vector: with_positions_offsets)
+# sem analisar o texto novamente - plain é o highlight anterior com max_analyzed_offset
+# fragment_size, number_of_fragments e no_match_size: tamanho e quantidade dos fragmentos
+# e quantos caracteres retornar quando nenhum termo for destacado
+# pre_tags e post_tags: marcações dos termos destacados
+# highlight_query: os grupos destacam apenas os critérios de texto (sem intervalos e filtros)
+# Exemplo:
+#   config = ConfigHighlight('fvh', fragment_size=200, number_of_fragments=3)
+#   PesquisaElasticFacil('dano adj2 moral', highlight=config).criterios_elastic_highlight
+#----------------------------------------------------------
+class ConfigHighlight():
+    TIPOS = ('unified', 'fvh', 'plain')
+    __slots__ = ('tipo', 'fragment_size', 'number_of_fragments', 'no_match_size', 'pre_tags', 'post_tags', 'highlight_query')
+
+    def __init__(self, tipo = 'unified', fragment_size = 100, number_of_fragments = 5, no_match_size = 0,
+                 pre_tags = ('<mark>',), post_tags = ('</mark>',), highlight_query = True):
+        if tipo not in self.TIPOS:
+            raise ValueError(f'ConfigHighlight: tipo de highlight "{tipo}" inválido, use {self.TIPOS}')
+        self.tipo = tipo
+        self.fragment_size = int(fragment_size)
+        self.number_of_fragments = int(number_of_fragments)
+        self.no_match_size = int(no_match_size)
+        self.pre_tags = (pre_tags,) if isinstance(pre_tags, str) else tuple(pre_tags or ())
+        self.post_tags = (post_tags,) if isinstance(post_tags, str) else tuple(post_tags or ())
+        self.highlight_query = bool(highlight_query)
+
+    # chave para o cache de queries
+    def chave(self):
+        return (self.tipo, self.fragment_size, self.number_of_fragments, self.no_match_size, self.pre_tags, self.post_tags, self.highlight_query)
+
+    # highlight do campo - highlight_query com os critérios de texto dos grupos
+    def as_highlight(self, campo, highlight_query = None):
+        opcoes = {"require_field_match": False, "fragment_size": self.fragment_size,
+                  "number_of_fragments": self.number_of_fragments, "no_match_size": self.no_match_size}
+        if self.tipo == 'plain':
+            opcoes['max_analyzed_offset'] = CRITERIO_CAMPO_HIGHLIGHT['max_analyzed_offset']
+        if self.highlight_query and highlight_query is not None:
+            opcoes['highlight_query'] = highlight_query
+        res = {"type" : self.tipo, "fields": { f"{campo}": opcoes }}
+        if self.pre_tags:
+            res['pre_tags'] = list(self.pre_tags)
+        if self.post_tags:
+            res['post_tags'] = list(self.post_tags)
+        return res
+
+    def __repr__(self) -> str:
+        return f'ConfigHighlight{self.chave()}'
+
+# highlight do campo com a configuração ou o highlight plain padrão
+def highlight_campo(campo, highlight = None, highlight_query = None):
+    if highlight is None:
+        return {"type" : "plain", "fields": {   f"{campo}": CRITERIO_CAMPO_HIGHLIGHT }}
+    return highlight.as_highlight(campo, highlight_query)
+
+###########################################################
+# Query em bytes (json compacto em UTF-8) pronta para envio ao elastic
+# usa o orjson se estiver instalado ou o json da biblioteca padrão
+# os clientes do elastic enviam corpos em bytes sem serializar novamente (ex.: es.search(index=..., body=pe.corpo_bytes(size=10)))
+#----------------------------------------------------------
+def query_em_bytes(query):
+    if orjson is not None:
+        try:
+            return orjson.dumps(query)
+        except TypeError:
+            # tipos não suportados pelo orjson (ex.: inteiros maiores que 64 bits)
+            pass
+    return json.dumps(query, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# inclui highlight, size e from no json da query sem serializar a query novamente
+# corpo: bytes de um objeto json ({...}) que ainda não tem essas chaves (ex.: criterios_elastic_bytes)
+# highlight: dict ou bytes do highlight - o _source vazio é incluído com ele (como em criterios_elastic_highlight)
+def juntar_query_bytes(corpo, size = None, desde = None, highlight = None):
+    partes = []
+    if highlight is not None:
+        partes.append(b'"highlight":' + (highlight if isinstance(highlight, bytes) else query_em_bytes(highlight)))
+        partes.append(b'"_source":[""]')
+    if size is not None:
+        partes.append(b'"size":%d' % int(size))
+    if desde is not None:
+        partes.append(b'"from":%d' % int(desde))
+    if not partes:
+        return corpo
+    fim = corpo.rindex(b'}')
+    separador = b'' if corpo[:fim].strip() == b'{' else b','
+    return b''.join((corpo[:fim], separador, b','.join(partes), corpo[fim:]))
+
 ###########################################################
 # Recebe um critério de pesquisa livre estilo BRS 
 # e aproxima ele no que for possível para rodar uma
@@ -346,6 +1337,13 @@ class PesquisaElasticFacil():
     # PROXn: transforma em slop(n não ordenado) - aceita NÃO (lista de termos)
     # ADJn: transforma em slop(n ordenado) - aceita NÃO (lista de termos)
     # o sufixo_campo_raw identifica o sufixo de campo para termos entre aspas
+    # highlight (opcional): ConfigHighlight usado em criterios_elastic_highlight
+    # o sufixo_campo_reverso (opcional) identifica o subcampo com os termos invertidos (ex.: .reverse)
+    #   termos com curinga apenas no início ($ano, *ano) são pesquisados com prefix nesse subcampo (ver docs/ElasticQueries.md)
+    # numeros_como_termos = True pesquisa números sem curingas (2020, 123.456) com as formas indexadas
+    #   em um terms (ou span_or em ADJ/PROX) no lugar do regexp (2_?020)
+    # multi_termos: ConfigMultiTermos com rewrite e max_determinized_states dos curingas (None mantém os padrões do elastic)
+    # termos_chave (opcional): ExtratorTermos que troca o texto do CONTÉM: pelos termos chave (like compacto ou bool.should)
     # e_subgrupo_pesquisa apenas identifica que está rodando a pesquisa de dentro de um grupo de campo para melhorar as mensagens de erro
     RE_CONTEM = re.compile('^cont[eé]m:', re.IGNORECASE)
     RE_INTELIGENTE = re.compile('^(adj\d*|prox\d*|cont[ée]m):', re.IGNORECASE)
@@ -354,7 +1352,37 @@ class PesquisaElasticFacil():
     RE_NAO_CONTEM_INTELIGENTE = re.compile(r'\b(adj\d*|prox?\d*|com)\b',re.IGNORECASE)
     RE_NAO = re.compile(r'\s+n[aã]o\s*\([^\)]+\)')
     RE_NAO_LIMPAR = re.compile(r'(\s+n[aã]o\s*\()|(\()|(\))')
-    def __init__(self, criterios_originais,  campo_texto = 'texto', sufixo_campo_raw = None, e_subgrupo_pesquisa = False):
+    # criterios_listas, criterios_reformatado, criterios_elastic e criterios_elastic_highlight
+    # são construídos no primeiro acesso (ver propriedades abaixo)
+    __slots__ = ('pesquisa_inteligente', 'criterios_originais', 'contem_operadores_brs', 'contem_operadores',
+                 'campo_texto', 'sufixo_campo_raw', 'sufixo_campo_reverso', 'numeros_como_termos', 'multi_termos', 'highlight', 'arvore', 'avisos',
+                 'termos_chave', 'e_subgrupo_pesquisa', '__listas__', '__reformatado__', '__elastic__', '__elastic_highlight__',
+                 '__query_bytes__', '__highlight_bytes__')
+    def __init__(self, criterios_originais,  campo_texto = 'texto', sufixo_campo_raw = None, e_subgrupo_pesquisa = False, sufixo_campo_reverso = None,
+                 numeros_como_termos = False, multi_termos = None, highlight = None, termos_chave = None):
+        self.sufixo_campo_reverso = Operadores.sufixo_campo(sufixo_campo_reverso)
+        self.numeros_como_termos = bool(numeros_como_termos)
+        self.multi_termos = multi_termos
+        self.highlight = highlight
+        self.termos_chave = termos_chave
+        # com observadores, a compilação mede as etapas e notifica os observadores
+        evento = EventoCompilacao(criterios_originais, e_subgrupo_pesquisa) if OBSERVADORES_COMPILACAO else None
+        inicio = perf_counter_ns() if evento is not None else 0
+        try:
+            self.__compilar__(criterios_originais, campo_texto, sufixo_campo_raw, e_subgrupo_pesquisa, evento)
+        except Exception as e:
+            if evento is not None:
+                evento.erro = str(e)
+            raise
+        finally:
+            if evento is not None:
+                evento.duracao = perf_counter_ns() - inicio
+                notificar_observadores(evento)
+
+    # evento: EventoCompilacao quando a compilação é observada (sem evento as etapas não são medidas)
+    def __compilar__(self, criterios_originais, campo_texto, sufixo_campo_raw, e_subgrupo_pesquisa, evento = None):
+        etapas = None if evento is None else evento.etapas
+        inicio = perf_counter_ns() if etapas is not None else 0
         self.pesquisa_inteligente = self.RE_INTELIGENTE.match(criterios_originais)
         self.criterios_originais = str(criterios_originais).strip()
         self.contem_operadores_brs = False
@@ -362,7 +1390,13 @@ class PesquisaElasticFacil():
         self.campo_texto = str(campo_texto)
         self.sufixo_campo_raw = '' if not sufixo_campo_raw else str(sufixo_campo_raw)
         self.sufixo_campo_raw = f'.{self.sufixo_campo_raw}' if self.sufixo_campo_raw and self.sufixo_campo_raw[0] !='.' else self.sufixo_campo_raw
-        self.criterios_listas = []
+        self.__listas__ = None
+        self.__reformatado__ = None
+        self.__elastic__ = None
+        self.__elastic_highlight__ = None
+        self.__query_bytes__ = None
+        self.__highlight_bytes__ = {} # campo: highlight em bytes
+        self.arvore = None # árvore dos critérios (NoGrupo) se não for pesquisa inteligente
         self.avisos = [] # registra sugestões de avisos para o usuário
         # valida se a pesquisa contém operadores de campos pois não é aceito nessa classe
         self.e_subgrupo_pesquisa = e_subgrupo_pesquisa
@@ -390,201 +1424,132 @@ class PesquisaElasticFacil():
                     self.pesquisa_inteligente = True
                     self.criterios_originais = f'CONTÉM: {self.criterios_originais}'
                     self.avisos.append('Critério "CONTÉM:" inserido automaticamente ao identificar o conteúdo como texto. Use ":" antes da pesquisa para desativá-lo.')
+                    if evento is not None:
+                        evento.contem_automatico = True
 
         if self.criterios_originais[:1] == ':':
              self.criterios_originais = self.criterios_originais[1:]
+        inicio = _etapa(etapas, 'classificacao', inicio)
         # realiza a construção das pesquisas
         if self.pesquisa_inteligente:
             self.executar_pesquisa_inteligente()
+            _etapa(etapas, 'inteligente', inicio)
         else:
-            # limpa os símbolos não tokenizáveis
-            _criterios =  Operadores.RE_LIMPAR_CRITERIOS_INICIAIS.sub(' ',self.criterios_originais)
-            # transforma os critérios agrupados em lista e sublistas de critérios
-            _criterios = self.converter_parenteses_para_listas(_criterios)
-            _criterios = self.corrigir_sublistas_desnecessarias(_criterios)
-            # unindo os termos entre aspas agrupando entre parênteses e ADJ1
-            _criterios = self.juntar_aspas(_criterios)
-            # formata os termos e operadores e quebrar tokens 
-            _criterios = Operadores.formatar_tokens(_criterios)
-            # agrupando os critérios em parênteses próprios
-            _criterios = self.corrigir_criterios_e_reagrupar(_criterios)
-            _criterios = self.corrigir_sublistas_desnecessarias(_criterios)
-            # corrige regras de operadores 
-            _criterios = self.corrigir_lista_de_operadores(_criterios)
-            _criterios = self.corrigir_sublistas_desnecessarias(_criterios)
-            # pode ser mostrado na interface do usuário como a classe interpretou os critérios
-            self.criterios_listas = _criterios
-            self.criterios_reformatado = self.reformatar_criterios(self.criterios_listas)
-            # critérios elastic pesquisa normal
-            self.criterios_elastic = self.as_query()
-        # cria a query com o highlight
-        self.criterios_elastic_highlight = deepcopy(self.criterios_elastic)
-        self.criterios_elastic_highlight['highlight'] = {"type" : "plain", "fields": {   f"{campo_texto}": CRITERIO_CAMPO_HIGHLIGHT }}
-        self.criterios_elastic_highlight['_source'] = [""]
+            # limpa os símbolos, agrupa parênteses, aspas e operadores e cria a árvore dos critérios
+            # as listas, o texto reformatado e as queries são criados a partir da árvore quando usados
+            self.arvore = ParserPesquisaElastic(self.e_subgrupo_pesquisa).analisar(self.criterios_originais, etapas)
+        if evento is not None:
+            # a query é construída na compilação para entrar nas medições
+            inicio = perf_counter_ns()
+            query = self.criterios_elastic
+            _etapa(etapas, 'query', inicio)
+            evento.pesquisa_inteligente = bool(self.pesquisa_inteligente)
+            evento.tokens = self.arvore.contar_termos() if self.arvore is not None else len(self.criterios_originais.split())
+            evento.clausulas = contar_clausulas(query)
+
+    # pode ser mostrado na interface do usuário como a classe interpretou os critérios
+    @property
+    def criterios_listas(self):
+        if self.__listas__ is None:
+            self.__listas__ = [] if self.arvore is None else self.arvore.as_lista()
+        return self.__listas__
+
+    @criterios_listas.setter
+    def criterios_listas(self, valor):
+        self.__listas__ = valor
+
+    @property
+    def criterios_reformatado(self):
+        if self.__reformatado__ is None:
+            self.__reformatado__ = '' if self.arvore is None else self.arvore.as_string()
+        return self.__reformatado__
+
+    @criterios_reformatado.setter
+    def criterios_reformatado(self, valor):
+        self.__reformatado__ = valor
+
+    # critérios elastic pesquisa normal
+    @property
+    def criterios_elastic(self):
+        if self.__elastic__ is None:
+            self.__elastic__ = self.as_query()
+        return self.__elastic__
+
+    @criterios_elastic.setter
+    def criterios_elastic(self, valor):
+        self.__elastic__ = valor
+        self.__elastic_highlight__ = None
+        self.__query_bytes__ = None
+        self.__highlight_bytes__ = {}
+
+    # query com o highlight - a query de pesquisa é compartilhada com criterios_elastic (sem cópia)
+    @property
+    def criterios_elastic_highlight(self):
+        if self.__elastic_highlight__ is None:
+            res = dict(self.criterios_elastic)
+            res['highlight'] = highlight_campo(self.campo_texto, self.highlight)
+            res['_source'] = [""]
+            self.__elastic_highlight__ = res
+        return self.__elastic_highlight__
+
+    # criterios_elastic em bytes, serializado no primeiro acesso
+    @property
+    def criterios_elastic_bytes(self):
+        if self.__query_bytes__ is None:
+            self.__query_bytes__ = query_em_bytes(self.criterios_elastic)
+        return self.__query_bytes__
+
+    # corpo da pesquisa em bytes com size, from e highlight incluídos sem serializar a query novamente
+    # highlight: True usa o campo de texto da pesquisa ou o nome do campo
+    def corpo_bytes(self, size = None, desde = None, highlight = None):
+        _highlight = None
+        if highlight:
+            campo = highlight if isinstance(highlight, str) else self.campo_texto
+            _highlight = self.__highlight_bytes__.get(campo)
+            if _highlight is None:
+                _highlight = self.__highlight_bytes__[campo] = query_em_bytes(highlight_campo(campo, self.highlight))
+        return juntar_query_bytes(self.criterios_elastic_bytes, size, desde, _highlight)
+
+    #############################################################
+    # métodos obsoletos da compilação por listas - mantidos por compatibilidade
+    # a compilação usa o ParserPesquisaElastic e a árvore de critérios (arvore)
+    #------------------------------------------------------------
+    def __obsoleto__(self, metodo):
+        warnings.warn(f'PesquisaElasticFacil.{metodo} está obsoleto, use ParserPesquisaElastic e a árvore de critérios (arvore)',
+                      DeprecationWarning, stacklevel = 3)
 
     # recebe a primeira forma RAW escrita pelo usuário e converte em sublistas cada grupo de parênteses
-    # cria lsitas de listas dentro dos parênteses
-    # exemplo:  ((teste1 teste2) e (teste3 teste4) teste5)
-    #   vira :  [['teste1','teste2'], ['teste3', 'teste4'], 'teste5']
+    # obsoleto: ver ParserPesquisaElastic.listas
     def converter_parenteses_para_listas(self,criterios):
-        comp_msg = f' {ERRO_PARENTESES_CAMPO}' if self.e_subgrupo_pesquisa else ''
-        """ baseado em https://stackoverflow.com/questions/23185540/turn-a-string-with-nested-parenthesis-into-a-nested-list-python """
-        left = r'[(]'
-        right=r'[)]'
-        sep=r'\s'
-        pat = r'({}|{}|{})'.format(left, right, sep)
-        _criterios = str(criterios).replace("'",'"').replace('"',' " ')
-        tokens = re.split(pat, _criterios)    
-        stack = [[]]
-        for x in tokens:
-            if not x or re.match(sep, x): continue
-            if re.match(left, x):
-                stack[-1].append([])
-                stack.append(stack[-1][-1])
-            elif re.match(right, x):
-                stack.pop()
-                if not stack:
-                    raise ValueError(str(f'{ERRO_PARENTESES_FECHOU_MAIS}{comp_msg}'))
-            else:
-                stack[-1].append(x)
-        if len(stack) > 1:
-            print('criterios: ', criterios )
-            print('stack: ', stack)
-            raise ValueError(str(f'{ERRO_PARENTESES_FALTA_FECHAR}{comp_msg}'))
-        return stack.pop()
+        self.__obsoleto__('converter_parenteses_para_listas')
+        return ParserPesquisaElastic(self.e_subgrupo_pesquisa).listas(criterios)
 
-    # agrupa OU pois é precedente dos critérios  
-    # exemplos:
-    #   termo1 E termo2 OU termo3 OU termo4 = termo1 E (termo2 OU termo3 OU termo4)
-    #   termo1 E termo2 OU (termo3 adj2 termo4) = termo1 E (termo2 OU (termo3 adj2 termo4))
-    #   termo1 OU termo2 termo3 = (termo1 OU termo2) termo3
-    #   termo1 OU termo2 (termo3 termo4) = (termo1 OU termo2) (termo3 termo4)
-    #   termo1 OU termo2 termo3 OU termo4 = (termo1 OU termo2) (termo3 OU termo4)
-    #   termo1 OU termo2 (termo3 OU termo4 termo5) = (termo1 OU termo2) ((termo3 OU termo4) termo5)
-    #   termo1 OU termo2 OU (termo3 OU termo4 termo5) = (termo1 OU termo2 OU ((termo3 OU termo4) termo5))
-    # Não permite 
+    # agrupa OU, ADJ e PROX pois são precedentes dos critérios
+    # obsoleto: ver ParserPesquisaElastic.__agrupar__
     def corrigir_criterios_e_reagrupar(self,criterios_lista, recursivo = True):
-        # inicia a resposta e o grupo temporário
-        res = []
-        grupo = []
-        grupo_operador = ''
-        if PRINT_DEBUG: print(f'Agrupar (recursivo {recursivo}): {criterios_lista}')
-        for i, token in enumerate(criterios_lista):
-            operador_proximo = ''
-            token_anterior = ''
-            token_proximo = ''
-            # identifica o próximo token para análise
-            if i < len(criterios_lista) -1:
-                token_proximo = criterios_lista[i+1]
-                operador_proximo = Operadores.get_operador_agrupamento( token_proximo )
-            # identifica o token anterior
-            if i > 0:
-               token_anterior = criterios_lista[i-1]
-            #print(f'{operador_anterior} | {token} | {operador_proximo}  >>> Grupo {grupo_operador} > {grupo}')
-            if recursivo:
-                # se o token atual for uma lista, agrupa antes de analisar
-                token = self.corrigir_criterios_e_reagrupar(token) if type(token) is list else token
-
-            # dois operadores seguidos, mantém o segundo
-            if type(token) is str and type(token_proximo) is str and \
-               Operadores.e_operador(token) and Operadores.e_operador(token_proximo):
-                continue
-
-            # termo com termo ou lista com termo, finaliza o agrupamento e continua avaliando
-            if (not Operadores.e_operador(token_anterior)) and \
-                 (not Operadores.e_operador(token)) and \
-                 any(grupo):
-                res.append(grupo)
-                grupo_operador = ''
-                grupo = []
-                if PRINT_DEBUG: print(f' - quebra termo termo: {token_anterior} >> {token}')
-
-            # próximo é um operador mas não é de agrupamento, finaliza o agrupamento com o token
-            if (not operador_proximo) and \
-                 Operadores.e_operador(token_proximo) and \
-                 any(grupo):
-                grupo.append(token)
-                res.append(grupo)
-                grupo_operador = ''
-                grupo = []
-                if PRINT_DEBUG: print(f' - quebra termo termo: {token_anterior} >> {token}')
-            # o próximo operador é um operador agrupado, insere no grupo    
-            elif operador_proximo:
-                # se o grupo estiver em uso e for de outro operador, finaliza o grupo
-                if grupo_operador and grupo_operador != operador_proximo: 
-                    grupo.append(token)
-                    res.append(grupo)
-                    grupo=[ ]
-                    if PRINT_DEBUG: print(' - novo grupo outro operador: ',token, grupo_operador, '|', operador_proximo)
-                    # se for prox ou adj antes e depois, o token fica compartilhado nos dois grupos
-                    if Operadores.e_operador_slop(operador_proximo) and \
-                       Operadores.e_operador_slop(grupo_operador):
-                       grupo.append(token)
-                       grupo_operador = operador_proximo
-                    else:
-                       grupo_operador = ''
-                else:
-                    # agrupa
-                    grupo.append(token)
-                    grupo_operador = operador_proximo
-                    if PRINT_DEBUG: print(' - novo grupo: ',token, grupo_operador)
-            # se estiver agrupando, continua agrupando
-            elif any(grupo):
-               grupo.append(token)
-            # inclui como está
-            else:
-               res.append(token)
-        # insere o último agrupamento se existir
-        if any(grupo):
-            res.append(grupo)
-        # ao final, alguns grupos podem ter ficados soltos com OU no meio sem agrupamento
-        # então reagrupa sem recursividade
-        if recursivo:
-            res = self.corrigir_criterios_e_reagrupar(res, recursivo=False)
-        return res 
+        self.__obsoleto__('corrigir_criterios_e_reagrupar')
+        parser = ParserPesquisaElastic(self.e_subgrupo_pesquisa)
+        if not recursivo:
+            return parser.__agrupar__(criterios_lista)
+        def _agrupar(lista):
+            lista = [_agrupar(_) if type(_) is list else _ for _ in lista]
+            return parser.__agrupar__(parser.__agrupar__(lista))
+        return _agrupar(criterios_lista)
 
     # corrige os tipos de operadores que podem existir em cada situação
-    # remove sublistas encadeadas sem necessidade (((teste))) = (teste)
+    # obsoleto: ver ParserPesquisaElastic.__corrigir_operadores__
     def corrigir_lista_de_operadores(self,criterios_lista):
-        res = []
-        if PRINT_DEBUG: print(f'Operadores: {criterios_lista}')
-        for i, token in enumerate(criterios_lista):
-            token_anterior = ''
-            token_proximo = ''
-            # identifica o próximo token para análise
-            if i < len(criterios_lista) -1:
-                token_proximo = criterios_lista[i+1]
-            # identifica o token anterior
-            if i > 0:
-               token_anterior = criterios_lista[i-1]
-
-            # dois operadores seguidos, mantém o segundo
-            if Operadores.e_operador(token) and Operadores.e_operador(token_proximo):
-                continue
-            # operador no início ou fim do grupo, ignora
-            if (i==0 and Operadores.e_operador(token) and (not Operadores.e_operador_nao(token)) ) or \
-               (token_proximo == '' and Operadores.e_operador(token)) :
-                continue
-
-            # operador antes ou depois de parênteses, valida o operador
-            if (type(token_anterior) is list or type(token_proximo) is list) and \
-                Operadores.e_operador(token) and \
-                not Operadores.e_operador_que_pode_antes_depois_parenteses(token):
-                token = Operadores.OPERADOR_PADRAO
-            # inclui o E na falta de operadores entre termos/listas
-            if token_anterior != '' and \
-               (not Operadores.e_operador(token)) and \
-               (not Operadores.e_operador(token_anterior)):
-               res.append(Operadores.OPERADOR_PADRAO)
-            if type(token) is list:
-                token = self.corrigir_lista_de_operadores(token)
-            res.append(token)
-
-        return res
+        self.__obsoleto__('corrigir_lista_de_operadores')
+        parser = ParserPesquisaElastic(self.e_subgrupo_pesquisa)
+        def _corrigir(lista):
+            return parser.__corrigir_operadores__([_corrigir(_) if type(_) is list else _ for _ in lista])
+        return _corrigir(criterios_lista)
 
     # caso seja uma lista de uma única sublista, remove um nível 
+    # obsoleto: o ParserPesquisaElastic remove os níveis desnecessários ao fechar os parênteses
     def corrigir_sublistas_desnecessarias(self,criterios_lista, raiz = True):
-        #if PRINT_DEBUG: print(f'Sublistas: {criterios_lista}')
+        if raiz:
+            self.__obsoleto__('corrigir_sublistas_desnecessarias')
         res = []
         for token in criterios_lista:
             if type(token) is list:
@@ -608,64 +1573,18 @@ class PesquisaElasticFacil():
         if PRINT_DEBUG: print(f' -- sublistas --->  : {res}')
         return res 
 
-    def quebra_aspas_adj1(self, texto):
-        _texto = texto.replace('"','').replace("'",'')
-        if not _texto:
-            return []
-        res = []
-        # pega apenas os tokens que são válidos 
-        tokens = [_ for _ in  _texto.strip().split(' ') if Operadores.formatar_termo(_)]
-        for _ in tokens:
-            res += [f'"{_}"', Operadores.OPERADOR_ADJ1]
-        res = res[:-1]
-        # se tiver apenas um item, retorna ele como string sem grupo
-        if len(res) == 1:
-            return res[0]
-        return res
-
     # junta critérios entre aspas se existirem - espera receber uma lista de strings
+    # obsoleto: ver ParserPesquisaElastic.__juntar_aspas__
     def juntar_aspas(self,criterios_lista):
-        if PRINT_DEBUG: print(f'Juntar aspas: {criterios_lista}')
-        res = []
-        aspas = False
-        aspas_txt = '' #vai acrescentando os termos entre aspas
-        ultimo_i = len(criterios_lista)-1
-        for i, tk in enumerate(criterios_lista):
-            # é o último token?
-            ultimo_token = i == ultimo_i
-            # caso venha de uma lista de strings e chega em um sublista
-            sublista = type(tk) is list 
-            # fim de aspas
-            if (tk == '"' or ultimo_token or sublista) and aspas and aspas_txt:
-                if ultimo_token:
-                    aspas_txt += f' {tk}'
-                    tk = ''
-                _novos_tokens = self.quebra_aspas_adj1(aspas_txt.strip())
-                res.append(_novos_tokens)
-                aspas_txt = ''
-                aspas = False
-                tk = '' if tk == '"' else tk
-            # se encontrar uma lista, processa ela recursivamente
-            if type(tk) is list:
-                res.append(self.juntar_aspas(tk))
-            # início das aspas
-            elif tk == '"' and not aspas:
-                aspas = True
-                aspas_txt = '' 
-            # meio das aspas
-            elif aspas:
-                aspas_txt += f' {tk}'
-            # token sem aspas
-            elif tk:
-                res.append( tk )
-        # última aspas
-        if aspas_txt:
-            _novos_tokens = self.quebra_aspas_adj1(aspas_txt.strip())
-            res.append(_novos_tokens)
-        if PRINT_DEBUG: print(f' -- aspas ----> : {res}')
-        return res 
+        self.__obsoleto__('juntar_aspas')
+        parser = ParserPesquisaElastic(self.e_subgrupo_pesquisa)
+        def _juntar(lista):
+            return parser.__juntar_aspas__(lista, _juntar)
+        return _juntar(criterios_lista)
 
+    # obsoleto: ver NoPesquisa.as_string
     def reformatar_criterios(self, criterios_lista):
+        self.__obsoleto__('reformatar_criterios')
         # converter a lista em uma lista plana
         def _planifica(lista):
             res = []
@@ -681,6 +1600,35 @@ class PesquisaElasticFacil():
         # retorna uma string com os critérios
         return ' '.join(lista).replace('( ','(').replace(' )',')')
 
+    # retorna as condições do grupo para serem incluídas no must ou must_not
+    # obsoleto: ver NoGrupo.as_query
+    def as_query_condicoes(self, grupo):
+        self.__obsoleto__('as_query_condicoes')
+        return self.__no_lista__(grupo).as_query(self.campo_texto, self.sufixo_campo_raw, self.sufixo_campo_reverso, self.numeros_como_termos, self.multi_termos)
+
+    # nó da árvore de critérios de uma lista com os operadores corrigidos
+    def __no_lista__(self, lista):
+        parser = ParserPesquisaElastic(self.e_subgrupo_pesquisa)
+        def _no(lista):
+            return parser.__grupo__([_no(_) if type(_) is list else _ for _ in lista])
+        return _no(lista)
+
+    @classmethod
+    def quebra_aspas_adj1(self, texto):
+        _texto = texto.replace('"','').replace("'",'')
+        if not _texto:
+            return []
+        res = []
+        # pega apenas os tokens que são válidos 
+        tokens = [_ for _ in  _texto.strip().split(' ') if Operadores.formatar_termo(_)]
+        for _ in tokens:
+            res += [f'"{_}"', Operadores.OPERADOR_ADJ1]
+        res = res[:-1]
+        # se tiver apenas um item, retorna ele como string sem grupo
+        if len(res) == 1:
+            return res[0]
+        return res
+
     # cria os critérios do elastic com o more like this
     # todos os grupos de not são agrupados em um único must not 
     # operadores e aspas são removidos
@@ -719,12 +1667,15 @@ class PesquisaElasticFacil():
     #############################################################
     # formatadores de query elastic
     #------------------------------------------------------------
+    # a pesquisa inteligente não tem árvore, as queries dela são criadas em executar_pesquisa_inteligente
     def as_query(self):
-        #print('as_query: ', self.criterios_brs_listas)
-        res = self.as_query_condicoes(self.criterios_listas)
+        if self.arvore is None:
+            return { "query": self.as_bool_must([], [])}
+        res = self.arvore.as_query(self.campo_texto, self.sufixo_campo_raw, self.sufixo_campo_reverso, self.numeros_como_termos, self.multi_termos)
         # dependendo dos retornos, constrói queries específicas
         return { "query": res}
 
+    @classmethod
     def as_bool_must(self, must, must_not, should=[], span_near=[]):
         res = {}
         # no caso de ser apenas um critério não precisa ser bool/must
@@ -742,88 +1693,31 @@ class PesquisaElasticFacil():
             res['should'] = should
         return {"bool": res }
 
-    # retorna uma lista de condicoes para serem incluídos no 
-    # must ou must_not dependendo do operador externo do grupo
-    def as_query_condicoes(self, grupo):
-        must = []
-        must_not = []
-        should = []
-        span_near = []
-        operador_nao = False
-        # busca o primeiro operador para análise do grupo
-        operador_grupo, n_grupo = Operadores.operador_n_do_grupo(grupo)
-        _campo_texto_slop = Operadores.campo_texto_grupo(grupo, self.campo_texto, self.sufixo_campo_raw, unico = True)
-        if PRINT_DEBUG: print('Operador do grupo: ', operador_grupo, grupo)
-        for token in grupo:
-            # se for o operador não/not - apenas guarda a referência
-            if type(token) is str and Operadores.e_operador_nao(token):
-                operador_nao = True
-                continue
-            # converte o grupo ou subgrupo em um critério interno do must/must_not
-            if type(token) is list:
-                # se or um grupo, processa ele recursivamente
-                grupo_convertido = self.as_query_condicoes(token)
-                if operador_nao:
-                    must_not.append( grupo_convertido)
-                elif Operadores.e_operador_ou(operador_grupo):
-                    should.append( grupo_convertido )
-                else:
-                    must.append( grupo_convertido )
-            elif Operadores.e_operador(token):
-                # operadores foram identificados antes do for
-                continue
-            else:
-                # verifica o tipo do grupo e monta o operador do termo
-                if operador_nao:
-                    # não com termo é um must_not simples
-                    _campo_texto = Operadores.campo_texto_termo(token, campo_texto=self.campo_texto, sufixo_campo_raw=self.sufixo_campo_raw, unico=True)
-                    grupo_convertido = self.as_query_operador(token, Operadores.OPERADOR_PADRAO, _campo_texto)
-                    must_not.append( grupo_convertido )
-                else:
-                    # critérios slop são todos entre aspas ou todos sem aspas pois precisam
-                    # ser aplicados no mesmo campo
-                    if Operadores.e_operador_slop(operador_grupo):
-                        _campo_texto = _campo_texto_slop
-                    else:
-                        _campo_texto = Operadores.campo_texto_termo(token, campo_texto=self.campo_texto, sufixo_campo_raw=self.sufixo_campo_raw, unico=True)
-                    grupo_convertido = self.as_query_operador(token, operador_grupo, _campo_texto)
-                    if Operadores.e_operador_slop(operador_grupo):
-                        span_near.append( grupo_convertido )
-                    elif Operadores.e_operador_ou(operador_grupo):
-                        should.append( grupo_convertido )
-                    elif Operadores.e_operador_e(operador_grupo):
-                        must.append( grupo_convertido )
-            # o não/not só afeta o próximo token ou grupo
-            operador_nao = False
-        # configura o span_near
-        if any(span_near):
-            span_near = {'clauses' : span_near,
-                         'slop' : max(0, n_grupo -1 ),
-                         'in_order' : bool(Operadores.e_operador_adj(operador_grupo))}
-        if PRINT_DEBUG:
-            if any(must): print('Must: ', must )
-            if any(must_not): print('Must_not: ', must_not )
-            if any(should): print('Should: ', should )
-            if any(span_near): print('Span_near: ', span_near )
-        return self.as_bool_must(must = must, must_not = must_not, should=should, span_near=span_near)
-
     @classmethod
-    def as_query_operador(self, token, operador_grupo, campo_texto = None):
-        token = token.lower()
+    def as_query_operador(self, token, operador_grupo, campo_texto = None, campo_reverso = None, numeros_como_termos = False, multi_termos = None):
         # wildcard - se o termo for entre aspas usa o campo raw, mas isso quem resolve é quem chama o método
-        #_aspas = token.find('"')>=0 or token.find("'")>=0
-        _wildcard = token.find('*')>=0 
-        _regex = token.find('?')>=0 or Operadores.RE_TERMO_NUMERICO.match(token)
-        _token = Operadores.remover_acentos(token)
-        _token = _token.replace("'",'').replace('"','') # remove aspas
-        if _wildcard and not _regex:
-            _wildcard = { "wildcard": {f"{campo_texto}" : {"case_insensitive": True, "value": f"{_token}" } } }
+        # o tipo do termo e o valor sem acentos e aspas (ou regex) vêm da classificação do token
+        tipo = Operadores.tipo_token(token)
+        _token = tipo.get_valor()
+        if tipo.curinga and not tipo.regex:
+            if campo_reverso and _token[:1] == '*':
+                _reverso = self.as_query_reverso(_token, operador_grupo, campo_texto, campo_reverso, multi_termos)
+                if _reverso is not None:
+                    return _reverso
+            _opcoes = {"case_insensitive": True, "value": f"{_token}" }
+            if multi_termos is not None:
+                multi_termos.aplicar(_opcoes, 'wildcard', multi_termos.formato(tipo, _token), campo_texto, Operadores.e_operador_slop(operador_grupo))
+            _wildcard = { "wildcard": {f"{campo_texto}" : _opcoes } }
             if Operadores.e_operador_slop(operador_grupo):
                 return { "span_multi" : { "match": _wildcard } } 
             return _wildcard 
-        elif _regex :
-            _token = Operadores.termo_regex_interroga(_token)
-            _regex = { "regexp": {f"{campo_texto}" : {"case_insensitive": True, "value": f"{_token}" } } }
+        elif tipo.regex :
+            if numeros_como_termos and tipo.get_formas():
+                return self.as_query_formas(tipo.get_formas(), operador_grupo, campo_texto)
+            _opcoes = {"case_insensitive": True, "value": f"{_token}" }
+            if multi_termos is not None:
+                multi_termos.aplicar(_opcoes, 'regexp', multi_termos.formato(tipo, _token), campo_texto, Operadores.e_operador_slop(operador_grupo))
+            _regex = { "regexp": {f"{campo_texto}" : _opcoes } }
             if Operadores.e_operador_slop(operador_grupo):
                 return { "span_multi" : { "match": _regex } } 
             return _regex 
@@ -832,6 +1726,34 @@ class PesquisaElasticFacil():
             return { "span_term": { f"{campo_texto}": f"{_token}" } }
         return { "term": { f"{campo_texto}": f"{_token}" } }
 
+    # número sem curingas com as formas indexadas (ex.: 2020 e 2_020)
+    # uma forma vira term/span_term, mais formas viram terms ou span_or de span_term em ADJ/PROX
+    @classmethod
+    def as_query_formas(self, formas, operador_grupo, campo_texto):
+        if Operadores.e_operador_slop(operador_grupo):
+            if len(formas) == 1:
+                return { "span_term": { f"{campo_texto}": formas[0] } }
+            return { "span_or": { "clauses": [{ "span_term": { f"{campo_texto}": _ } } for _ in formas] } }
+        if len(formas) == 1:
+            return { "term": { f"{campo_texto}": formas[0] } }
+        return { "terms": { f"{campo_texto}": list(formas) } }
+
+    # termo com curinga apenas no início (*ano) vira prefix com o termo invertido no campo reverso (ona*)
+    # em ADJ/PROX o span_multi é mascarado como o campo texto para ficar no mesmo span_near dos outros termos
+    # retorna None se o termo tiver outros curingas
+    @classmethod
+    def as_query_reverso(self, token, operador_grupo, campo_texto, campo_reverso, multi_termos = None):
+        _sufixo = token.lstrip('*')
+        if not _sufixo or _sufixo.find('*') >= 0:
+            return None
+        _opcoes = {"case_insensitive": True, "value": f"{_sufixo[::-1]}" }
+        if multi_termos is not None:
+            multi_termos.aplicar(_opcoes, 'prefix', 'prefixo', campo_reverso, Operadores.e_operador_slop(operador_grupo))
+        _prefix = { "prefix": {f"{campo_reverso}" : _opcoes } }
+        if Operadores.e_operador_slop(operador_grupo):
+            return { "field_masking_span" : { "query": { "span_multi" : { "match": _prefix } }, "field": f"{campo_texto}" } }
+        return _prefix
+
     # contem: transforma em more like this aceita nao ()
     # parecido: transforma em slop(20 não ordenado) 
     # igual: transforma em slop(1 ordenado) 
@@ -841,9 +1763,9 @@ class PesquisaElasticFacil():
         _criterios = self.RE_INTELIGENTE.sub('', self.criterios_originais)
         _criterios_nao = self.RE_NAO.findall(_criterios)
         _criterios = self.RE_NAO.sub(' ', _criterios)
-        _criterios = Operadores.remover_acentos(_criterios.lower())
+        _criterios = minusculas_sem_acentos(_criterios)
         _criterios = Operadores.RE_LIMPAR_TERMO_MLT.sub(' ', _criterios).replace('$','*')
-        _criterios_nao = [self.RE_NAO_LIMPAR.sub(' ',Operadores.remover_acentos(_.lower())) for _ in _criterios_nao]
+        _criterios_nao = [self.RE_NAO_LIMPAR.sub(' ',minusculas_sem_acentos(_)) for _ in _criterios_nao]
         _tipo = _tipo.upper()
         _criterios_nao_formatados = [f' NÃO ({_}) ' for _ in _criterios_nao]
         _criterios_nao_formatados = ''.join(_criterios_nao_formatados)
@@ -853,7 +1775,9 @@ class PesquisaElasticFacil():
             print('Critérios: ', _criterios)
             print('Critérios não: ', _criterios_nao)
             print('Critérios finais: ', _criterios)
-        if _tipo in ('CONTÉM', 'CONTEM'):
+        if _tipo in ('CONTÉM', 'CONTEM') and self.termos_chave is not None:
+            self.criterios_elastic = self.termos_chave.as_query(_criterios, _criterios_nao, self.campo_texto)
+        elif _tipo in ('CONTÉM', 'CONTEM'):
             self.criterios_elastic = self.as_query_more_like_this(criterios=_criterios, 
                                                                     criterios_nao=_criterios_nao, 
                                                                     campos_texto=self.campo_texto) 
@@ -877,8 +1801,10 @@ class PesquisaElasticFacil():
     def as_query_slop(self, criterios, criterios_nao, campos_texto, sufixo_campo_raw, distancia, ordem):
         _campo = Operadores.campo_texto_grupo(criterios, campo_texto=campos_texto, sufixo_campo_raw=sufixo_campo_raw, unico=True)
         _campo_nao = Operadores.campo_texto_grupo(criterios_nao, campo_texto=campos_texto, sufixo_campo_raw=sufixo_campo_raw, unico=True)
-        span_near = [self.as_query_operador(_, Operadores.OPERADOR_ADJ1 , _campo) for _ in criterios]
-        span_near_nao = [self.as_query_operador(_, Operadores.OPERADOR_ADJ1 , _campo_nao) for _ in criterios_nao]
+        _reverso = Operadores.campo_texto_reverso(_campo, campos_texto, self.sufixo_campo_reverso)
+        _reverso_nao = Operadores.campo_texto_reverso(_campo_nao, campos_texto, self.sufixo_campo_reverso)
+        span_near = [self.as_query_operador(_, Operadores.OPERADOR_ADJ1 , _campo, _reverso, self.numeros_como_termos, self.multi_termos) for _ in criterios]
+        span_near_nao = [self.as_query_operador(_, Operadores.OPERADOR_ADJ1 , _campo_nao, _reverso_nao, self.numeros_como_termos, self.multi_termos) for _ in criterios_nao]
         qspan_near = {'clauses' : span_near, 'slop' : max(0, distancia), 'in_order' : ordem}
         qspan_near_nao = {'clauses' : span_near_nao, 'slop' : max(0, distancia), 'in_order' : ordem}
 
@@ -891,14 +1817,37 @@ class PesquisaElasticFacil():
 
 class GruposPesquisaElasticFacil():
 
-    def __init__(self, criterios_agrupados = '', campo_texto_padrao='texto', sufixo_campo_raw='.raw', campos_disponiveis = {}) -> None:
+    # sufixo_campo_reverso: subcampo com os termos invertidos do campo texto padrão (ver PesquisaElasticFacil)
+    # numeros_como_termos: números sem curingas pesquisados com as formas indexadas em todos os campos (ver PesquisaElasticFacil)
+    # multi_termos: ConfigMultiTermos usado em todos os campos (valores por campo em ConfigMultiTermos.por_campo)
+    # contexto_filtro: intervalos e valores (.campo.(>=x <y)) e as pesquisas nos campos_filtro entram no bool.filter,
+    #                  sem score e com cache de filtros do elastic - campos_pontuados continuam no must (com score)
+    # constant_score: queries só com filtros (e must_not) são retornadas com constant_score
+    # highlight: ConfigHighlight padrão do as_query com campo_highlight (highlight_query só com os critérios de texto)
+    # termos_chave: ExtratorTermos dos critérios CONTÉM: do campo texto padrão (ver PesquisaElasticFacil)
+    def __init__(self, criterios_agrupados = '', campo_texto_padrao='texto', sufixo_campo_raw='.raw', campos_disponiveis = {}, sufixo_campo_reverso = None,
+                 numeros_como_termos = False, multi_termos = None, contexto_filtro = False, campos_filtro = (), campos_pontuados = (),
+                 constant_score = False, highlight = None, termos_chave = None) -> None:
         if PRINT_DEBUG: print(f'GruposPesquisaElasticFacil: iniciado campo:"{campo_texto_padrao}"', 'critérios:', len(criterios_agrupados)>0)
         self.__must__ = []
         self.__must_not__ = []
         self.__should__ = []
+        self.__filter__ = []
+        self.__destaque__ = []
+        self.__should_pontuado__ = False
         self.__as_string__ = ''
         self.campo_texto_padrao = campo_texto_padrao
         self.sufixo_campo_raw = sufixo_campo_raw
+        self.sufixo_campo_reverso = sufixo_campo_reverso
+        self.numeros_como_termos = numeros_como_termos
+        self.multi_termos = multi_termos
+        self.contexto_filtro = contexto_filtro
+        self.campos_filtro = frozenset(campos_filtro or ())
+        self.campos_pontuados = frozenset(campos_pontuados or ())
+        self.constant_score = constant_score
+        self.highlight = highlight
+        self.termos_chave = termos_chave
+        self.__query_bytes__ = {} # None: query e (campo_highlight, highlight): highlight em bytes - renovados a cada critério incluído
         self.avisos = [] # registra sugestões de avisos para o usuário
         # configura os campos disponíveis para critérios em grupo
         # bem como o sufixo raw de cada um se existir
@@ -947,6 +1896,28 @@ class GruposPesquisaElasticFacil():
         sufixo = f'.{sufixo}' if sufixo and sufixo[0] !='.' else sufixo
         return f'{campo}{sufixo}'
 
+    # critério sem score no bool.filter - valores e intervalos ou pesquisas nos campos de filtro
+    def __e_filtro__(self, campo, valor = False):
+        if not self.contexto_filtro or campo in self.campos_pontuados:
+            return False
+        return valor or campo in self.campos_filtro or campo.split('.')[0] in self.campos_filtro
+
+    # inclui o critério no grupo do tipo (E, OU ou NAO) e no filtro se não precisar de score
+    # critérios de texto com score são usados no highlight_query
+    def __add_criterio__(self, criterio, tipo, filtro, texto = False):
+        self.__query_bytes__ = {}
+        if texto and not filtro and tipo != 'NAO':
+            self.__destaque__.append(criterio)
+        if tipo == 'OU':
+            self.__should__.append(criterio)
+            self.__should_pontuado__ = self.__should_pontuado__ or not filtro
+        elif tipo == 'NAO':
+            self.__must_not__.append(criterio)
+        elif filtro:
+            self.__filter__.append(criterio)
+        else:
+            self.__must__.append(criterio)
+
     # busca o próximo fechamento levando em consideração que pode abrir algum parênteses no meio
     def __get_proximo_fechamento__(self, texto):
         q_abre, pos = 0,-1
@@ -1026,8 +1997,13 @@ class GruposPesquisaElasticFacil():
                 else:
                     campo = self.campo_texto_padrao if not campo else campo
                     _sufixo_campo_raw = self.__retorna_sufixo_campo_raw__(campo)
+                    _sufixo_campo_reverso = self.sufixo_campo_reverso if campo == self.campo_texto_padrao else None
                     pe = PesquisaElasticFacil(criterios_originais=criterios_campo, campo_texto=campo, 
-                                              sufixo_campo_raw=_sufixo_campo_raw, e_subgrupo_pesquisa=True)
+                                              sufixo_campo_raw=_sufixo_campo_raw, e_subgrupo_pesquisa=True,
+                                              sufixo_campo_reverso=_sufixo_campo_reverso,
+                                              numeros_como_termos=self.numeros_como_termos,
+                                              multi_termos=self.multi_termos,
+                                              termos_chave=self.termos_chave if campo == self.campo_texto_padrao else None)
                     self.__add_Pesquisa__(pe, tipo=operador)
 
     def __add_Pesquisa__(self, pesquisa: PesquisaElasticFacil, tipo = 'E'):
@@ -1036,14 +2012,12 @@ class GruposPesquisaElasticFacil():
             raise Exception(msg)
         query = pesquisa.criterios_elastic.get('query',{})
         self.avisos.extend(pesquisa.avisos)
+        self.__add_criterio__(query, tipo, self.__e_filtro__(pesquisa.campo_texto), texto=True)
         if tipo == 'OU':
-            self.__should__.append(query)
             self.__as_string__ += f' OU .{pesquisa.campo_texto}.({pesquisa.as_string()})'
         elif tipo == 'NAO':
-            self.__must_not__.append(query)
             self.__as_string__ += f' NAO .{pesquisa.campo_texto}.({pesquisa.as_string()})'
         else:
-            self.__must__.append(query)
             if self.__as_string__: 
                 self.__as_string__ += ' E'
             self.__as_string__ += f' .{pesquisa.campo_texto}.({pesquisa.as_string()})'
@@ -1065,15 +2039,14 @@ class GruposPesquisaElasticFacil():
         # verifica aspas e a existência de campo raw para aspas
         _sufixo_campo_raw = self.__retorna_sufixo_campo_raw__(campo_texto)
         _campo = Operadores.campo_texto_termo(termo = termo, campo_texto=campo_texto, sufixo_campo_raw=_sufixo_campo_raw, unico=True)
-        criterio = PesquisaElasticFacil.as_query_operador(termo,'E', _campo)
+        criterio = PesquisaElasticFacil.as_query_operador(termo,'E', _campo, numeros_como_termos=self.numeros_como_termos,
+                                                          multi_termos=self.multi_termos)
+        self.__add_criterio__(criterio, tipo, self.__e_filtro__(campo_texto), texto=True)
         if tipo == 'OU':
-            self.__should__.append(criterio)
             self.__as_string__ += f' OU .{_campo}.({termo})'
         elif tipo == 'NAO':
-            self.__must_not__.append(criterio)
             self.__as_string__ += f' NAO .{_campo}.({termo})'
         else:
-            self.__must__.append(criterio)
             if self.__as_string__: 
                 self.__as_string__ += ' E'
             self.__as_string__ += f' .{_campo}.({termo})'
@@ -1120,14 +2093,12 @@ class GruposPesquisaElasticFacil():
                 _range[f"{_operador2}"] = _valor2
                 _str = f'{_str} {operador2} {valor2}'
             criterio = {"range": {f"{campo_valor}": _range}}
+        self.__add_criterio__(criterio, tipo, self.__e_filtro__(campo_valor, valor=True))
         if tipo == 'OU':
-            self.__should__.append(criterio)
             self.__as_string__ += f' OU .{campo_valor}.({_str})'
         elif tipo == 'NAO':
-            self.__must_not__.append(criterio)
             self.__as_string__ += f' NAO .{campo_valor}.({_str})'
         else:
-            self.__must__.append(criterio)
             if self.__as_string__: 
                 self.__as_string__ += ' E'
             self.__as_string__ += f' .{campo_valor}.({_str})'
@@ -1141,31 +2112,335 @@ class GruposPesquisaElasticFacil():
     def add_NAO_valor(self, campo, operador, valor, operador2 = None, valor2 = None):
         self.__add_valor__(campo, operador, valor, operador2, valor2, 'NAO')
 
-    def as_query(self, campo_highlight = ''):
+    # query com os critérios de texto para o highlight (sem intervalos, filtros e NÃO)
+    def highlight_query(self):
+        if not any(self.__destaque__):
+            return None
+        if len(self.__destaque__) == 1:
+            return self.__destaque__[0]
+        return {"bool": {"should": list(self.__destaque__)}}
+
+    # highlight: ConfigHighlight (usa o do grupo se não for informado)
+    def as_query(self, campo_highlight = '', highlight = None):
         # nenhum resultado
-        if not (any(self.__must__) or any(self.__must_not__) or any(self.__should__)):
+        if not (any(self.__must__) or any(self.__must_not__) or any(self.__should__) or any(self.__filter__)):
             return None
-        _must = self.__must__
+        # listas novas para não alterar os critérios do grupo a cada chamada
+        _must = list(self.__must__)
+        _filter = list(self.__filter__)
         if any(self.__should__):
-            _must.append({"bool": {"should" : self.__should__}})
+            # should só com filtros também fica no contexto de filtro
+            if self.contexto_filtro and not self.__should_pontuado__:
+                _filter.append({"bool": {"should" : list(self.__should__)}})
+            else:
+                _must.append({"bool": {"should" : list(self.__should__)}})
         _bool = {}
         if any(_must):
             _bool['must'] = _must
+        if any(_filter):
+            _bool['filter'] = _filter
         if any(self.__must_not__):
-            _bool['must_not'] = self.__must_not__
+            _bool['must_not'] = list(self.__must_not__)
         # retorna a query bool ou a query none se não tiver critérios
-        if any(_bool):
+        if any(_bool) and self.constant_score and not any(_must):
+            query = { "query": {"constant_score": {"filter": {"bool": _bool } } } }
+        elif any(_bool):
             query = { "query": {"bool": _bool } }
         else:
             query = { "query": {"match_none": {} } }
         if campo_highlight:
             query['_source'] = [""]
-            query['highlight'] = {"type" : "plain", "fields": {   f"{campo_highlight}": CRITERIO_CAMPO_HIGHLIGHT   }}
+            highlight = self.highlight if highlight is None else highlight
+            query['highlight'] = highlight_campo(campo_highlight, highlight, self.highlight_query())
         return query
 
+    # query em bytes com size, from e highlight incluídos sem serializar a query novamente
+    # a query e o highlight são serializados uma vez até um novo critério ser incluído - None se não houver critérios
+    def corpo_bytes(self, size = None, desde = None, campo_highlight = '', highlight = None):
+        if None not in self.__query_bytes__:
+            query = self.as_query()
+            self.__query_bytes__[None] = None if query is None else query_em_bytes(query)
+        query = self.__query_bytes__[None]
+        if query is None:
+            return None
+        _highlight = None
+        if campo_highlight:
+            highlight = self.highlight if highlight is None else highlight
+            chave = (campo_highlight, None if highlight is None else highlight.chave())
+            _highlight = self.__query_bytes__.get(chave)
+            if _highlight is None:
+                _highlight = self.__query_bytes__[chave] = query_em_bytes(highlight_campo(campo_highlight, highlight, self.highlight_query()))
+        return juntar_query_bytes(query, size, desde, _highlight)
+
     def as_string(self):
         return self.__as_string__.strip()
 
+###########################################################
+# Queries imutáveis entregues pelo cache para que uma
+# requisição não altere a query usada por outra
+# deepcopy() retorna uma cópia editável (dict/list comuns)
+#----------------------------------------------------------
+ERRO_QUERY_IMUTAVEL = 'Query compilada do cache não pode ser alterada, use deepcopy(query) ou dict(query) para obter uma cópia editável.'
+
+class DictCongelado(dict):
+    def __bloqueado__(self, *args, **kwargs):
+        raise TypeError(ERRO_QUERY_IMUTAVEL)
+    __setitem__ = __delitem__ = __ior__ = __bloqueado__
+    clear = pop = popitem = setdefault = update = __bloqueado__
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {k: deepcopy(v, memo) for k, v in self.items()}
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+class ListaCongelada(list):
+    def __bloqueado__(self, *args, **kwargs):
+        raise TypeError(ERRO_QUERY_IMUTAVEL)
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = __bloqueado__
+    append = extend = insert = remove = pop = clear = sort = reverse = __bloqueado__
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [deepcopy(v, memo) for v in self]
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+# converte recursivamente dicts e listas da query em versões imutáveis
+# memo: partes já convertidas (a query compartilhada com o highlight é convertida uma vez)
+def congelar_query(query, memo = None):
+    if not isinstance(query, (dict, list, tuple)) or isinstance(query, (DictCongelado, ListaCongelada)):
+        return query
+    memo = {} if memo is None else memo
+    res = memo.get(id(query))
+    if res is None:
+        if isinstance(query, dict):
+            res = DictCongelado({k: congelar_query(v, memo) for k, v in query.items()})
+        else:
+            res = ListaCongelada([congelar_query(v, memo) for v in query])
+        memo[id(query)] = res
+    return res
+
+# resultado compilado e imutável de uma PesquisaElasticFacil ou GruposPesquisaElasticFacil
+# criterios_elastic         -> query pura
+# criterios_elastic_highlight -> query com highlight no campo de texto (padrão)
+# criterios_reformatado     -> como os critérios foram interpretados
+# avisos                    -> tupla com as sugestões de avisos para o usuário
+class PesquisaCompilada():
+    __slots__ = ('criterios_elastic', 'criterios_elastic_highlight', 'criterios_reformatado', 'avisos', 'campo_texto',
+                 'highlight', 'highlight_query', '__query_bytes__')
+
+    def __init__(self, criterios_elastic, criterios_elastic_highlight, criterios_reformatado, avisos, campo_texto,
+                 highlight = None, highlight_query = None):
+        _set = object.__setattr__
+        memo = {}
+        _set(self, 'criterios_elastic', congelar_query(criterios_elastic, memo))
+        _set(self, 'criterios_elastic_highlight', congelar_query(criterios_elastic_highlight, memo))
+        _set(self, 'criterios_reformatado', str(criterios_reformatado))
+        _set(self, 'avisos', tuple(avisos))
+        _set(self, 'campo_texto', campo_texto)
+        _set(self, 'highlight', highlight)
+        _set(self, 'highlight_query', congelar_query(highlight_query, memo))
+        _set(self, '__query_bytes__', {}) # query e highlight por campo em bytes - compartilhados por quem usa o cache
+
+    def __setattr__(self, nome, valor):
+        raise TypeError(ERRO_QUERY_IMUTAVEL)
+
+    @classmethod
+    def de_pesquisa(self, pesquisa):
+        return self(criterios_elastic=pesquisa.criterios_elastic,
+                    criterios_elastic_highlight=pesquisa.criterios_elastic_highlight,
+                    criterios_reformatado=pesquisa.criterios_reformatado,
+                    avisos=pesquisa.avisos,
+                    campo_texto=pesquisa.campo_texto,
+                    highlight=pesquisa.highlight)
+
+    @classmethod
+    def de_grupos(self, grupos):
+        query = grupos.as_query()
+        # o highlight reaproveita a query compilada sem montar novamente os grupos
+        query_highlight = None
+        highlight_query = grupos.highlight_query()
+        if query is not None:
+            query_highlight = {'query': query['query'], '_source': [""],
+                               'highlight': highlight_campo(grupos.campo_texto_padrao, grupos.highlight, highlight_query)}
+        return self(criterios_elastic=query,
+                    criterios_elastic_highlight=query_highlight,
+                    criterios_reformatado=grupos.as_string(),
+                    avisos=grupos.avisos,
+                    campo_texto=grupos.campo_texto_padrao,
+                    highlight=grupos.highlight,
+                    highlight_query=highlight_query)
+
+    def as_string(self):
+        return self.criterios_reformatado
+
+    # retorna a query pura ou com highlight no campo informado
+    def as_query(self, campo_highlight = ''):
+        if (not campo_highlight) or self.criterios_elastic is None:
+            return self.criterios_elastic
+        if campo_highlight == self.campo_texto:
+            return self.criterios_elastic_highlight
+        return DictCongelado({'query': self.criterios_elastic['query'], '_source': ListaCongelada([""]),
+                              'highlight': congelar_query(highlight_campo(campo_highlight, self.highlight, self.highlight_query))})
+
+    # query em bytes com size, from e highlight incluídos sem serializar a query novamente (None se não houver critérios)
+    def corpo_bytes(self, size = None, desde = None, campo_highlight = ''):
+        if self.criterios_elastic is None:
+            return None
+        query = self.__query_bytes__.get(None)
+        if query is None:
+            query = self.__query_bytes__[None] = query_em_bytes(self.criterios_elastic)
+        _highlight = None
+        if campo_highlight:
+            _highlight = self.__query_bytes__.get(campo_highlight)
+            if _highlight is None:
+                _highlight = self.__query_bytes__[campo_highlight] = query_em_bytes(highlight_campo(campo_highlight, self.highlight, self.highlight_query))
+        return juntar_query_bytes(query, size, desde, _highlight)
+
+    def __str__(self) -> str:
+        return f'PesquisaCompilada: {self.criterios_reformatado}'
+
+###########################################################
+# Cache LRU de queries compiladas com expiração por tempo (ttl em segundos)
+# evita repetir toda a construção da query para critérios populares
+# (exemplos, pesquisas salvas, paginação)
+# - tamanho_maximo: quantidade de queries mantidas, as menos usadas são descartadas
+# - ttl: tempo em segundos que uma query compilada pode ser reaproveitada (None = sem expiração)
+# Exemplo:
+#   pc = CACHE_QUERIES.get_pesquisa('dano adj2 moral', campo_texto='texto', sufixo_campo_raw='.raw')
+#   pc.criterios_elastic_highlight
+#----------------------------------------------------------
+class CacheQueriesElastic():
+
+    def __init__(self, tamanho_maximo = 1000, ttl = None) -> None:
+        self.tamanho_maximo = max(1, int(tamanho_maximo))
+        self.ttl = ttl
+        self.__cache__ = OrderedDict() # chave: (validade, PesquisaCompilada)
+        self.__lock__ = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirados = 0
+
+    def __len__(self):
+        return len(self.__cache__)
+
+    def __obter__(self, chave):
+        with self.__lock__:
+            item = self.__cache__.get(chave)
+            if item is not None:
+                validade, compilada = item
+                if validade is None or validade > monotonic():
+                    self.__cache__.move_to_end(chave)
+                    self.hits += 1
+                    return compilada
+                del self.__cache__[chave]
+                self.expirados += 1
+            self.misses += 1
+        return None
+
+    def __guardar__(self, chave, compilada):
+        validade = None if self.ttl is None else monotonic() + self.ttl
+        with self.__lock__:
+            self.__cache__[chave] = (validade, compilada)
+            self.__cache__.move_to_end(chave)
+            while len(self.__cache__) > self.tamanho_maximo:
+                self.__cache__.popitem(last=False)
+                self.evictions += 1
+
+    # retorna a PesquisaCompilada dos critérios de uma PesquisaElasticFacil
+    # erros de construção da pesquisa não são armazenados no cache
+    def get_pesquisa(self, criterios, campo_texto = 'texto', sufixo_campo_raw = None, sufixo_campo_reverso = None, numeros_como_termos = False,
+                     multi_termos = None, highlight = None, termos_chave = None):
+        # sufixos normalizados como na pesquisa ('raw' e '.raw' usam a mesma entrada)
+        chave = ('P', str(criterios), str(campo_texto), Operadores.sufixo_campo(sufixo_campo_raw), Operadores.sufixo_campo(sufixo_campo_reverso), bool(numeros_como_termos),
+                 multi_termos.chave() if multi_termos is not None else None, highlight.chave() if highlight is not None else None,
+                 termos_chave.chave() if termos_chave is not None else None)
+        compilada = self.__obter__(chave)
+        if compilada is None:
+            pe = PesquisaElasticFacil(criterios, campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw,
+                                      sufixo_campo_reverso=sufixo_campo_reverso, numeros_como_termos=numeros_como_termos,
+                                      multi_termos=multi_termos, highlight=highlight, termos_chave=termos_chave)
+            compilada = PesquisaCompilada.de_pesquisa(pe)
+            self.__guardar__(chave, compilada)
+        return compilada
+
+    # retorna a PesquisaCompilada dos critérios de um GruposPesquisaElasticFacil
+    def get_grupos(self, criterios_agrupados, campo_texto_padrao = 'texto', sufixo_campo_raw = '.raw', campos_disponiveis = {}, sufixo_campo_reverso = None,
+                   numeros_como_termos = False, multi_termos = None, contexto_filtro = False, campos_filtro = (), campos_pontuados = (),
+                   constant_score = False, highlight = None, termos_chave = None):
+        _campos = campos_disponiveis if type(campos_disponiveis) is dict else dict(campos_disponiveis)
+        _campos = tuple(sorted((str(k), Operadores.sufixo_campo(v)) for k, v in _campos.items()))
+        chave = ('G', str(criterios_agrupados), str(campo_texto_padrao), Operadores.sufixo_campo(sufixo_campo_raw), _campos, Operadores.sufixo_campo(sufixo_campo_reverso),
+                 bool(numeros_como_termos), multi_termos.chave() if multi_termos is not None else None,
+                 bool(contexto_filtro), tuple(sorted(map(str, campos_filtro or ()))), tuple(sorted(map(str, campos_pontuados or ()))),
+                 bool(constant_score), highlight.chave() if highlight is not None else None,
+                 termos_chave.chave() if termos_chave is not None else None)
+        compilada = self.__obter__(chave)
+        if compilada is None:
+            grupos = GruposPesquisaElasticFacil(criterios_agrupados, campo_texto_padrao=campo_texto_padrao,
+                                                sufixo_campo_raw=sufixo_campo_raw, campos_disponiveis=campos_disponiveis,
+                                                sufixo_campo_reverso=sufixo_campo_reverso, numeros_como_termos=numeros_como_termos,
+                                                multi_termos=multi_termos, contexto_filtro=contexto_filtro, campos_filtro=campos_filtro,
+                                                campos_pontuados=campos_pontuados, constant_score=constant_score, highlight=highlight,
+                                                termos_chave=termos_chave)
+            compilada = PesquisaCompilada.de_grupos(grupos)
+            self.__guardar__(chave, compilada)
+        return compilada
+
+    def clear(self):
+        with self.__lock__:
+            self.__cache__.clear()
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {'tamanho': len(self.__cache__), 'tamanho_maximo': self.tamanho_maximo,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirados': self.expirados,
+                'hit_rate': self.hits / total if total else 0.0}
+
+# cache compartilhado pelo módulo
+CACHE_QUERIES = CacheQueriesElastic()
+
+###########################################################
+# Compilação de muitos critérios (ex.: recompilar pesquisas salvas após
+# mudanças de analisadores ou mapeamentos)
+# - retorna um gerador na ordem de entrada com (query, criterios_reformatado, avisos, erro)
+# - erros de cada critério (parênteses, operadores misturados, etc) são retornados em erro
+#   e a query é None, sem interromper o lote
+# - workers > 1 distribui os critérios em um pool de processos (chunksize critérios por vez)
+# Exemplo:
+#   for query, reformatado, avisos, erro in compilar_lote(criterios, workers=4):
+#       ...
+#----------------------------------------------------------
+def compilar_criterio(criterios, campo_texto = 'texto', sufixo_campo_raw = None, sufixo_campo_reverso = None, numeros_como_termos = False,
+                      multi_termos = None):
+    try:
+        pe = PesquisaElasticFacil(criterios, campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw,
+                                  sufixo_campo_reverso=sufixo_campo_reverso, numeros_como_termos=numeros_como_termos,
+                                  multi_termos=multi_termos)
+        return (pe.criterios_elastic, pe.criterios_reformatado, list(pe.avisos), None)
+    except Exception as e:
+        return (None, '', [], str(e))
+
+def compilar_lote(criterios, workers = 1, chunksize = 256, campo_texto = 'texto', sufixo_campo_raw = None, sufixo_campo_reverso = None,
+                  numeros_como_termos = False, multi_termos = None):
+    _compilar = partial(compilar_criterio, campo_texto=campo_texto, sufixo_campo_raw=sufixo_campo_raw,
+                        sufixo_campo_reverso=sufixo_campo_reverso, numeros_como_termos=numeros_como_termos,
+                        multi_termos=multi_termos)
+    if not workers or workers <= 1:
+        yield from map(_compilar, criterios)
+        return
+    with Pool(processes=workers) as pool:
+        yield from pool.imap(_compilar, criterios, chunksize=max(1, int(chunksize)))
+
 if __name__ == "__main__":
     PRINT_DEBUG = True
 
@@ -12,7 +12,11 @@
 
 import unittest
 from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, Operadores
+from util_pesquisaelastic_facil import CacheQueriesElastic, compilar_lote, ConfigMultiTermos, ConfigHighlight, CRITERIO_CAMPO_HIGHLIGHT
+from util_pesquisaelastic_facil import ParserPesquisaElastic, NoTermo, NoNao, NoE, NoOU, NoProximidade, NoFrase
 import json
+from copy import deepcopy
+from time import sleep
 
 TESTES_TOKENS = (
     ('"termo1 123.termo2"',['"termo1"', 'ADJ1', '"123"', 'ADJ1', '"termo2"']),
@@ -155,6 +159,108 @@ TESTES_GRUPOS = (
 ################################################################################
 ################################################################################
 
+TESTES_ARVORE = (
+    ('dano', NoE, (NoTermo,)),
+    ('dano moral', NoE, (NoTermo, NoTermo)),
+    ('dano ou moral', NoOU, (NoTermo, NoTermo)),
+    ('dano adj2 moral', NoProximidade, (NoTermo, NoTermo)),
+    ('"dano moral"', NoFrase, (NoTermo, NoTermo)),
+    ('dano nao moral', NoE, (NoTermo, NoNao)),
+    ('(dano adj2 moral) ou (dor prox5 sofrimento)', NoOU, (NoProximidade, NoProximidade)),
+)
+
+TESTES_TIPOS_TOKENS = (
+    # token, e_operador, operador, n, agrupamento
+    ('dano', False, 'dano', 1, ''),
+    ('adj5', True, 'adj', 5, 'adj'),
+    ('PROX10', True, 'PROX', 10, 'PROX'),
+    ('ou', True, 'ou', 1, 'ou'),
+    ('com', True, 'com', 1, ''),
+    ('NAO', True, 'NAO', 1, ''),
+    ('5adj2', False, 'adj', 5, 'adj'),
+)
+
+# critérios e query com sufixo_campo_reverso='.reverse' e sufixo_campo_raw='.raw'
+TESTES_REVERSO = (
+    ('$ano', {"prefix": {"texto.reverse": {"case_insensitive": True, "value": "ona"}}}),
+    ('*ano ou dano*', {"bool": {"should": [{"prefix": {"texto.reverse": {"case_insensitive": True, "value": "ona"}}}, {"wildcard": {"texto": {"case_insensitive": True, "value": "dano*"}}}]}}),
+    ('$ano adj2 moral', {"span_near": {"clauses": [{"field_masking_span": {"query": {"span_multi": {"match": {"prefix": {"texto.reverse": {"case_insensitive": True, "value": "ona"}}}}}, "field": "texto"}}, {"span_term": {"texto": "moral"}}], "slop": 1, "in_order": True}}),
+    ('dano nao $ano', {"bool": {"must": [{"term": {"texto": "dano"}}], "must_not": [{"prefix": {"texto.reverse": {"case_insensitive": True, "value": "ona"}}}]}}),
+    # campo raw, curingas no meio ou no fim e regex continuam iguais
+    ('"$ano" adj2 moral', {"span_near": {"clauses": [{"span_multi": {"match": {"wildcard": {"texto.raw": {"case_insensitive": True, "value": "*ano"}}}}}, {"span_term": {"texto.raw": "moral"}}], "slop": 1, "in_order": True}}),
+    ('$an$ ou ??ano', {"bool": {"should": [{"wildcard": {"texto": {"case_insensitive": True, "value": "*an*"}}}, {"regexp": {"texto": {"case_insensitive": True, "value": ".{0,2}ano"}}}]}}),
+)
+
+# critérios e query com numeros_como_termos=True
+TESTES_NUMEROS = (
+    ('2020', {"terms": {"texto": ["2020", "2_020"]}}),
+    ('termo1 123/termo2', {"bool": {"must": [{"term": {"texto": "termo1"}}, {"term": {"texto": "123"}}, {"term": {"texto": "termo2"}}]}}),
+    ('123.456 adj2 lei', {"span_near": {"clauses": [{"span_or": {"clauses": [{"span_term": {"texto": "123456"}}, {"span_term": {"texto": "123_456"}}]}}, {"span_term": {"texto": "lei"}}], "slop": 1, "in_order": True}}),
+    ('reais prox2 10.000,00', {"span_near": {"clauses": [{"span_term": {"texto": "reais"}}, {"span_or": {"clauses": [{"span_term": {"texto": "1000000"}}, {"span_term": {"texto": "10000_00"}}, {"span_term": {"texto": "10_00000"}}, {"span_term": {"texto": "10_000_00"}}]}}], "slop": 1, "in_order": False}}),
+    # números com curingas ou com muitas formas continuam com regexp
+    ('12?4 ou 1234*', {"bool": {"should": [{"regexp": {"texto": {"case_insensitive": True, "value": "1_?2.{0,1}4"}}}, {"regexp": {"texto": {"case_insensitive": True, "value": "12_?34.*"}}}]}}),
+    ('1.2.3.4.5.6.7.8', {"regexp": {"texto": {"case_insensitive": True, "value": "1_?2_?3_?4_?5_?6_?7_?8"}}}),
+)
+
+# configuração, critérios e opções esperadas de cada wildcard/regexp/prefix da query (em ordem)
+CONFIG_RAW_100 = ConfigMultiTermos(por_campo={'texto.raw': {'rewrite': 'top_terms_100'}})
+TESTES_MULTI_TERMOS = (
+    (ConfigMultiTermos(), 'dano* adj2 mora?', [{'rewrite': 'top_terms_1024'}, {'rewrite': 'top_terms_512', 'max_determinized_states': 2000}]),
+    (ConfigMultiTermos(), '$ano prox5 da*no', [{'rewrite': 'top_terms_256'}, {'rewrite': 'top_terms_512'}]),
+    (ConfigMultiTermos(), '12?4 adj3 lei', [{'rewrite': 'top_terms_256', 'max_determinized_states': 1000}]),
+    # fora de ADJ/PROX apenas max_determinized_states
+    (ConfigMultiTermos(), 'mora? ou dano*', [{'max_determinized_states': 2000}, {}]),
+    (ConfigMultiTermos(somente_spans=False), 'mora? ou dano*', [{'rewrite': 'top_terms_512', 'max_determinized_states': 2000}, {'rewrite': 'top_terms_1024'}]),
+    # valores da configuração e por campo
+    (ConfigMultiTermos(rewrite='top_terms_blended_freqs_50', max_determinized_states=500), 'dano* adj2 mora?',
+        [{'rewrite': 'top_terms_blended_freqs_50'}, {'rewrite': 'top_terms_blended_freqs_50', 'max_determinized_states': 500}]),
+    (CONFIG_RAW_100, '"dano*" adj2 mora?', [{'rewrite': 'top_terms_100'}, {'rewrite': 'top_terms_100', 'max_determinized_states': 2000}]),
+    (CONFIG_RAW_100, 'dano* adj2 mora?', [{'rewrite': 'top_terms_1024'}, {'rewrite': 'top_terms_512', 'max_determinized_states': 2000}]),
+    (ConfigMultiTermos(por_formato={'prefixo': {'rewrite': 'top_terms_10'}}), 'dano* adj3 estet*', [{'rewrite': 'top_terms_10'}, {'rewrite': 'top_terms_10'}]),
+)
+
+CAMPOS_FILTRO = {'texto':'', 'sg_classe':'', 'dt':''}
+SPAN_DANO_MORAL = {"span_near": {"clauses": [{"span_term": {"texto": "dano"}}, {"span_term": {"texto": "moral"}}], "slop": 1, "in_order": True}}
+# critérios, opções do grupo, query esperada
+TESTES_FILTROS = (
+    ('.texto.(dano adj2 moral) .dt.(>=2020-01-01 <2021-01-01)', {},
+        {"bool": {"must": [SPAN_DANO_MORAL, {"range": {"dt": {"gte": "2020-01-01", "lt": "2021-01-01"}}}]}}),
+    ('.texto.(dano adj2 moral) .dt.(>=2020-01-01 <2021-01-01)', {'contexto_filtro': True},
+        {"bool": {"must": [SPAN_DANO_MORAL], "filter": [{"range": {"dt": {"gte": "2020-01-01", "lt": "2021-01-01"}}}]}}),
+    ('.texto.(dano adj2 moral) .sg_classe.(RESP OU AgRg) NAO .dt.(>2020-06-01)', {'contexto_filtro': True, 'campos_filtro': ['sg_classe']},
+        {"bool": {"must": [SPAN_DANO_MORAL], "filter": [{"bool": {"should": [{"term": {"sg_classe": "resp"}}, {"term": {"sg_classe": "agrg"}}]}}],
+                  "must_not": [{"range": {"dt": {"gt": "2020-06-01"}}}]}}),
+    # campos pontuados continuam no must
+    ('.texto.(dano adj2 moral) .dt.(>=2020-01-01) .sg_classe.(RESP)', {'contexto_filtro': True, 'campos_filtro': ['sg_classe'], 'campos_pontuados': ['dt']},
+        {"bool": {"must": [SPAN_DANO_MORAL, {"range": {"dt": {"gte": "2020-01-01"}}}], "filter": [{"term": {"sg_classe": "resp"}}]}}),
+    # constant_score apenas sem critérios com score
+    ('.dt.(>=2020-01-01) .sg_classe.(RESP) NAO .sg_classe.(AgRg)', {'contexto_filtro': True, 'campos_filtro': ['sg_classe'], 'constant_score': True},
+        {"constant_score": {"filter": {"bool": {"filter": [{"range": {"dt": {"gte": "2020-01-01"}}}, {"term": {"sg_classe": "resp"}}],
+                                                "must_not": [{"term": {"sg_classe": "agrg"}}]}}}}),
+    ('.texto.(dano adj2 moral) .dt.(>=2020-01-01)', {'contexto_filtro': True, 'constant_score': True},
+        {"bool": {"must": [SPAN_DANO_MORAL], "filter": [{"range": {"dt": {"gte": "2020-01-01"}}}]}}),
+)
+
+HIGHLIGHT_FVH = ConfigHighlight('fvh', fragment_size=200, number_of_fragments=3, no_match_size=150)
+OPCOES_FVH = {"require_field_match": False, "fragment_size": 200, "number_of_fragments": 3, "no_match_size": 150}
+TAGS_MARK = {"pre_tags": ["<mark>"], "post_tags": ["</mark>"]}
+
+# retorna as opções (sem case_insensitive e value) de cada wildcard, regexp e prefix da query
+def opcoes_multi_termos(query, res = None):
+    res = [] if res is None else res
+    if isinstance(query, dict):
+        for k, v in query.items():
+            if k in ('wildcard', 'regexp', 'prefix'):
+                opcoes = dict(list(v.values())[0])
+                opcoes.pop('case_insensitive'); opcoes.pop('value')
+                res.append(opcoes)
+            else:
+                opcoes_multi_termos(v, res)
+    elif isinstance(query, list):
+        for _ in query:
+            opcoes_multi_termos(_, res)
+    return res
+
 class Teste(unittest.TestCase):
 
     def teste_0_tokens(self):
@@ -222,5 +328,264 @@ class Teste(unittest.TestCase):
                 print(f'{i}) "{teste[0]}" \nEsperado: {json.dumps(query)}\nRecebido: {json.dumps(saida)}')
                 self.assertDictEqual(query, saida)
 
+    def teste_5_cache(self):
+        cache = CacheQueriesElastic(tamanho_maximo=2)
+        for i, teste in enumerate(TESTES_QUERIES):
+            with self.subTest(f'Cache {i} - "{teste[0]}"'):
+                criterio, query = teste
+                pc = cache.get_pesquisa(criterio, campo_texto='texto', sufixo_campo_raw='raw')
+                self.assertDictEqual(query, pc.criterios_elastic.get('query',{}))
+                self.assertIs(pc, cache.get_pesquisa(criterio, campo_texto='texto', sufixo_campo_raw='raw'))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, len(TESTES_QUERIES))
+        self.assertEqual(cache.misses, len(TESTES_QUERIES))
+        self.assertEqual(cache.evictions, len(TESTES_QUERIES) - 2)
+        # a query do cache não pode ser alterada por quem a recebe
+        pc = cache.get_pesquisa('dano adj2 moral')
+        with self.assertRaises(TypeError):
+            pc.criterios_elastic_highlight['size'] = 100
+        with self.assertRaises(TypeError):
+            pc.criterios_elastic['query']['span_near']['clauses'].append({})
+        with self.assertRaises(TypeError):
+            pc.criterios_elastic = {}
+        copia = deepcopy(pc.criterios_elastic_highlight)
+        copia['size'] = 100
+        self.assertNotIn('size', pc.criterios_elastic_highlight)
+        self.assertEqual(json.dumps(pc.criterios_elastic_highlight), json.dumps(PesquisaElasticFacil('dano adj2 moral').criterios_elastic_highlight))
+        # grupos considerando os campos disponíveis na chave
+        for i, teste in enumerate(TESTES_GRUPOS):
+            with self.subTest(f'Cache grupo {i} - "{teste[0]}"'):
+                criterio, query = teste
+                campos = {'texto':'raw','CAMPO':'raw','DATA':'','TIPO':''}
+                pc = cache.get_grupos(criterio, campo_texto_padrao='texto', campos_disponiveis=campos)
+                self.assertDictEqual(query, pc.as_query().get('query',{}))
+                self.assertIs(pc, cache.get_grupos(criterio, campo_texto_padrao='texto', campos_disponiveis=dict(campos)))
+                self.assertIs(pc, cache.get_grupos(criterio, campo_texto_padrao='texto', sufixo_campo_raw='raw',
+                                                   campos_disponiveis={'texto':'.raw','CAMPO':'.raw','DATA':'','TIPO':''}))
+                self.assertIsNot(pc, cache.get_grupos(criterio, campo_texto_padrao='texto', campos_disponiveis={'CAMPO':'', 'DATA':'', 'TIPO':''}))
+                self.assertEqual(pc.as_query('texto')['highlight']['fields'].keys(), {'texto'})
+        # expiração e limpeza
+        cache = CacheQueriesElastic(ttl=0.01)
+        pc = cache.get_pesquisa('dano')
+        sleep(0.02)
+        self.assertIsNot(pc, cache.get_pesquisa('dano'))
+        self.assertEqual(cache.expirados, 1)
+        # sufixos equivalentes usam a mesma entrada
+        self.assertIs(cache.get_pesquisa('dano', sufixo_campo_raw='raw'), cache.get_pesquisa('dano', sufixo_campo_raw='.raw'))
+        # ttl = 0 expira imediatamente, apenas ttl = None não expira
+        cache = CacheQueriesElastic(ttl=0)
+        pc = cache.get_pesquisa('dano')
+        self.assertIsNot(pc, cache.get_pesquisa('dano'))
+        self.assertEqual((cache.hits, cache.expirados), (0, 1))
+        cache = CacheQueriesElastic(ttl=None)
+        self.assertIs(cache.get_pesquisa('dano'), cache.get_pesquisa('dano'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def teste_6_arvore(self):
+        # a árvore reproduz as listas e o texto reformatado da pesquisa
+        for i, teste in enumerate(TESTES_STR + TESTES_STR_CORRECAO + TESTES_QUERIES):
+            with self.subTest(f'Árvore {i} - "{teste[0]}"'):
+                pe = PesquisaElasticFacil(teste[0])
+                if pe.arvore is None:
+                    continue # pesquisa inteligente
+                arvore = ParserPesquisaElastic().analisar(teste[0])
+                self.assertEqual(arvore.as_lista(), pe.criterios_listas)
+                self.assertEqual(arvore.as_string(), pe.criterios_reformatado)
+        # tipos dos nós
+        for criterio, tipo, tipos_filhos in TESTES_ARVORE:
+            with self.subTest(f'Árvore - "{criterio}"'):
+                arvore = ParserPesquisaElastic().analisar(criterio)
+                self.assertIs(type(arvore), tipo)
+                self.assertEqual(tuple(type(_) for _ in arvore.filhos), tipos_filhos)
+        # mesmos erros de parênteses e operadores
+        for criterio in ('dano (moral', 'dano) moral', '((dano) moral'):
+            with self.subTest(f'Árvore erro - "{criterio}"'):
+                with self.assertRaises(Exception):
+                    ParserPesquisaElastic().analisar(criterio)
+
+    def teste_7_sob_demanda(self):
+        # a query e o highlight são criados no primeiro acesso e compartilham a query de pesquisa
+        pe = PesquisaElasticFacil('dano adj2 moral', campo_texto='texto', sufixo_campo_raw='raw')
+        self.assertIs(pe.criterios_elastic, pe.criterios_elastic)
+        self.assertIs(pe.criterios_elastic_highlight['query'], pe.criterios_elastic['query'])
+        self.assertEqual(list(pe.criterios_elastic_highlight.keys()), ['query', 'highlight', '_source'])
+        self.assertEqual(pe.criterios_elastic_highlight['highlight']['fields'].keys(), {'texto'})
+        self.assertNotIn('highlight', pe.criterios_elastic)
+        # pesquisa inteligente define as queries na construção
+        pe = PesquisaElasticFacil('contém: dano moral')
+        self.assertIn('more_like_this', pe.criterios_elastic['query'])
+        self.assertIs(pe.criterios_elastic_highlight['query'], pe.criterios_elastic['query'])
+        # __slots__
+        with self.assertRaises(AttributeError):
+            pe.outro_atributo = 1
+        # o cache congela uma única vez a query compartilhada
+        pc = CacheQueriesElastic().get_pesquisa('dano adj2 moral')
+        self.assertIs(pc.criterios_elastic_highlight['query'], pc.criterios_elastic['query'])
+
+    def teste_8_tipos_tokens(self):
+        for token, e_operador, operador, n, agrupamento in TESTES_TIPOS_TOKENS:
+            with self.subTest(f'Tipo token "{token}"'):
+                tipo = Operadores.tipo_token(token)
+                self.assertEqual((tipo.e_operador, tipo.operador, tipo.n, tipo.agrupamento), (e_operador, operador, n, agrupamento))
+                self.assertIs(tipo, Operadores.tipo_token(token))
+        tipo = Operadores.tipo_token('"inss"')
+        self.assertTrue(tipo.aspas)
+        self.assertEqual(tipo.get_valor(), 'inss')
+        tipo = Operadores.tipo_token('estetic??')
+        self.assertTrue(tipo.regex)
+        self.assertEqual(tipo.get_valor(), 'estetic.{0,2}')
+        self.assertEqual(Operadores.tipo_token('Açaí|Dano').get_tokens(), ('Acai', 'Dano'))
+        # a tabela é limitada
+        tamanho = Operadores.TAMANHO_TABELA_TIPOS
+        try:
+            Operadores.TAMANHO_TABELA_TIPOS = 10
+            for i in range(25):
+                Operadores.tipo_token(f'termo{i}')
+            self.assertLessEqual(len(Operadores.TABELA_TIPOS), 10)
+        finally:
+            Operadores.TAMANHO_TABELA_TIPOS = tamanho
+
+    def teste_9_lote(self):
+        criterios = [_[0] for _ in TESTES_QUERIES] + ['dano (moral', 'dano) moral', '.campo.(dano)']
+        esperado = [_[1] for _ in TESTES_QUERIES]
+        for workers in (1, 2):
+            with self.subTest(f'Lote workers={workers}'):
+                # gerador de entrada e saída na mesma ordem
+                res = list(compilar_lote(iter(criterios), workers=workers, chunksize=3, sufixo_campo_raw='raw'))
+                self.assertEqual(len(res), len(criterios))
+                for i, query in enumerate(esperado):
+                    self.assertDictEqual(query, res[i][0]['query'])
+                    self.assertEqual(res[i][1], PesquisaElasticFacil(criterios[i]).criterios_reformatado)
+                    self.assertIsNone(res[i][3])
+                # erros não interrompem o lote
+                for query, reformatado, avisos, erro in res[len(esperado):]:
+                    self.assertIsNone(query)
+                    self.assertTrue(erro)
+
+    def teste_10_reverso(self):
+        for criterios, query in TESTES_REVERSO:
+            with self.subTest(f'Reverso: {criterios}'):
+                pe = PesquisaElasticFacil(criterios, sufixo_campo_raw='raw', sufixo_campo_reverso='reverse')
+                self.assertDictEqual(pe.criterios_elastic['query'], query)
+        # sem o sufixo não há alteração
+        self.assertDictEqual(PesquisaElasticFacil('$ano').criterios_elastic['query'],
+                             {"wildcard": {"texto": {"case_insensitive": True, "value": "*ano"}}})
+        # grupos usam o campo reverso apenas no campo texto padrão
+        grupos = GruposPesquisaElasticFacil('.texto.($ano) .tipo.($x)', campos_disponiveis={'texto':'','tipo':''}, sufixo_campo_reverso='.reverse')
+        self.assertEqual(grupos.as_query()['query']['bool']['must'],
+                         [TESTES_REVERSO[0][1], {"wildcard": {"tipo": {"case_insensitive": True, "value": "*x"}}}])
+        # o sufixo faz parte da chave do cache
+        cache = CacheQueriesElastic()
+        self.assertIn('wildcard', cache.get_pesquisa('$ano').criterios_elastic['query'])
+        self.assertIn('prefix', cache.get_pesquisa('$ano', sufixo_campo_reverso='.reverse').criterios_elastic['query'])
+
+    def teste_11_numeros(self):
+        for criterios, query in TESTES_NUMEROS:
+            with self.subTest(f'Números: {criterios}'):
+                pe = PesquisaElasticFacil(criterios, sufixo_campo_raw='raw', numeros_como_termos=True)
+                self.assertDictEqual(pe.criterios_elastic['query'], query)
+        self.assertEqual(Operadores.formas_termo_numerico('1_?234_?567'), ('1234567', '1234_567', '1_234567', '1_234_567'))
+        self.assertEqual(Operadores.formas_termo_numerico('1_?2.{0,1}4'), ())
+        # sem a opção os números continuam com regexp
+        self.assertIn('regexp', PesquisaElasticFacil('2020').criterios_elastic['query'])
+        grupos = GruposPesquisaElasticFacil('.texto.(dano 2020) .ano.(2021)', campos_disponiveis={'texto':'','ano':''}, numeros_como_termos=True)
+        self.assertEqual(grupos.as_query()['query']['bool']['must'][1], {"terms": {"ano": ["2021", "2_021"]}})
+
+    def teste_12_multi_termos(self):
+        for config, criterios, esperado in TESTES_MULTI_TERMOS:
+            with self.subTest(f'Multi termos: {criterios} {config}'):
+                pe = PesquisaElasticFacil(criterios, sufixo_campo_raw='raw', multi_termos=config)
+                self.assertEqual(opcoes_multi_termos(pe.criterios_elastic), esperado)
+        # sem configuração as queries não mudam
+        self.assertEqual(opcoes_multi_termos(PesquisaElasticFacil('dano* adj2 mora?').criterios_elastic), [{}, {}])
+        # grupos usam a configuração em todos os campos e por campo
+        config = ConfigMultiTermos(por_campo={'tipo': {'rewrite': 'top_terms_5'}}, somente_spans=False)
+        grupos = GruposPesquisaElasticFacil('.texto.(dano* adj2 moral) .tipo.(x*)', campos_disponiveis={'texto':'','tipo':''}, multi_termos=config)
+        self.assertEqual(opcoes_multi_termos(grupos.as_query()), [{'rewrite': 'top_terms_1024'}, {'rewrite': 'top_terms_5'}])
+        grupos.add_E_termo('tipo', 'y*')
+        self.assertEqual(opcoes_multi_termos(grupos.as_query())[-1], {'rewrite': 'top_terms_5'})
+        # a configuração faz parte da chave do cache
+        cache = CacheQueriesElastic()
+        self.assertEqual(opcoes_multi_termos(cache.get_pesquisa('dano* adj2 x').criterios_elastic), [{}])
+        self.assertEqual(opcoes_multi_termos(cache.get_pesquisa('dano* adj2 x', multi_termos=ConfigMultiTermos()).criterios_elastic), [{'rewrite': 'top_terms_1024'}])
+        self.assertEqual(len(cache), 2)
+
+    def teste_13_filtros(self):
+        for criterios, opcoes, query in TESTES_FILTROS:
+            with self.subTest(f'Filtros: {criterios} {opcoes}'):
+                grupos = GruposPesquisaElasticFacil(criterios, campos_disponiveis=CAMPOS_FILTRO, **opcoes)
+                self.assertDictEqual(grupos.as_query()['query'], query)
+                # as_query não altera os critérios do grupo
+                self.assertDictEqual(grupos.as_query()['query'], query)
+        # OU só com valores fica no filtro e com pesquisas com score fica no must
+        grupos = GruposPesquisaElasticFacil('.texto.(dano)', campos_disponiveis=CAMPOS_FILTRO, contexto_filtro=True)
+        grupos.add_OU_valor('dt', '>', '2022')
+        grupos.add_OU_valor('dt', '=', '2020')
+        self.assertEqual(grupos.as_query()['query']['bool']['filter'], [{"bool": {"should": [{"range": {"dt": {"gt": "2022"}}}, {"term": {"dt": "2020"}}]}}])
+        grupos.add_OU_termo('texto', 'moral')
+        self.assertNotIn('filter', grupos.as_query()['query']['bool'])
+        self.assertEqual(len(grupos.as_query()['query']['bool']['must']), 2)
+        # as opções fazem parte da chave do cache
+        cache = CacheQueriesElastic()
+        criterios, opcoes, query = TESTES_FILTROS[1]
+        self.assertDictEqual(cache.get_grupos(criterios, campos_disponiveis=CAMPOS_FILTRO, **opcoes).as_query()['query'], query)
+        self.assertDictEqual(cache.get_grupos(criterios, campos_disponiveis=CAMPOS_FILTRO).as_query()['query'], TESTES_FILTROS[0][2])
+        self.assertEqual(len(cache), 2)
+
+    def teste_14_highlight(self):
+        # sem configuração continua o highlight plain
+        pe = PesquisaElasticFacil('dano adj2 moral')
+        self.assertEqual(pe.criterios_elastic_highlight['highlight'], {"type": "plain", "fields": {"texto": CRITERIO_CAMPO_HIGHLIGHT}})
+        pe = PesquisaElasticFacil('dano adj2 moral', highlight=HIGHLIGHT_FVH)
+        self.assertEqual(pe.criterios_elastic_highlight['highlight'], dict(TAGS_MARK, type="fvh", fields={"texto": OPCOES_FVH}))
+        self.assertIs(pe.criterios_elastic_highlight['query'], pe.criterios_elastic['query'])
+        _plain = ConfigHighlight('plain', pre_tags='<b>', post_tags='</b>').as_highlight('texto')
+        self.assertEqual((_plain['pre_tags'], _plain['fields']['texto']['max_analyzed_offset']), (['<b>'], 1000000))
+        self.assertNotIn('pre_tags', ConfigHighlight(pre_tags=None, post_tags=None).as_highlight('texto'))
+        with self.assertRaises(ValueError):
+            ConfigHighlight('outro')
+        # grupos: highlight_query só com os critérios de texto
+        criterios = '.texto.(dano adj2 moral) .tipo.(x) .dt.(>=2020-01-01) NAO .texto.(y)'
+        campos = {'texto':'', 'tipo':'', 'dt':''}
+        destaque = {"bool": {"should": [SPAN_DANO_MORAL, {"term": {"tipo": "x"}}]}}
+        grupos = GruposPesquisaElasticFacil(criterios, campos_disponiveis=campos)
+        self.assertEqual(grupos.as_query('texto')['highlight'], {"type": "plain", "fields": {"texto": CRITERIO_CAMPO_HIGHLIGHT}})
+        self.assertEqual(grupos.as_query('texto', highlight=HIGHLIGHT_FVH)['highlight'],
+                         dict(TAGS_MARK, type="fvh", fields={"texto": dict(OPCOES_FVH, highlight_query=destaque)}))
+        grupos = GruposPesquisaElasticFacil(criterios, campos_disponiveis=campos, highlight=HIGHLIGHT_FVH, contexto_filtro=True, campos_filtro=['tipo'])
+        self.assertEqual(grupos.as_query('texto')['highlight']['fields']['texto']['highlight_query'], SPAN_DANO_MORAL)
+        self.assertNotIn('highlight_query', grupos.as_query('texto', highlight=ConfigHighlight(highlight_query=False))['highlight']['fields']['texto'])
+        # cache com a configuração na chave e highlight em outros campos
+        cache = CacheQueriesElastic()
+        pc = cache.get_grupos(criterios, campos_disponiveis=campos, highlight=HIGHLIGHT_FVH)
+        self.assertEqual(pc.criterios_elastic_highlight['highlight']['fields']['texto']['highlight_query'], destaque)
+        self.assertEqual(pc.as_query('titulo')['highlight']['fields']['titulo']['highlight_query'], destaque)
+        self.assertEqual(cache.get_grupos(criterios, campos_disponiveis=campos).criterios_elastic_highlight['highlight']['type'], 'plain')
+        self.assertEqual(cache.get_pesquisa('dano', highlight=HIGHLIGHT_FVH).as_query('titulo')['highlight'],
+                         dict(TAGS_MARK, type="fvh", fields={"titulo": OPCOES_FVH}))
+        self.assertEqual(len(cache), 3)
+
+    def teste_15_bytes(self):
+        pe = PesquisaElasticFacil('dano adj2 moral', highlight=HIGHLIGHT_FVH)
+        self.assertEqual(json.loads(pe.criterios_elastic_bytes), pe.criterios_elastic)
+        self.assertIs(pe.criterios_elastic_bytes, pe.criterios_elastic_bytes)
+        self.assertEqual(json.loads(pe.corpo_bytes(size=10, desde=20, highlight=True)), dict(pe.criterios_elastic_highlight, size=10, **{'from': 20}))
+        self.assertEqual(json.loads(pe.corpo_bytes(highlight='titulo'))['highlight']['fields'].keys(), {'titulo'})
+        self.assertIs(pe.corpo_bytes(), pe.criterios_elastic_bytes)
+        # nova query renova os bytes - json compacto em UTF-8 sem escapes
+        pe.criterios_elastic = {'query': {'term': {'tipo': 'ação'}}}
+        self.assertEqual(pe.corpo_bytes(size=1), '{"query":{"term":{"tipo":"ação"}},"size":1}'.encode('utf-8'))
+        # grupos: bytes renovados a cada critério incluído
+        grupos = GruposPesquisaElasticFacil('.texto.(dano adj2 moral) .tipo.(x)', campos_disponiveis={'texto':'', 'tipo':''}, highlight=HIGHLIGHT_FVH)
+        self.assertEqual(json.loads(grupos.corpo_bytes(campo_highlight='texto')), grupos.as_query('texto'))
+        grupos.add_criterios_agrupados('.tipo.(y)')
+        self.assertEqual(json.loads(grupos.corpo_bytes(size=5)), dict(grupos.as_query(), size=5))
+        self.assertIsNone(GruposPesquisaElasticFacil().corpo_bytes())
+        # pesquisas compiladas do cache
+        pc = CacheQueriesElastic().get_grupos('.texto.(dano) .tipo.(x)', campos_disponiveis={'texto':'', 'tipo':''})
+        self.assertEqual(json.loads(pc.corpo_bytes(campo_highlight='texto')), pc.criterios_elastic_highlight)
+        self.assertEqual(json.loads(pc.corpo_bytes(desde=3, campo_highlight='titulo')), dict(pc.as_query('titulo'), **{'from': 3}))
+
 if __name__ == '__main__':
     unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Métricas da compilação das pesquisas do componente PesquisaElasticFacil
+# - AgregadorPrometheus: observador da compilação (ver EventoCompilacao) que acumula
+#   histogramas da duração de cada etapa, dos termos e das cláusulas de cada pesquisa
+#   e contadores de compilações, erros e CONTÉM automático
+# - as_prometheus(): texto no formato de exposição do Prometheus
+# - iniciar_servidor_metricas: servidor http local com o endpoint /metrics
+# Exemplo:
+#   agregador = AgregadorPrometheus()
+#   registrar_observador(agregador)
+#   iniciar_servidor_metricas(agregador, porta=9108)
+#   ... curl http://127.0.0.1:9108/metrics
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - histogramas das etapas da compilação
+
+from bisect import bisect_left
+from threading import Lock, Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PREFIXO = 'pesquisaelastic'
+# limites dos histogramas (segundos e quantidades)
+LIMITES_SEGUNDOS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+LIMITES_QUANTIDADES = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+###########################################################
+# Histograma cumulativo no formato do Prometheus
+#----------------------------------------------------------
+class Histograma():
+    __slots__ = ('limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    # linhas _bucket, _sum e _count com os rótulos recebidos
+    def linhas(self, nome, rotulos = ''):
+        res = []
+        acumulado = 0
+        sep = ',' if rotulos else ''
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            res.append(f'{nome}_bucket{{{rotulos}{sep}le="{limite}"}} {acumulado}')
+        rotulos = f'{{{rotulos}}}' if rotulos else ''
+        res.append(f'{nome}_sum{rotulos} {self.soma}')
+        res.append(f'{nome}_count{rotulos} {self.total}')
+        return res
+
+###########################################################
+# Observador que agrega os eventos da compilação
+# pode ser registrado com registrar_observador e lido por várias threads
+#----------------------------------------------------------
+class AgregadorPrometheus():
+    def __init__(self, prefixo = PREFIXO, limites_segundos = LIMITES_SEGUNDOS, limites_quantidades = LIMITES_QUANTIDADES):
+        self.prefixo = prefixo
+        self.__limites_segundos__ = limites_segundos
+        self.__lock__ = Lock()
+        self.etapas = {}
+        self.duracao = Histograma(limites_segundos)
+        self.tokens = Histograma(limites_quantidades)
+        self.clausulas = Histograma(limites_quantidades)
+        self.compilacoes = 0
+        self.erros = 0
+        self.contem_automatico = 0
+        self.pesquisas_inteligentes = 0
+
+    # recebe o EventoCompilacao (durações em ns)
+    def __call__(self, evento):
+        with self.__lock__:
+            self.compilacoes += 1
+            for etapa, ns in evento.etapas.items():
+                histograma = self.etapas.get(etapa)
+                if histograma is None:
+                    histograma = self.etapas[etapa] = Histograma(self.__limites_segundos__)
+                histograma.observar(ns / 1e9)
+            self.duracao.observar(evento.duracao / 1e9)
+            if evento.erro:
+                self.erros += 1
+                return
+            self.tokens.observar(evento.tokens)
+            self.clausulas.observar(evento.clausulas)
+            self.contem_automatico += 1 if evento.contem_automatico else 0
+            self.pesquisas_inteligentes += 1 if evento.pesquisa_inteligente else 0
+
+    def as_prometheus(self):
+        p = self.prefixo
+        with self.__lock__:
+            res = [f'# HELP {p}_etapa_segundos Duração de cada etapa da compilação',
+                   f'# TYPE {p}_etapa_segundos histogram']
+            for etapa in sorted(self.etapas):
+                res.extend(self.etapas[etapa].linhas(f'{p}_etapa_segundos', f'etapa="{etapa}"'))
+            for nome, histograma, ajuda in (('compilacao_segundos', self.duracao, 'Duração total da compilação'),
+                                            ('termos', self.tokens, 'Termos por pesquisa'),
+                                            ('clausulas', self.clausulas, 'Cláusulas da query por pesquisa')):
+                res.append(f'# HELP {p}_{nome} {ajuda}')
+                res.append(f'# TYPE {p}_{nome} histogram')
+                res.extend(histograma.linhas(f'{p}_{nome}'))
+            for nome, valor, ajuda in (('compilacoes_total', self.compilacoes, 'Pesquisas compiladas'),
+                                       ('erros_total', self.erros, 'Pesquisas com erro na compilação'),
+                                       ('contem_automatico_total', self.contem_automatico, 'Pesquisas com CONTÉM: inserido automaticamente'),
+                                       ('pesquisas_inteligentes_total', self.pesquisas_inteligentes, 'Pesquisas inteligentes (CONTÉM:, ADJn: e PROXn:)')):
+                res.append(f'# HELP {p}_{nome} {ajuda}')
+                res.append(f'# TYPE {p}_{nome} counter')
+                res.append(f'{p}_{nome} {valor}')
+        return '\n'.join(res) + '\n'
+
+###########################################################
+# Servidor http local com as métricas do agregador em /metrics
+# retorna o servidor (use servidor.shutdown() para encerrar)
+#----------------------------------------------------------
+def iniciar_servidor_metricas(agregador, porta = 9108, endereco = '127.0.0.1'):
+    class Metricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            corpo = agregador.as_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((endereco, porta), Metricas)
+    Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
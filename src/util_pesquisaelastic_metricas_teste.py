@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Teste Métricas:
+# - eventos da compilação (etapas, termos, cláusulas, CONTÉM automático e erros)
+# - agregador no formato do Prometheus e servidor local
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+from urllib.request import urlopen
+import util_pesquisaelastic_facil
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, contar_clausulas
+from util_pesquisaelastic_facil import registrar_observador, remover_observador, OBSERVADORES_COMPILACAO
+from util_pesquisaelastic_metricas import AgregadorPrometheus, Histograma, iniciar_servidor_metricas
+
+ETAPAS_PARSER = {'classificacao', 'limpeza', 'aspas', 'formatacao', 'agrupamento', 'operadores', 'arvore', 'query'}
+ETAPAS_INTELIGENTE = {'classificacao', 'inteligente', 'query'}
+
+# critérios, etapas, termos, cláusulas, contem automático, erro
+TESTES_EVENTOS = (
+    ('dano adj2 moral ou (x e y*)', ETAPAS_PARSER, 4, 4, False, False),
+    ('dano', ETAPAS_PARSER, 1, 1, False, False),
+    ('"dano moral" nao estetico', ETAPAS_PARSER, 3, 3, False, False),
+    ('contém: dano moral', ETAPAS_INTELIGENTE, 3, 1, False, False),
+    ('O autor ajuizou ação de indenização por danos morais e materiais em face do réu', ETAPAS_INTELIGENTE, 16, 1, True, False),
+    ('(dano moral', {'classificacao', 'limpeza'}, 0, 0, False, True),
+)
+
+TESTES_CLAUSULAS = (
+    ({'query': {'match_all': {}}}, 1),
+    ({'query': {'bool': {'must': [{'term': {'texto': 'a'}}, {'wildcard': {'texto': 'b*'}}]}}}, 2),
+    ({'span_near': {'clauses': [{'span_term': {'texto': 'a'}}, {'span_multi': {'match': {'regexp': {'texto': 'b.*'}}}}]}}, 2),
+    ([], 0),
+)
+
+class Teste(unittest.TestCase):
+
+    def setUp(self):
+        self.eventos = []
+        registrar_observador(self.eventos.append)
+
+    def tearDown(self):
+        remover_observador(self.eventos.append)
+        self.assertEqual(OBSERVADORES_COMPILACAO, [])
+
+    def teste_1_eventos(self):
+        for criterios, etapas, termos, clausulas, contem, erro in TESTES_EVENTOS:
+            with self.subTest(f'Evento: {criterios}'):
+                self.eventos.clear()
+                try:
+                    PesquisaElasticFacil(criterios)
+                    self.assertFalse(erro)
+                except Exception:
+                    self.assertTrue(erro)
+                self.assertEqual(len(self.eventos), 1)
+                evento = self.eventos[0]
+                self.assertEqual(set(evento.etapas), etapas)
+                self.assertEqual(evento.tokens, termos)
+                self.assertEqual(evento.clausulas, clausulas)
+                self.assertEqual(evento.contem_automatico, contem)
+                self.assertEqual(bool(evento.erro), erro)
+                self.assertGreaterEqual(evento.duracao, sum(evento.etapas.values()))
+                self.assertTrue(all(_ >= 0 for _ in evento.etapas.values()))
+        # grupos notificam cada subgrupo
+        self.eventos.clear()
+        GruposPesquisaElasticFacil('.texto.(dano) .tipo.(x)', campos_disponiveis={'texto': '', 'tipo': ''})
+        self.assertEqual([_.e_subgrupo_pesquisa for _ in self.eventos], [True, True])
+        # observador com erro não interrompe a compilação
+        def com_erro(evento):
+            raise Exception('erro no observador')
+        registrar_observador(com_erro)
+        util_pesquisaelastic_facil.PRINT_WARNING, _print = False, util_pesquisaelastic_facil.PRINT_WARNING
+        try:
+            PesquisaElasticFacil('dano moral')
+        finally:
+            remover_observador(com_erro)
+            util_pesquisaelastic_facil.PRINT_WARNING = _print
+
+    def teste_2_clausulas(self):
+        for query, esperado in TESTES_CLAUSULAS:
+            with self.subTest(f'Cláusulas: {query}'):
+                self.assertEqual(contar_clausulas(query), esperado)
+
+    def teste_3_prometheus(self):
+        h = Histograma((1, 5))
+        for valor in (0, 1, 2, 9):
+            h.observar(valor)
+        self.assertEqual(h.linhas('x', 'a="b"'), ['x_bucket{a="b",le="1"} 2', 'x_bucket{a="b",le="5"} 3',
+                                                  'x_bucket{a="b",le="+Inf"} 4', 'x_sum{a="b"} 12', 'x_count{a="b"} 4'])
+        agregador = AgregadorPrometheus()
+        registrar_observador(agregador)
+        try:
+            for criterios, *_ in TESTES_EVENTOS:
+                try:
+                    PesquisaElasticFacil(criterios)
+                except Exception:
+                    pass
+        finally:
+            remover_observador(agregador)
+        texto = agregador.as_prometheus()
+        linhas = texto.split('\n')
+        self.assertIn(f'pesquisaelastic_compilacoes_total {len(TESTES_EVENTOS)}', linhas)
+        self.assertIn('pesquisaelastic_erros_total 1', linhas)
+        self.assertIn('pesquisaelastic_contem_automatico_total 1', linhas)
+        self.assertIn('pesquisaelastic_etapa_segundos_count{etapa="arvore"} 3', linhas)
+        self.assertIn('pesquisaelastic_etapa_segundos_bucket{etapa="classificacao",le="+Inf"} 6', linhas)
+        self.assertIn('pesquisaelastic_termos_count 5', linhas)
+        # servidor local
+        servidor = iniciar_servidor_metricas(agregador, porta=0)
+        try:
+            with urlopen(f'http://127.0.0.1:{servidor.server_address[1]}/metrics') as resposta:
+                self.assertEqual(resposta.read().decode('utf-8'), texto)
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
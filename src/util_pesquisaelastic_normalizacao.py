@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Normalização de textos e tokens igual aos analisadores do elastic (docs/ElasticQueries.md)
+# usada na compilação das pesquisas (PesquisaElasticFacil) e no processamento dos documentos
+# (pesquisa reversa, indexação local, etc) para os tokens do python serem os mesmos do índice
+# - tabelas do str.translate criadas uma vez por caractere (TabelaDobras) com caminho rápido para textos ASCII
+#   - remover_acentos e minusculas_sem_acentos: critérios de pesquisa - letras sem acentos e ligaduras
+#     separadas (asciifolding), os demais caracteres não ASCII são removidos (como o NFKD + encode ASCII)
+#   - dobrar_documento: filtros lowercase e asciifolding nos textos dos documentos - símbolos viram separadores
+#     e letras sem correspondência ASCII são mantidas, pois o tokenizer quebra o texto antes do asciifolding
+# - aplicar_char_filter: char_filter numeros (números com separadores . - / : , viram 10_000_00)
+# - tokens_documento: raw_analyzer (char_filter numeros, tokenizer uax_url_email, lowercase e asciifolding)
+#   com as regras do Unicode (UAX#29) para alfabetos latinos: letras e números seguidos, sublinhado,
+#   apóstrofo/ponto/dois pontos entre letras (d'agua, u.s.a), urls e e-mails inteiros e tokens de até 255 caracteres
+# - lotes: normalizar_tokens e tokens_documentos processam listas em uma única chamada do translate
+# - registrar_saidas_analisador: grava as saídas do _analyze do elastic para os testes de conformidade
+#   (util_pesquisaelastic_normalizacao_analisador.json) - util_pesquisaelastic_normalizacao_casos.json tem os
+#   casos esperados escritos a partir da definição do analisador, não são saídas do cluster
+# O simple_analyzer inclui o filtro de sinônimos, os tokens conferidos são os do raw_analyzer
+# Exemplo:
+#   tokens_documento('R$ 10.000,00 por danos morais d’água') >> ['r', '10_000_00', 'por', 'danos', 'morais', "d'agua"]
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - tabelas de translate, tokens dos documentos e lotes
+# Ver 0.1.1 - 18/10/2026 - expressão dos e-mails sem quantificador possessivo (python < 3.11)
+# Ver 0.1.2 - 18/10/2026 - casos esperados separados das saídas gravadas do _analyze
+
+import re
+import json
+from unicodedata import normalize, category
+
+# char_filter numeros do mapeamento (docs/ElasticQueries.md)
+RE_CHAR_FILTER_NUMEROS = re.compile(r'(\d+)[\.\-\/\:,](?=\d)')
+# tokens: urls e e-mails (uax_url_email) ou palavras com letras, números e sublinhado unidas por
+# apóstrofo, ponto e dois pontos entre letras ou por apóstrofo e ponto e vírgula entre números (UAX#29)
+# textos sem @ e :// usam apenas a expressão das palavras (mais rápida)
+RE_TOKENS_PALAVRAS = re.compile(r"\w+(?:(?:(?<=[^\W\d_])['.:](?=[^\W\d_])|(?<=\d)[';](?=\d))\w+)*")
+RE_TOKENS_DOCUMENTO = re.compile(r"(?:https?|ftp|file)://[^\s<>\"'`{}|\\^]+(?<![.,;:!?)\]])"
+                                 r"|(?<![\w.+\-])[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+"
+                                 r"|" + RE_TOKENS_PALAVRAS.pattern)
+# trechos não ASCII dos documentos (o restante do texto usa apenas o lower())
+RE_NAO_ASCII = re.compile(r'[^\x00-\x7f]+')
+TAMANHO_MAXIMO_TOKEN = 255
+SEPARADOR_LOTE = '\x00'
+
+# dobras do filtro asciifolding que o NFKD não faz (letras)
+DOBRAS_LETRAS = {'Æ': 'AE', 'æ': 'ae', 'Ø': 'O', 'ø': 'o', 'ß': 'ss', 'ẞ': 'SS', 'Œ': 'OE', 'œ': 'oe',
+                 'Đ': 'D', 'đ': 'd', 'Ð': 'D', 'ð': 'd', 'Þ': 'TH', 'þ': 'th', 'Ł': 'L', 'ł': 'l',
+                 'ı': 'i', 'ĸ': 'q', 'Ŀ': 'L', 'ŀ': 'l', 'Ŋ': 'N', 'ŋ': 'n', 'ſ': 's', 'ƒ': 'f',
+                 'Ħ': 'H', 'ħ': 'h', 'Ŧ': 'T', 'ŧ': 't', 'ª': 'a', 'º': 'o'}
+# pontuação dos documentos que participa dos tokens (apóstrofos entre letras)
+DOBRAS_PONTUACAO = {'‘': "'", '’': "'", '‛': "'", 'ʼ': "'"}
+
+# tabela do str.translate preenchida sob demanda: cada caractere é calculado uma única vez
+# minusculas: aplica lower() antes da dobra - documento: regras dos documentos (ver dobrar_documento)
+class TabelaDobras(dict):
+    def __init__(self, minusculas = False, documento = False):
+        super().__init__()
+        self.minusculas = minusculas
+        self.documento = documento
+        # ASCII fica na tabela para o translate não chamar __missing__
+        for i in range(128):
+            self[i] = chr(i).lower() if minusculas else chr(i)
+
+    def __missing__(self, codigo):
+        self[codigo] = res = self.dobrar(chr(codigo))
+        return res
+
+    def dobrar(self, caractere):
+        if self.minusculas:
+            # İ.lower() tem dois caracteres (i + ponto combinante), o lowercase do elastic retorna i
+            caractere = caractere.lower()
+        if self.documento:
+            return ''.join(self.__dobrar_documento__(_) for _ in caractere)
+        return ''.join(DOBRAS_LETRAS.get(_) or normalize('NFKD', _).encode('ASCII', 'ignore').decode('ASCII') for _ in caractere)
+
+    def __dobrar_documento__(self, caractere):
+        if caractere in DOBRAS_LETRAS:
+            return DOBRAS_LETRAS[caractere]
+        if caractere in DOBRAS_PONTUACAO:
+            return DOBRAS_PONTUACAO[caractere]
+        tipo = category(caractere)
+        if tipo[0] == 'M':
+            # acentos combinantes pertencem ao token e são removidos pelo asciifolding
+            return ''
+        if tipo[0] == 'L' or tipo == 'Nd':
+            ascii = normalize('NFKD', caractere).encode('ASCII', 'ignore').decode('ASCII')
+            return ascii if ascii.isalnum() else caractere
+        if tipo == 'Pc':
+            return '_'
+        # símbolos, espaços e pontuação não fazem parte dos tokens
+        return ' '
+
+TABELA_ACENTOS = TabelaDobras()
+TABELA_MINUSCULAS = TabelaDobras(minusculas = True)
+TABELA_DOCUMENTO = TabelaDobras(minusculas = True, documento = True)
+
+###########################################################
+# Critérios de pesquisa
+#----------------------------------------------------------
+def remover_acentos(texto):
+    if texto.isascii():
+        return texto
+    return texto.translate(TABELA_ACENTOS)
+
+def minusculas_sem_acentos(texto):
+    if texto.isascii():
+        return texto.lower()
+    return texto.translate(TABELA_MINUSCULAS)
+
+###########################################################
+# Documentos - filtros do analisador
+#----------------------------------------------------------
+def aplicar_char_filter(texto):
+    return RE_CHAR_FILTER_NUMEROS.sub(r'\1_', texto)
+
+def dobrar_documento(texto):
+    if texto.isascii():
+        return texto.lower()
+    return RE_NAO_ASCII.sub(lambda m: m.group().translate(TABELA_DOCUMENTO), texto.lower())
+
+def _tokens(texto):
+    if '@' in texto or '://' in texto:
+        return _tokens_maximos(RE_TOKENS_DOCUMENTO.findall(texto))
+    return _tokens_maximos(RE_TOKENS_PALAVRAS.findall(texto))
+
+# tokens com mais de 255 caracteres são divididos pelo tokenizer
+def _tokens_maximos(tokens):
+    if all(len(_) <= TAMANHO_MAXIMO_TOKEN for _ in tokens):
+        return tokens
+    res = []
+    for token in tokens:
+        res.extend(token[i:i + TAMANHO_MAXIMO_TOKEN] for i in range(0, len(token), TAMANHO_MAXIMO_TOKEN))
+    return res
+
+# tokens do raw_analyzer na ordem das posições
+def tokens_documento(texto):
+    return _tokens(dobrar_documento(aplicar_char_filter(str(texto))))
+
+###########################################################
+# Lotes - uma chamada do translate e do re para a lista toda
+# os textos com o separador do lote (\x00) são processados um a um
+#----------------------------------------------------------
+def normalizar_tokens(tokens, documento = True):
+    tokens = [str(_) for _ in tokens]
+    dobrar = dobrar_documento if documento else minusculas_sem_acentos
+    texto = SEPARADOR_LOTE.join(tokens)
+    if texto.count(SEPARADOR_LOTE) != len(tokens) - 1 and tokens:
+        return [dobrar(_) for _ in tokens]
+    return dobrar(texto).split(SEPARADOR_LOTE) if tokens else []
+
+def tokens_documentos(textos):
+    textos = [str(_) for _ in textos]
+    texto = SEPARADOR_LOTE.join(textos)
+    if not textos:
+        return []
+    if texto.count(SEPARADOR_LOTE) != len(textos) - 1:
+        return [tokens_documento(_) for _ in textos]
+    # o separador não é token nem une tokens e o char_filter não passa por ele
+    partes = dobrar_documento(aplicar_char_filter(texto)).split(SEPARADOR_LOTE)
+    return [_tokens(_) for _ in partes]
+
+###########################################################
+# Saídas do _analyze do elastic para os testes de conformidade
+# cliente: Elasticsearch (indices.analyze) - index: índice criado com o mapeamento de docs/ElasticQueries.md
+# grava [{'analisador', 'texto', 'tokens'}, ...] no arquivo json
+#----------------------------------------------------------
+def registrar_saidas_analisador(cliente, index, textos, arquivo, analisador = 'raw_analyzer'):
+    res = []
+    for texto in textos:
+        retorno = cliente.indices.analyze(index=index, body={'analyzer': analisador, 'text': texto})
+        res.append({'analisador': analisador, 'texto': texto, 'tokens': [_['token'] for _ in retorno.get('tokens', [])]})
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump(res, f, indent=2, ensure_ascii=False)
+    return res
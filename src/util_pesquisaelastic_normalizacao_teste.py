@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Teste Normalização:
+# - tokens dos documentos iguais aos casos esperados escritos a partir da definição do raw_analyzer
+#   (util_pesquisaelastic_normalizacao_casos.json) e às saídas gravadas do _analyze do elastic
+#   (util_pesquisaelastic_normalizacao_analisador.json, gerado por registrar_saidas_analisador - ignorado se não existir)
+# - acentos dos critérios iguais à normalização anterior (NFKD) e dobras do asciifolding
+# - lotes iguais ao processamento de cada item e números dos critérios com as formas indexadas
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+from unicodedata import normalize
+from util_pesquisaelastic_facil import PesquisaElasticFacil, Operadores
+from util_pesquisaelastic_normalizacao import remover_acentos, minusculas_sem_acentos, dobrar_documento
+from util_pesquisaelastic_normalizacao import tokens_documento, tokens_documentos, normalizar_tokens, TAMANHO_MAXIMO_TOKEN, RE_TOKENS_DOCUMENTO
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_CASOS = os.path.join(PASTA, 'util_pesquisaelastic_normalizacao_casos.json')
+ARQUIVO_ANALISADOR = os.path.join(PASTA, 'util_pesquisaelastic_normalizacao_analisador.json')
+
+# texto, sem acentos
+TESTES_ACENTOS = (
+    ('Ação ÁÉÍÓÚ àèìòù âêîôû ãõ äëïöü ç Ñ', 'Acao AEIOU aeiou aeiou ao aeiou c N'),
+    ('Æsir straße Œuvre Ørsted łódź', 'AEsir strasse OEuvre Orsted lodz'),
+    ('ﬁm ² ½ αβγ', 'fim 2 12 '),
+    ('dano “moral” ‘x’', 'dano moral x'),
+)
+
+# texto, tokens
+TESTES_TOKENS = (
+    ('', []),
+    ('dano\x00moral', ['dano', 'moral']),
+    ('a' * (TAMANHO_MAXIMO_TOKEN + 5), ['a' * TAMANHO_MAXIMO_TOKEN, 'a' * 5]),
+    ('10:30 e 1;2 e a;b e a:1', ['10_30', 'e', '1;2', 'e', 'a', 'b', 'e', 'a', '1']),
+    ('dano_moral é 5º', ['dano_moral', 'e', '5o']),
+    ('-' * 20000 + '@x', ['x']),
+)
+
+# critério numérico, texto do documento
+TESTES_NUMEROS = (
+    ('10.000,00', 'R$ 10.000,00'),
+    ('20/10/2020', 'em 20/10/2020'),
+    ('2020', 'ano de 2020'),
+    ('1.234', 'art. 1.234'),
+)
+
+class Teste(unittest.TestCase):
+
+    def conferir_saidas(self, arquivo):
+        with open(arquivo, encoding='utf-8') as f:
+            saidas = json.load(f)
+        self.assertGreater(len(saidas), 0)
+        for saida in saidas:
+            with self.subTest(f'Tokens: {saida["texto"]}'):
+                self.assertEqual(saida['analisador'], 'raw_analyzer')
+                self.assertEqual(tokens_documento(saida['texto']), saida['tokens'])
+        self.assertEqual(tokens_documentos([_['texto'] for _ in saidas]), [_['tokens'] for _ in saidas])
+
+    def teste_1_casos_esperados(self):
+        self.conferir_saidas(ARQUIVO_CASOS)
+
+    # conformidade com o elastic: saídas gravadas do cluster com registrar_saidas_analisador
+    def teste_1_conformidade_analisador(self):
+        if not os.path.isfile(ARQUIVO_ANALISADOR):
+            self.skipTest('saídas do _analyze não gravadas (registrar_saidas_analisador)')
+        self.conferir_saidas(ARQUIVO_ANALISADOR)
+
+    def teste_2_acentos(self):
+        for texto, esperado in TESTES_ACENTOS:
+            with self.subTest(f'Acentos: {texto}'):
+                self.assertEqual(remover_acentos(texto), esperado)
+                self.assertEqual(minusculas_sem_acentos(texto), esperado.lower())
+                self.assertEqual(Operadores.remover_acentos(texto), esperado)
+        # letras do português iguais à normalização anterior (NFKD + ASCII)
+        letras = 'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ'
+        self.assertEqual(remover_acentos(letras), normalize('NFKD', letras).encode('ASCII', 'ignore').decode('ASCII'))
+        # critérios com as mesmas dobras dos documentos
+        must = PesquisaElasticFacil('straße E ÆSIR').criterios_elastic['query']['bool']['must']
+        self.assertEqual([_['term']['texto'] for _ in must], tokens_documento('Straße Æsir'))
+
+    def teste_3_tokens_lotes(self):
+        for texto, esperado in TESTES_TOKENS:
+            with self.subTest(f'Tokens: {texto[:30]}'):
+                self.assertEqual(tokens_documento(texto), esperado)
+        textos = ['Ação\x00Moral', 'fulano@x.com.br', '', 'R$ 10.000,00', 'Straße ½']
+        self.assertEqual(tokens_documentos(textos), [tokens_documento(_) for _ in textos])
+        self.assertEqual(tokens_documentos(textos[1:]), [tokens_documento(_) for _ in textos[1:]])
+        self.assertEqual(tokens_documentos([]), [])
+        for documento, dobrar in ((True, dobrar_documento), (False, minusculas_sem_acentos)):
+            self.assertEqual(normalizar_tokens(textos, documento), [dobrar(_) for _ in textos])
+            self.assertEqual(normalizar_tokens(textos[1:], documento), [dobrar(_) for _ in textos[1:]])
+        self.assertEqual(normalizar_tokens([]), [])
+
+    def teste_4_numeros(self):
+        for criterio, texto in TESTES_NUMEROS:
+            with self.subTest(f'Números: {criterio}'):
+                query = PesquisaElasticFacil(criterio, numeros_como_termos=True).criterios_elastic['query']
+                formas = query['terms']['texto'] if 'terms' in query else [query['term']['texto']]
+                self.assertIn(tokens_documento(texto)[-1], formas)
+
+    def teste_5_sem_modulo(self):
+        # o componente funciona sozinho com a normalização NFKD
+        codigo = ("import sys; sys.modules['util_pesquisaelastic_normalizacao'] = None; "
+                  "from util_pesquisaelastic_facil import PesquisaElasticFacil; "
+                  "print(PesquisaElasticFacil('Ação E DANO').criterios_elastic['query']['bool']['must'])")
+        saida = subprocess.run([sys.executable, '-c', codigo], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True).stdout
+        self.assertEqual(saida.strip(), "[{'term': {'texto': 'acao'}}, {'term': {'texto': 'dano'}}]")
+        # e-mails longos sem expressões possessivas (python < 3.11)
+        self.assertNotIn('++', RE_TOKENS_DOCUMENTO.pattern)
+        self.assertEqual(tokens_documento('x' * 50000 + '@a'), ['x' * 255] * 196 + ['x' * 20, 'a'])
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Percolator: registro das pesquisas salvas no elastic para alertas com a query percolate
+# - PercoladorPesquisas: converte PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada
+#   ou critérios (str) em documentos do índice percolator
+# - mapeamento: settings e mappings do índice percolator a partir da configuração dos campos
+#   (campo_texto, sufixo_campo_raw, sufixo_campo_reverso e campos_disponiveis) com os analisadores
+#   de docs/ElasticQueries.md - o índice percolator precisa analisar o documento como o índice dos documentos
+# - linhas_bulk/lotes_bulk/escrever_bulk: NDJSON do _bulk gerado pesquisa a pesquisa (sem carregar tudo em memória)
+# - clausulas_lentas: cláusulas que o percolator não consegue pré-selecionar pelos termos extraídos
+#   (curingas no início do termo e regexp) e são conferidas com todos os documentos
+# Pesquisas com erro de compilação ficam em erros e as com cláusulas lentas em lentas, para serem corrigidas primeiro
+# Exemplo:
+#   percolador = PercoladorPesquisas(campos_disponiveis={'texto':'.raw', 'tipo':''}, tipos_campos={'tipo':'keyword'})
+#   es.indices.create(index='alertas', body=percolador.mapeamento())
+#   percolador.escrever_bulk({'dano_moral': 'dano adj2 moral'}, 'alertas', 'alertas.ndjson')
+#   print(percolador.resumo(), percolador.lentas)
+#   es.search(index='alertas', body=percolador.query_percolate({'texto': 'o dano moral foi...'}))
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - documentos, mapeamento, bulk NDJSON e cláusulas lentas
+
+import json
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada
+from util_pesquisaelastic_custo import CONSULTAS_MULTI_TERMOS, _valor_multi_termos
+
+# analisadores do índice de exemplo (docs/ElasticQueries.md) sem o filtro de sinônimos,
+# informe analise com os mesmos filtros do índice dos documentos se for o caso
+ANALISE_PERCOLADOR = {
+    'analyzer': {
+        'simple_analyzer': {'tokenizer': 'uax_url_email', 'char_filter': ['numeros'], 'filter': ['lowercase', 'asciifolding']},
+        'raw_analyzer': {'tokenizer': 'uax_url_email', 'char_filter': ['numeros'], 'filter': ['lowercase', 'asciifolding']},
+        'reverse_analyzer': {'tokenizer': 'uax_url_email', 'char_filter': ['numeros'], 'filter': ['lowercase', 'asciifolding', 'reverse']},
+    },
+    'char_filter': {
+        'numeros': {'type': 'pattern_replace', 'pattern': '(\\d+)[\\.\\-\\/\\:,](?=\\d)', 'replacement': '$1_'}
+    }
+}
+
+MSG_CURINGA_INICIAL = 'curinga no início do termo, use sufixo_campo_reverso ou remova o curinga inicial'
+MSG_REGEXP = 'regexp, use numeros_como_termos para números sem curingas ou reduza os curingas'
+ERRO_PESQUISA_PERCOLADOR = 'PercoladorPesquisas: tipo de pesquisa não suportado: {}'
+ERRO_PESQUISA_INTELIGENTE = 'PercoladorPesquisas: pesquisa inteligente (more_like_this) depende das estatísticas do índice de documentos: {}'
+
+###########################################################
+# Cláusulas que o percolator não pré-seleciona pelos termos
+# retorna [{'tipo', 'campo', 'valor', 'motivo'}, ...]
+#----------------------------------------------------------
+def clausulas_lentas(query, res = None):
+    res = [] if res is None else res
+    if isinstance(query, dict):
+        for tipo, corpo in query.items():
+            if tipo in CONSULTAS_MULTI_TERMOS and isinstance(corpo, dict) and len(corpo) == 1:
+                campo = list(corpo)[0]
+                valor = _valor_multi_termos(corpo)
+                if tipo == 'regexp':
+                    res.append({'tipo': tipo, 'campo': campo, 'valor': valor, 'motivo': MSG_REGEXP})
+                elif tipo == 'wildcard' and valor[:1] in ('*', '?'):
+                    res.append({'tipo': tipo, 'campo': campo, 'valor': valor, 'motivo': MSG_CURINGA_INICIAL})
+            else:
+                clausulas_lentas(corpo, res)
+    elif isinstance(query, (list, tuple)):
+        for _ in query:
+            clausulas_lentas(_, res)
+    return res
+
+# campos usados na query (com subcampos) - {"campo": ...} das cláusulas de termos e intervalos
+def campos_percolador(query, res = None):
+    res = set() if res is None else res
+    if isinstance(query, dict):
+        for tipo, corpo in query.items():
+            if tipo in ('term', 'terms', 'span_term', 'wildcard', 'regexp', 'prefix', 'range') and isinstance(corpo, dict) and len(corpo) == 1:
+                res.add(list(corpo)[0])
+            elif tipo == 'field_masking_span' and isinstance(corpo, dict):
+                res.add(corpo.get('field'))
+                campos_percolador(corpo.get('query'), res)
+            elif tipo == 'more_like_this' and isinstance(corpo, dict):
+                res.update(corpo.get('fields', []))
+            else:
+                campos_percolador(corpo, res)
+    elif isinstance(query, (list, tuple)):
+        for _ in query:
+            campos_percolador(_, res)
+    return res
+
+# a query contém a consulta do tipo informado
+def contem_consulta(query, tipo):
+    if isinstance(query, dict):
+        return any(_ == tipo or contem_consulta(corpo, tipo) for _, corpo in query.items())
+    if isinstance(query, (list, tuple)):
+        return any(contem_consulta(_, tipo) for _ in query)
+    return False
+
+# subcampo sem o ponto inicial: '.raw' >> 'raw'
+def _subcampo(sufixo):
+    return str(sufixo or '').lstrip('.')
+
+###########################################################
+# Configuração dos campos, mapeamento e documentos do percolator
+# campos_disponiveis: {'campo': 'sufixo_raw'} como em GruposPesquisaElasticFacil - critérios (str)
+#                     são compilados com GruposPesquisaElasticFacil se informado
+# tipos_campos: {'campo': 'keyword'} ou {'campo': {...mapeamento...}} para campos que não são texto
+# campo_query: nome do campo percolator no índice
+# analise: settings.analysis do índice (padrão ANALISE_PERCOLADOR)
+#----------------------------------------------------------
+class PercoladorPesquisas():
+    def __init__(self, campo_texto = 'texto', sufixo_campo_raw = '.raw', campos_disponiveis = None, sufixo_campo_reverso = None,
+                 tipos_campos = None, campo_query = 'query', numeros_como_termos = False, analise = None):
+        self.campo_texto = campo_texto
+        self.sufixo_campo_raw = sufixo_campo_raw
+        self.campos_disponiveis = dict(campos_disponiveis or {})
+        self.sufixo_campo_reverso = sufixo_campo_reverso
+        self.tipos_campos = dict(tipos_campos or {})
+        self.campo_query = campo_query
+        self.numeros_como_termos = numeros_como_termos
+        self.analise = analise or ANALISE_PERCOLADOR
+        self.documentos = 0
+        self.erros = {}
+        self.lentas = {}
+
+    # campo texto com os subcampos raw e reverse
+    def __mapeamento_texto__(self, sufixo_raw, reverso = False):
+        res = {'type': 'text', 'analyzer': 'simple_analyzer'}
+        campos = {}
+        if _subcampo(sufixo_raw):
+            campos[_subcampo(sufixo_raw)] = {'type': 'text', 'analyzer': 'raw_analyzer'}
+        if reverso and _subcampo(self.sufixo_campo_reverso):
+            campos[_subcampo(self.sufixo_campo_reverso)] = {'type': 'text', 'analyzer': 'reverse_analyzer'}
+        if campos:
+            res['fields'] = campos
+        return res
+
+    def mapeamento(self):
+        propriedades = {self.campo_query: {'type': 'percolator'}}
+        propriedades[self.campo_texto] = self.__mapeamento_texto__(self.sufixo_campo_raw, reverso = True)
+        for campo, sufixo in self.campos_disponiveis.items():
+            if campo == self.campo_texto:
+                propriedades[campo] = self.__mapeamento_texto__(sufixo, reverso = True)
+            elif campo not in self.tipos_campos:
+                propriedades[campo] = self.__mapeamento_texto__(sufixo)
+        for campo, tipo in self.tipos_campos.items():
+            propriedades[campo] = dict(tipo) if isinstance(tipo, dict) else {'type': str(tipo)}
+        return {'settings': {'analysis': self.analise}, 'mappings': {'properties': propriedades}}
+
+    # campos da query que não estão no mapeamento (o elastic recusa o registro da pesquisa)
+    def campos_nao_mapeados(self, query):
+        propriedades = self.mapeamento()['mappings']['properties']
+        res = set()
+        for campo in campos_percolador(query):
+            base, _, sub = str(campo).partition('.')
+            if base not in propriedades or (sub and sub not in propriedades[base].get('fields', {})):
+                res.add(campo)
+        return sorted(res)
+
+    # query de uma pesquisa: PesquisaElasticFacil, GruposPesquisaElasticFacil, PesquisaCompilada,
+    # dict com ou sem a chave query ou critérios (str)
+    def query(self, pesquisa):
+        if isinstance(pesquisa, str):
+            if any(self.campos_disponiveis):
+                pesquisa = GruposPesquisaElasticFacil(pesquisa, campo_texto_padrao=self.campo_texto, sufixo_campo_raw=self.sufixo_campo_raw,
+                                                      campos_disponiveis=self.campos_disponiveis, sufixo_campo_reverso=self.sufixo_campo_reverso,
+                                                      numeros_como_termos=self.numeros_como_termos)
+            else:
+                pesquisa = PesquisaElasticFacil(pesquisa, campo_texto=self.campo_texto, sufixo_campo_raw=self.sufixo_campo_raw,
+                                                sufixo_campo_reverso=self.sufixo_campo_reverso, numeros_como_termos=self.numeros_como_termos)
+        if isinstance(pesquisa, (PesquisaElasticFacil, PesquisaCompilada)):
+            query = pesquisa.criterios_elastic
+        elif isinstance(pesquisa, GruposPesquisaElasticFacil):
+            query = pesquisa.as_query()
+        elif isinstance(pesquisa, dict):
+            query = pesquisa
+        else:
+            raise TypeError(ERRO_PESQUISA_PERCOLADOR.format(type(pesquisa).__name__))
+        query = json.loads(json.dumps(query.get('query', query)))
+        # o percolator confere cada documento em um índice em memória só com ele
+        if contem_consulta(query, 'more_like_this'):
+            raise ValueError(ERRO_PESQUISA_INTELIGENTE.format(json.dumps(query, ensure_ascii=False)))
+        return query
+
+    # documento do índice percolator com a query e os metadados (dono, nome, data...)
+    def documento(self, pesquisa, metadados = None):
+        res = dict(metadados or {})
+        res[self.campo_query] = self.query(pesquisa)
+        return res
+
+    # pesquisas: dict {id: pesquisa} ou (id, pesquisa) ou (id, pesquisa, metadados)
+    # retorna (id, documento) das pesquisas válidas e registra erros, lentas e documentos
+    def documentos_pesquisas(self, pesquisas):
+        for item in (pesquisas.items() if isinstance(pesquisas, dict) else pesquisas):
+            id_pesquisa, pesquisa = item[0], item[1]
+            metadados = item[2] if len(item) > 2 else None
+            try:
+                documento = self.documento(pesquisa, metadados)
+            except Exception as e:
+                self.erros[id_pesquisa] = str(e)
+                continue
+            lentas = clausulas_lentas(documento[self.campo_query])
+            if lentas:
+                self.lentas[id_pesquisa] = lentas
+            self.documentos += 1
+            yield id_pesquisa, documento
+
+    # linhas NDJSON do _bulk (ação index e documento) - cada linha termina com \n
+    def linhas_bulk(self, pesquisas, index):
+        for id_pesquisa, documento in self.documentos_pesquisas(pesquisas):
+            yield json.dumps({'index': {'_index': index, '_id': str(id_pesquisa)}}, ensure_ascii=False) + '\n'
+            yield json.dumps(documento, ensure_ascii=False) + '\n'
+
+    # corpos do _bulk com até tamanho_lote pesquisas cada - es.bulk(body=lote)
+    def lotes_bulk(self, pesquisas, index, tamanho_lote = 500):
+        lote = []
+        for linha in self.linhas_bulk(pesquisas, index):
+            lote.append(linha)
+            if len(lote) >= tamanho_lote * 2:
+                yield ''.join(lote)
+                lote = []
+        if lote:
+            yield ''.join(lote)
+
+    # grava o NDJSON do _bulk - saida: nome do arquivo ou objeto com write
+    # retorna a quantidade de pesquisas gravadas
+    def escrever_bulk(self, pesquisas, index, saida):
+        if isinstance(saida, str):
+            with open(saida, 'w', encoding='utf-8') as f:
+                return self.escrever_bulk(pesquisas, index, f)
+        inicio = self.documentos
+        for linha in self.linhas_bulk(pesquisas, index):
+            saida.write(linha)
+        return self.documentos - inicio
+
+    # pesquisa das pesquisas salvas encontradas nos documentos ({campo: texto} ou lista deles)
+    def query_percolate(self, documentos):
+        if isinstance(documentos, dict):
+            return {'query': {'percolate': {'field': self.campo_query, 'document': documentos}}}
+        return {'query': {'percolate': {'field': self.campo_query, 'documents': list(documentos)}}}
+
+    def resumo(self):
+        return {'documentos': self.documentos, 'erros': len(self.erros), 'lentas': len(self.lentas)}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Teste Percolator:
+# - mapeamento do índice percolator a partir da configuração dos campos
+# - documentos das pesquisas, campos mapeados e cláusulas lentas
+# - NDJSON do _bulk gerado pesquisa a pesquisa, lotes e erros
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import io
+import json
+import unittest
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_percolador import PercoladorPesquisas, clausulas_lentas
+
+CAMPOS = {'texto': '.raw', 'tipo': '', 'data': '', 'titulo': ''}
+TIPOS = {'tipo': 'keyword', 'data': {'type': 'date', 'format': 'yyyy-MM-dd'}}
+
+# critérios, tipos das cláusulas lentas
+TESTES_LENTAS = (
+    ('dano adj2 moral', []),
+    ('*ano E moral', ['wildcard']),
+    ('$ano prox3 moral', ['wildcard']),
+    ('mora* E 12345', ['regexp']),
+    (':dano E ?ano E estetic?', ['regexp', 'regexp']),
+)
+
+# pesquisas, documentos gravados, erros, lentas
+PESQUISAS_BULK = {'adj': 'dano adj2 moral',
+                  'aspas': '"dano moral" E .tipo.(x) E .data.(>=2020-01-01)',
+                  'titulo': '.titulo.(acordao) E *ano',
+                  'erro': '(dano moral',
+                  'campo': '.autor.(x)',
+                  'contem': 'contém: dano moral',
+                  'pesquisa': PesquisaElasticFacil('12345 E moral'),
+                  'grupos': GruposPesquisaElasticFacil('dano .tipo.(y)', campos_disponiveis=CAMPOS),
+                  'compilada': CacheQueriesElastic().get_pesquisa('dano E mora*'),
+                  'query': {'query': {'term': {'tipo': 'z'}}}}
+
+class Teste(unittest.TestCase):
+
+    def teste_1_mapeamento(self):
+        percolador = PercoladorPesquisas(campos_disponiveis=CAMPOS, tipos_campos=TIPOS, sufixo_campo_reverso='.reverse')
+        mapeamento = percolador.mapeamento()
+        propriedades = mapeamento['mappings']['properties']
+        self.assertEqual(propriedades['query'], {'type': 'percolator'})
+        self.assertEqual(set(propriedades['texto']['fields']), {'raw', 'reverse'})
+        self.assertEqual(propriedades['texto']['fields']['reverse']['analyzer'], 'reverse_analyzer')
+        self.assertEqual(propriedades['tipo'], {'type': 'keyword'})
+        self.assertEqual(propriedades['data'], TIPOS['data'])
+        self.assertEqual(propriedades['titulo'], {'type': 'text', 'analyzer': 'simple_analyzer'})
+        analisadores = set(mapeamento['settings']['analysis']['analyzer'])
+        for campo in propriedades.values():
+            for _ in [campo] + list(campo.get('fields', {}).values()):
+                self.assertTrue(_.get('analyzer', 'simple_analyzer') in analisadores)
+        # sem campos disponíveis e sem reverso
+        propriedades = PercoladorPesquisas(campo_texto='conteudo', sufixo_campo_raw='', campo_query='pesquisa').mapeamento()['mappings']['properties']
+        self.assertEqual(propriedades, {'pesquisa': {'type': 'percolator'}, 'conteudo': {'type': 'text', 'analyzer': 'simple_analyzer'}})
+        # campos usados nas queries que não estão no mapeamento
+        self.assertEqual(percolador.campos_nao_mapeados(percolador.query('"dano moral" E $ano E .data.(>=2020-01-01)')), [])
+        self.assertEqual(percolador.campos_nao_mapeados({'term': {'autor': 'x'}, 'prefix': {'texto.stemmed': 'x'}}), ['autor', 'texto.stemmed'])
+
+    def teste_2_lentas(self):
+        for criterios, esperado in TESTES_LENTAS:
+            with self.subTest(f'Lentas: {criterios}'):
+                query = PesquisaElasticFacil(criterios).criterios_elastic
+                self.assertEqual([_['tipo'] for _ in clausulas_lentas(query)], esperado)
+        # com o subcampo reverso e números como termos as cláusulas não são lentas
+        percolador = PercoladorPesquisas(sufixo_campo_reverso='.reverse', numeros_como_termos=True)
+        for criterios in ('*ano E moral', '$ano prox3 moral', 'moral E 12345'):
+            with self.subTest(f'Sem lentas: {criterios}'):
+                self.assertEqual(clausulas_lentas(percolador.query(criterios)), [])
+
+    def teste_3_bulk(self):
+        percolador = PercoladorPesquisas(campos_disponiveis=CAMPOS, tipos_campos=TIPOS)
+        saida = io.StringIO()
+        self.assertEqual(percolador.escrever_bulk(PESQUISAS_BULK, 'alertas', saida), 7)
+        linhas = [json.loads(_) for _ in saida.getvalue().splitlines()]
+        self.assertEqual(len(linhas), 14)
+        acoes, documentos = linhas[::2], linhas[1::2]
+        self.assertEqual([_['index']['_id'] for _ in acoes], ['adj', 'aspas', 'titulo', 'pesquisa', 'grupos', 'compilada', 'query'])
+        self.assertTrue(all(_['index']['_index'] == 'alertas' for _ in acoes))
+        for documento in documentos:
+            self.assertEqual(list(documento), ['query'])
+            self.assertEqual(percolador.campos_nao_mapeados(documento['query']), [])
+        self.assertEqual(documentos[-1], {'query': {'term': {'tipo': 'z'}}})
+        self.assertEqual(set(percolador.erros), {'erro', 'campo', 'contem'})
+        self.assertEqual(set(percolador.lentas), {'titulo', 'pesquisa'})
+        self.assertEqual(percolador.resumo(), {'documentos': 7, 'erros': 3, 'lentas': 2})
+        # lotes do _bulk com metadados e gerador de pesquisas
+        percolador = PercoladorPesquisas()
+        pesquisas = ((f'p{i}', 'dano adj2 moral', {'dono': 'x'}) for i in range(5))
+        lotes = list(percolador.lotes_bulk(pesquisas, 'alertas', tamanho_lote=2))
+        self.assertEqual([_.count('\n') for _ in lotes], [4, 4, 2])
+        self.assertEqual(json.loads(lotes[-1].splitlines()[1])['dono'], 'x')
+        self.assertEqual(percolador.query_percolate({'texto': 'dano'}), {'query': {'percolate': {'field': 'query', 'document': {'texto': 'dano'}}}})
+        self.assertEqual(percolador.query_percolate([{'texto': 'a'}])['query']['percolate']['documents'], [{'texto': 'a'}])
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+# Pesquisa reversa: identifica as pesquisas salvas encontradas em cada documento
+# sem enviar os documentos ao elastic
+# - PesquisaReversa: compila os criterios_listas de muitas pesquisas (PesquisaElasticFacil)
+#   em uma estrutura compartilhada:
+#   - índice invertido com os termos obrigatórios de cada pesquisa para selecionar as candidatas
+#     (termos exatos e o início literal dos termos com curingas)
+#   - conferência das candidatas com as posições dos termos (ADJn/PROXn), curingas e regex
+# - os documentos são normalizados como no analisador do elastic (docs/ElasticQueries.md):
+#   tokens do raw_analyzer com util_pesquisaelastic_normalizacao.tokens_documento
+# - processar: conferência de um fluxo de documentos com pool de processos opcional e documentos por segundo
+# Pesquisas inteligentes (CONTÉM:, ADJn: e PROXn:) não têm criterios_listas e não são incluídas (ver nao_suportadas)
+# Exemplo:
+#   reversa = PesquisaReversa({'dano_moral': 'dano adj2 moral', 'estetico': 'dano prox5 estetic?'})
+#   for id_doc, pesquisas in reversa.processar([('doc1', 'o dano moral foi...')], workers=4):
+#       print(id_doc, pesquisas)
+#   print(reversa.resumo())
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - índice invertido e conferência com posições
+# Ver 0.1.1 - 18/10/2026 - tokens dos documentos com a normalização compartilhada (util_pesquisaelastic_normalizacao)
+
+import re
+from bisect import bisect_left, bisect_right
+from multiprocessing import Pool
+from time import perf_counter
+from util_pesquisaelastic_facil import PesquisaElasticFacil, Operadores
+from util_pesquisaelastic_normalizacao import tokens_documento
+# quantidade de caracteres do início literal dos termos com curingas no índice invertido
+TAMANHO_PREFIXO = 3
+
+# tokens do documento na ordem das posições
+def normalizar_documento(texto):
+    return tokens_documento(texto)
+
+###########################################################
+# Documento preparado para a conferência: posições de cada token
+# e chaves do índice invertido (termos e inícios dos termos)
+#----------------------------------------------------------
+class DocumentoReverso():
+    __slots__ = ('tokens', 'posicoes', 'chaves', '__ordenados__', '__padroes__')
+
+    def __init__(self, texto):
+        self.tokens = normalizar_documento(texto) if isinstance(texto, str) else list(texto)
+        self.posicoes = {}
+        for i, token in enumerate(self.tokens):
+            self.posicoes.setdefault(token, []).append(i)
+        self.chaves = set()
+        for token in self.posicoes:
+            self.chaves.add(('t', token))
+            for i in range(1, min(len(token), TAMANHO_PREFIXO) + 1):
+                self.chaves.add(('p', token[:i]))
+        self.__ordenados__ = None
+        self.__padroes__ = {}
+
+    # posições dos tokens que atendem o termo (exato ou padrão)
+    # o padrão é conferido apenas nos tokens com o início literal do termo
+    def posicoes_termo(self, termo):
+        exato, padrao, prefixo = termo
+        if padrao is None:
+            return self.posicoes.get(exato, ())
+        res = self.__padroes__.get(padrao)
+        if res is None:
+            if self.__ordenados__ is None:
+                self.__ordenados__ = sorted(self.posicoes)
+            tokens = self.__ordenados__
+            if prefixo:
+                tokens = tokens[bisect_left(tokens, prefixo): bisect_left(tokens, prefixo + '\uffff')]
+            res = sorted(p for token in tokens if padrao.fullmatch(token) for p in self.posicoes[token])
+            self.__padroes__[padrao] = res
+        return res
+
+###########################################################
+# Compilação dos critérios (mesmas regras de NoGrupo.as_query)
+# nós: ('termo', termo), ('bool', must, must_not, should), ('span', termos, slop, em_ordem)
+# termo: (valor exato, padrão dos curingas/regex ou None, início literal do padrão)
+#----------------------------------------------------------
+def _termo(token):
+    tipo = Operadores.tipo_token(token)
+    valor = tipo.get_valor()
+    if tipo.regex:
+        return (valor, re.compile(valor), _prefixo_regex(valor))
+    if tipo.curinga:
+        padrao = re.compile('.*'.join(re.escape(_) for _ in valor.split('*')))
+        return (valor, padrao, valor.split('*')[0])
+    return (valor, None, '')
+
+# início literal do regex (sem os caracteres seguidos de quantificadores)
+def _prefixo_regex(valor):
+    res = ''
+    for i, c in enumerate(valor):
+        if not (c.isalnum() or c == '_') or valor[i+1:i+2] in ('?', '*', '{', '+'):
+            break
+        res += c
+    return res
+
+def _chave_termo(termo):
+    exato, padrao, prefixo = termo
+    if padrao is None:
+        return frozenset((('t', exato),))
+    return frozenset((('p', prefixo[:TAMANHO_PREFIXO]),)) if prefixo else None
+
+def compilar_listas(grupo):
+    if type(grupo) is not list:
+        return compilar_listas([grupo])
+    must, must_not, should, span = [], [], [], []
+    operador_grupo, n_grupo = Operadores.operador_n_do_grupo(grupo)
+    e_slop = Operadores.e_operador_slop(operador_grupo)
+    e_ou = Operadores.e_operador_ou(operador_grupo)
+    e_e = Operadores.e_operador_e(operador_grupo)
+    operador_nao = False
+    for token in grupo:
+        if type(token) is str and Operadores.e_operador_nao(token):
+            operador_nao = True
+            continue
+        if type(token) is list:
+            no = compilar_listas(token)
+            (must_not if operador_nao else should if e_ou else must).append(no)
+        elif Operadores.e_operador(token):
+            continue
+        else:
+            no = ('termo', _termo(token))
+            if operador_nao:
+                must_not.append(no)
+            elif e_slop:
+                span.append(no)
+            elif e_ou:
+                should.append(no)
+            elif e_e:
+                must.append(no)
+        operador_nao = False
+    # como em as_bool_must: o span_near substitui o grupo e um único must é o próprio critério
+    if any(span):
+        return ('span', tuple(_[1] for _ in span), max(0, n_grupo - 1), bool(Operadores.e_operador_adj(operador_grupo)))
+    if len(must) == 1 and not must_not and not should:
+        return must[0]
+    return ('bool', tuple(must), tuple(must_not), tuple(should))
+
+# chaves do índice invertido que precisam estar no documento (pelo menos uma delas)
+# None se não for possível selecionar pelo índice
+def chaves_obrigatorias(no):
+    if no[0] == 'termo':
+        return _chave_termo(no[1])
+    if no[0] == 'span':
+        opcoes = [_chave_termo(_) for _ in no[1]]
+    else:
+        _, must, must_not, should = no
+        opcoes = [chaves_obrigatorias(_) for _ in must]
+        if not must and should:
+            # pelo menos um should precisa ser encontrado
+            _should = [chaves_obrigatorias(_) for _ in should]
+            opcoes = [] if any(_ is None for _ in _should) else [frozenset().union(*_should)]
+    opcoes = [_ for _ in opcoes if _ is not None]
+    return min(opcoes, key=len) if opcoes else None
+
+def avaliar_no(no, documento):
+    tipo = no[0]
+    if tipo == 'termo':
+        return bool(documento.posicoes_termo(no[1]))
+    if tipo == 'span':
+        return conferir_proximidade([documento.posicoes_termo(_) for _ in no[1]], no[2], no[3])
+    _, must, must_not, should = no
+    if not all(avaliar_no(_, documento) for _ in must):
+        return False
+    if any(avaliar_no(_, documento) for _ in must_not):
+        return False
+    if should and not must:
+        return any(avaliar_no(_, documento) for _ in should)
+    return True
+
+# termos (posições ordenadas de cada termo) a até slop posições entre eles
+# em ordem: soma das distâncias entre termos seguidos; sem ordem: largura - quantidade de termos
+def conferir_proximidade(posicoes, slop, em_ordem):
+    if not all(posicoes):
+        return False
+    if len(posicoes) == 1:
+        return True
+    if em_ordem:
+        for inicio in posicoes[0]:
+            atual = inicio
+            for _posicoes in posicoes[1:]:
+                i = bisect_right(_posicoes, atual)
+                if i == len(_posicoes):
+                    return False
+                atual = _posicoes[i]
+            if atual - inicio - (len(posicoes) - 1) <= slop:
+                return True
+        return False
+    largura = slop + len(posicoes)
+    for inicio in sorted(set(p for _posicoes in posicoes for p in _posicoes)):
+        janela = [_posicoes[bisect_left(_posicoes, inicio): bisect_left(_posicoes, inicio + largura)] for _posicoes in posicoes]
+        if all(janela) and _posicoes_distintas(janela):
+            return True
+    return False
+
+# uma posição diferente para cada termo (emparelhamento com caminhos aumentantes)
+def _posicoes_distintas(janela):
+    dono = {}
+    def _alocar(i, vistos):
+        for p in janela[i]:
+            if p in vistos:
+                continue
+            vistos.add(p)
+            if p not in dono or _alocar(dono[p], vistos):
+                dono[p] = i
+                return True
+        return False
+    return all(_alocar(i, set()) for i in range(len(janela)))
+
+###########################################################
+# Conjunto de pesquisas salvas conferidas em cada documento
+# pesquisas: dict {id: critérios ou PesquisaElasticFacil} ou iterável de (id, pesquisa)
+#----------------------------------------------------------
+class PesquisaReversa():
+    def __init__(self, pesquisas = None):
+        self.pesquisas = {}         # id: nó compilado
+        self.indice = {}            # chave: [ids]
+        self.sempre_candidatas = [] # pesquisas sem termos obrigatórios indexáveis
+        self.nao_suportadas = {}    # id: motivo
+        self.documentos = 0
+        self.candidatas = 0
+        self.encontradas = 0
+        self.segundos = 0.0
+        if pesquisas:
+            for id_pesquisa, pesquisa in (pesquisas.items() if isinstance(pesquisas, dict) else pesquisas):
+                self.adicionar(id_pesquisa, pesquisa)
+
+    def adicionar(self, id_pesquisa, pesquisa):
+        if isinstance(pesquisa, str):
+            try:
+                pesquisa = PesquisaElasticFacil(pesquisa)
+            except Exception as e:
+                self.nao_suportadas[id_pesquisa] = str(e)
+                return False
+        if pesquisa.pesquisa_inteligente or not pesquisa.criterios_listas:
+            self.nao_suportadas[id_pesquisa] = f'pesquisa sem critérios em listas: {pesquisa.criterios_reformatado}'
+            return False
+        if id_pesquisa in self.pesquisas:
+            raise KeyError(f'PesquisaReversa: a pesquisa {id_pesquisa} já foi incluída')
+        no = compilar_listas(pesquisa.criterios_listas)
+        self.pesquisas[id_pesquisa] = no
+        chaves = chaves_obrigatorias(no)
+        if chaves is None:
+            self.sempre_candidatas.append(id_pesquisa)
+        else:
+            for chave in chaves:
+                self.indice.setdefault(chave, []).append(id_pesquisa)
+        return True
+
+    # pesquisas candidatas pelo índice invertido (na ordem de inclusão)
+    def candidatas_documento(self, documento):
+        res = set(self.sempre_candidatas)
+        for chave in documento.chaves:
+            ids = self.indice.get(chave)
+            if ids:
+                res.update(ids)
+        return res
+
+    # ids das pesquisas encontradas no texto (ou tokens) do documento e a quantidade de candidatas
+    def conferir(self, texto):
+        documento = texto if isinstance(texto, DocumentoReverso) else DocumentoReverso(texto)
+        candidatas = self.candidatas_documento(documento)
+        res = [_ for _ in self.pesquisas if _ in candidatas and avaliar_no(self.pesquisas[_], documento)]
+        return res, len(candidatas)
+
+    def pesquisas_do_documento(self, texto):
+        return self.conferir(texto)[0]
+
+    # documentos: iterável de (id, texto) ou de textos (o id é a posição)
+    # retorna (id, [pesquisas encontradas]) na ordem dos documentos
+    def processar(self, documentos, workers = 1, chunksize = 64):
+        documentos = (_ if isinstance(_, tuple) else (i, _) for i, _ in enumerate(documentos))
+        inicio = perf_counter()
+        segundos = self.segundos
+        if not workers or workers <= 1:
+            retornos = map(self.__conferir_item__, documentos)
+            yield from self.__contabilizar__(retornos, inicio, segundos)
+            return
+        with Pool(processes=workers, initializer=_iniciar_worker, initargs=(self,)) as pool:
+            retornos = pool.imap(_conferir_worker, documentos, chunksize=max(1, int(chunksize)))
+            yield from self.__contabilizar__(retornos, inicio, segundos)
+
+    def __conferir_item__(self, item):
+        return (item[0],) + self.conferir(item[1])
+
+    def __contabilizar__(self, retornos, inicio, segundos):
+        for id_doc, encontradas, candidatas in retornos:
+            self.documentos += 1
+            self.candidatas += candidatas
+            self.encontradas += len(encontradas)
+            self.segundos = segundos + perf_counter() - inicio
+            yield id_doc, encontradas
+
+    def resumo(self):
+        return {'pesquisas': len(self.pesquisas), 'nao_suportadas': len(self.nao_suportadas),
+                'documentos': self.documentos, 'segundos': self.segundos,
+                'documentos_segundo': self.documentos / self.segundos if self.segundos else 0.0,
+                'candidatas_documento': self.candidatas / self.documentos if self.documentos else 0.0,
+                'encontradas_documento': self.encontradas / self.documentos if self.documentos else 0.0}
+
+# pesquisa reversa de cada processo do pool
+_PESQUISA_REVERSA = None
+
+def _iniciar_worker(reversa):
+    global _PESQUISA_REVERSA
+    _PESQUISA_REVERSA = reversa
+
+def _conferir_worker(item):
+    return (item[0],) + _PESQUISA_REVERSA.conferir(item[1])
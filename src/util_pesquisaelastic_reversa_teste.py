@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Teste Pesquisa reversa:
+# - normalização dos documentos e conferência das proximidades
+# - pesquisas encontradas em cada documento iguais ao avaliador local das queries do elastic
+# - índice invertido, fluxo de documentos com pool de processos e resumo
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import random
+import unittest
+from util_pesquisaelastic_facil import PesquisaElasticFacil
+from util_pesquisaelastic_canonico import avaliar_query
+from util_pesquisaelastic_canonico_teste import criterios_aleatorios
+from util_pesquisaelastic_reversa import PesquisaReversa, normalizar_documento, conferir_proximidade
+
+# texto, tokens
+TESTES_NORMALIZAR = (
+    ('O Dano MORAL é devido', ['o', 'dano', 'moral', 'e', 'devido']),
+    ('R$ 10.000,00 em 20/10/2020', ['r', '10_000_00', 'em', '20_10_2020']),
+    ('art. 5º, inciso X', ['art', '5o', 'inciso', 'x']),
+)
+
+# posições de cada termo, slop, em ordem, encontrado
+TESTES_PROXIMIDADE = (
+    ([[1], [2]], 0, True, True),
+    ([[2], [1]], 0, True, False),
+    ([[2], [1]], 0, False, True),
+    ([[1], [4]], 1, True, False),
+    ([[1], [4]], 2, True, True),
+    ([[1, 8], [3, 9], [10]], 0, True, True),
+    ([[5], [5]], 0, False, False), # o mesmo token não atende dois termos
+    ([[5], [5, 6]], 0, False, True),
+    ([[1], []], 10, True, False),
+)
+
+# pesquisa, texto, encontrada
+TESTES_PESQUISAS = {
+    'adj': ('dano adj2 moral', 'o dano foi moral', True),
+    'adj_ordem': ('dano adj2 moral', 'o moral dano', False),
+    'prox': ('dano prox3 estetic?', 'a estetica do dano', True),
+    'aspas': ('"dano moral" nao material', 'dano moral e material', False),
+    'numero': ('10.000,00 adj2 reais', 'R$ 10.000,00 reais', True),
+    'numero_milhar': ('10000', 'valor de 10.000', True),
+    'curinga_inicio': ('$oral e dano*', 'danos morais', False),
+    'curinga': ('mora* ou estetic?', 'danos morais', True),
+    'ou_nao': ('(dano ou lucro) nao cessante', 'lucros cessantes', False),
+}
+
+VOCABULARIO_DOCUMENTOS = ('dano', 'danos', 'moral', 'morais', 'material', 'estetico', 'estetica', 'a', 'b', 'c', 'x', '10_000', '2020', '2_020')
+
+class Teste(unittest.TestCase):
+
+    def teste_1_normalizar(self):
+        for texto, tokens in TESTES_NORMALIZAR:
+            with self.subTest(f'Normalizar: {texto}'):
+                self.assertEqual(normalizar_documento(texto), tokens)
+        for posicoes, slop, em_ordem, esperado in TESTES_PROXIMIDADE:
+            with self.subTest(f'Proximidade: {posicoes} {slop} {em_ordem}'):
+                self.assertEqual(conferir_proximidade(posicoes, slop, em_ordem), esperado)
+
+    def teste_2_pesquisas(self):
+        reversa = PesquisaReversa({k: v[0] for k, v in TESTES_PESQUISAS.items()})
+        for id_pesquisa, (criterios, texto, esperado) in TESTES_PESQUISAS.items():
+            with self.subTest(f'Pesquisa: {criterios} >> {texto}'):
+                self.assertEqual(id_pesquisa in reversa.pesquisas_do_documento(texto), esperado)
+        # pesquisas inteligentes e com erro não são incluídas
+        self.assertFalse(reversa.adicionar('contem', 'contém: dano moral'))
+        self.assertFalse(reversa.adicionar('erro', '(dano moral'))
+        self.assertEqual(set(reversa.nao_suportadas), {'contem', 'erro'})
+        with self.assertRaises(KeyError):
+            reversa.adicionar('adj', 'dano')
+        # o índice invertido seleciona apenas as pesquisas com os termos obrigatórios
+        encontradas, candidatas = reversa.conferir('texto sem nenhum termo')
+        self.assertEqual((encontradas, candidatas), ([], 0))
+        encontradas, candidatas = reversa.conferir('o dano moral')
+        self.assertEqual(encontradas, ['adj', 'adj_ordem', 'aspas', 'curinga_inicio', 'curinga', 'ou_nao'])
+        encontradas, candidatas = reversa.conferir('o material')
+        self.assertEqual(encontradas, [])
+        self.assertLess(candidatas, len(reversa.pesquisas))
+
+    def teste_3_equivalencia(self):
+        # mesmas pesquisas encontradas pelo avaliador local das queries do elastic
+        aleatorio = random.Random(7)
+        criterios = {i: ':' + criterios_aleatorios(aleatorio) for i in range(200)}
+        reversa = PesquisaReversa(criterios)
+        queries = {i: PesquisaElasticFacil(criterios[i]).criterios_elastic for i in reversa.pesquisas}
+        for d in range(150):
+            tokens = [aleatorio.choice(VOCABULARIO_DOCUMENTOS) for _ in range(aleatorio.randint(1, 10))]
+            encontradas = set(reversa.pesquisas_do_documento(tokens))
+            with self.subTest(f'Equivalência: {tokens}'):
+                esperadas = {i for i, query in queries.items() if avaliar_query(query, {'texto': tokens})}
+                self.assertEqual(encontradas, esperadas)
+
+    def teste_4_processar(self):
+        reversa = PesquisaReversa((k, v[0]) for k, v in TESTES_PESQUISAS.items())
+        documentos = [(k, v[1]) for k, v in TESTES_PESQUISAS.items()] * 5
+        esperado = [(id_doc, reversa.pesquisas_do_documento(texto)) for id_doc, texto in documentos]
+        self.assertEqual(list(reversa.processar(documentos)), esperado)
+        self.assertEqual(list(reversa.processar(iter(documentos), workers=2, chunksize=4)), esperado)
+        self.assertEqual([_[0] for _ in reversa.processar(['dano moral', 'x'])], [0, 1])
+        resumo = reversa.resumo()
+        self.assertEqual(resumo['documentos'], len(documentos) * 2 + 2)
+        self.assertGreater(resumo['documentos_segundo'], 0)
+        self.assertLess(resumo['candidatas_documento'], len(TESTES_PESQUISAS))
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# Pesquisa de documentos semelhantes a documentos do índice ("buscar semelhantes" ao lado de cada resultado)
+# sem baixar o texto do documento e enviá-lo de volta no like do more_like_this
+# - query_semelhantes: more_like_this com like [{_index, _id}] e os termos dos critérios NÃO (...) no unlike
+#   combinada com os critérios de um GruposPesquisaElasticFacil no bool.filter (metadados, datas, classes)
+# - CacheTermVectors: guarda os retornos do _termvectors dos documentos (limite de quantidade e ttl) para
+#   cliques repetidos nos mesmos documentos e atualiza a TabelaDF com as estatísticas dos termos
+# - BuscaSemelhantes: query por id (padrão) ou, com o CacheTermVectors, query com os termos chave dos
+#   term vectors escolhidos localmente (ExtratorTermos) e os documentos de origem no must_not
+# - ElasticTermVectorsLocal: elastic local para testes (termvectors com os tokens do raw_analyzer)
+# Exemplo:
+#   semelhantes = BuscaSemelhantes('meu_indice', cache=CacheTermVectors(es, maximo=5000, ttl=3600))
+#   query = semelhantes.query('id_doc', criterios_nao='NÃO (dano material)', grupos=grupos)
+#   retorno = semelhantes.pesquisar(es, 'id_doc', grupos=grupos, size=20)
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - like por id, filtros dos grupos e cache dos term vectors
+
+import re
+from time import time
+from threading import Lock
+from collections import Counter, OrderedDict
+from util_pesquisaelastic_facil import Operadores
+from util_pesquisaelastic_normalizacao import minusculas_sem_acentos, tokens_documento
+from util_pesquisaelastic_termos import TabelaDF, ExtratorTermos
+
+# critérios NÃO (...) como no CONTÉM: (maiúsculas ou minúsculas)
+RE_NAO = re.compile(r'(?:^|\s)n[aã]o\s*\(([^\)]+)\)', re.IGNORECASE)
+
+###########################################################
+# Termos do unlike
+# criterios_nao: 'NÃO (termos) NÃO (termos)', texto sem NÃO ou lista de textos
+#----------------------------------------------------------
+def termos_unlike(criterios_nao):
+    if not criterios_nao:
+        return []
+    if isinstance(criterios_nao, str):
+        textos = RE_NAO.findall(criterios_nao) or [criterios_nao]
+    else:
+        textos = list(criterios_nao)
+    textos = [' '.join(Operadores.RE_LIMPAR_TERMO_MLT.sub(' ', minusculas_sem_acentos(str(_))).split()) for _ in textos]
+    return [_ for _ in textos if _]
+
+def _ids(ids):
+    return [str(ids)] if isinstance(ids, (str, int)) else [str(_) for _ in ids]
+
+# critérios dos grupos no contexto de filtro da query de semelhança (o score vem apenas da semelhança)
+def combinar_grupos(query, grupos = None):
+    filtro = None if grupos is None else grupos.as_query()
+    if filtro is None:
+        return query
+    return {"query": {"bool": {"must": [query["query"]], "filter": [filtro["query"]]}}}
+
+###########################################################
+# Query more_like_this com os documentos do índice no like
+# ids: id ou lista de ids dos documentos de origem
+#----------------------------------------------------------
+def query_semelhantes(ids, index, campos_texto = 'texto', criterios_nao = None, grupos = None, min_term_freq = 1,
+                      min_doc_freq = 1, max_query_terms = 30, minimum_should_match = '30%'):
+    _campos = [campos_texto] if type(campos_texto) is str else list(campos_texto)
+    query = {"query": {"more_like_this": {
+                "fields": _campos,
+                "like": [{"_index": index, "_id": _} for _ in _ids(ids)],
+                "unlike": termos_unlike(criterios_nao),
+                "min_term_freq": min_term_freq,
+                "min_doc_freq": min_doc_freq,
+                "max_query_terms": max_query_terms,
+                "minimum_should_match": minimum_should_match}}}
+    return combinar_grupos(query, grupos)
+
+###########################################################
+# Cache dos retornos do _termvectors
+# cliente: Elasticsearch (termvectors) ou ElasticTermVectorsLocal
+# maximo: quantidade de term vectors guardados (remove os menos usados recentemente)
+# ttl: segundos de validade (None sem expiração)
+# tabela: TabelaDF atualizada com as estatísticas de cada term vector obtido do elastic
+#----------------------------------------------------------
+class CacheTermVectors():
+    def __init__(self, cliente, maximo = 1000, ttl = None, tabela = None):
+        self.cliente = cliente
+        self.maximo = max(1, int(maximo))
+        self.ttl = ttl
+        self.tabela = tabela if tabela is not None else TabelaDF()
+        self.__dados__ = OrderedDict()
+        self.__lock__ = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__dados__)
+
+    def __obter__(self, chave):
+        with self.__lock__:
+            item = self.__dados__.get(chave)
+            if item is not None and (self.ttl is None or time() - item[0] < self.ttl):
+                self.__dados__.move_to_end(chave)
+                self.hits += 1
+                return item[1]
+            self.__dados__.pop(chave, None)
+            self.misses += 1
+            return None
+
+    def termvectors(self, index, id, campo = 'texto'):
+        chave = (str(index), str(id), str(campo))
+        retorno = self.__obter__(chave)
+        if retorno is not None:
+            return retorno
+        retorno = self.cliente.termvectors(index=index, id=id, fields=[campo], term_statistics=True, field_statistics=True)
+        with self.__lock__:
+            self.__dados__[chave] = (time(), retorno)
+            while len(self.__dados__) > self.maximo:
+                self.__dados__.popitem(last=False)
+            self.tabela.atualizar_de_termvectors(retorno, campo)
+        return retorno
+
+    # frequências dos termos do campo nos documentos (soma do term_freq)
+    def frequencias(self, index, ids, campo = 'texto'):
+        res = Counter()
+        for id in _ids(ids):
+            termos = self.termvectors(index, id, campo).get('term_vectors', {}).get(campo, {}).get('terms', {})
+            res.update({termo: dados.get('term_freq', 1) for termo, dados in termos.items()})
+        return res
+
+    # remove os term vectors de um documento, de um índice ou todos
+    def invalidar(self, index = None, id = None):
+        with self.__lock__:
+            for chave in [_ for _ in self.__dados__ if (index is None or _[0] == str(index)) and (id is None or _[1] == str(id))]:
+                del self.__dados__[chave]
+
+    def estatisticas(self):
+        total = self.hits + self.misses
+        return {'term_vectors': len(self.__dados__), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0, 'termos_tabela': len(self.tabela)}
+
+###########################################################
+# Pesquisa de semelhantes de um índice
+# cache: CacheTermVectors - sem cache a query usa o like por id
+# extrator: ExtratorTermos dos termos chave dos term vectors (usa a tabela do cache se não for informado)
+#----------------------------------------------------------
+class BuscaSemelhantes():
+    def __init__(self, index, campo_texto = 'texto', cache = None, extrator = None, max_query_terms = 30, minimum_should_match = '30%'):
+        self.index = index
+        self.campo_texto = campo_texto
+        self.cache = cache
+        if extrator is None and cache is not None:
+            extrator = ExtratorTermos(cache.tabela, maximo_termos=max_query_terms)
+        self.extrator = extrator
+        self.max_query_terms = max_query_terms
+        self.minimum_should_match = minimum_should_match
+
+    # por_termos: None usa os termos dos term vectors quando houver cache
+    def query(self, ids, criterios_nao = None, grupos = None, por_termos = None):
+        por_termos = self.cache is not None if por_termos is None else por_termos
+        if not por_termos:
+            return query_semelhantes(ids, self.index, self.campo_texto, criterios_nao, grupos,
+                                     max_query_terms=self.max_query_terms, minimum_should_match=self.minimum_should_match)
+        if self.cache is None or self.extrator is None:
+            raise ValueError('BuscaSemelhantes: a query por termos precisa do CacheTermVectors')
+        frequencias = self.cache.frequencias(self.index, ids, self.campo_texto)
+        query = self.extrator.as_query_frequencias(frequencias, termos_unlike(criterios_nao), self.campo_texto)
+        # o like por id não retorna os documentos de origem
+        query = {"query": {"bool": {"must": [query["query"]], "must_not": [{"ids": {"values": _ids(ids)}}]}}}
+        return combinar_grupos(query, grupos)
+
+    def pesquisar(self, cliente, ids, criterios_nao = None, grupos = None, size = None, desde = None, por_termos = None):
+        corpo = dict(self.query(ids, criterios_nao, grupos, por_termos))
+        if size is not None:
+            corpo['size'] = size
+        if desde is not None:
+            corpo['from'] = desde
+        return cliente.search(index=self.index, body=corpo)
+
+###########################################################
+# Elastic local para testes: term vectors dos documentos com os tokens
+# do raw_analyzer e as estatísticas dos termos nos documentos
+# documentos: {id: {campo: texto}}
+#----------------------------------------------------------
+class ElasticTermVectorsLocal():
+    def __init__(self, documentos = None):
+        self.documentos = documentos or {}
+        self.requisicoes = [] # (index, id)
+
+    def termvectors(self, index = None, id = None, fields = ('texto',), term_statistics = False, field_statistics = False):
+        self.requisicoes.append((index, id))
+        if id not in self.documentos:
+            return {'_index': index, '_id': id, 'found': False}
+        vetores = {}
+        for campo in fields:
+            tokens = {_: set(tokens_documento(d.get(campo, ''))) for _, d in self.documentos.items()}
+            termos = {}
+            for termo, tf in Counter(tokens_documento(self.documentos[id].get(campo, ''))).items():
+                termos[termo] = {'term_freq': tf}
+                if term_statistics:
+                    termos[termo]['doc_freq'] = sum(1 for _ in tokens.values() if termo in _)
+            vetores[campo] = {'terms': termos}
+            if field_statistics:
+                vetores[campo]['field_statistics'] = {'doc_count': sum(1 for _ in tokens.values() if _)}
+        return {'_index': index, '_id': id, 'found': True, 'term_vectors': vetores}
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Teste Semelhantes:
+# - more_like_this com like por id, unlike dos critérios NÃO e filtros dos grupos
+# - cache dos term vectors (hits, limite, ttl, invalidação) e tabela de frequência atualizada
+# - query com os termos chave dos term vectors sem os documentos de origem
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+from time import sleep
+from util_pesquisaelastic_facil import GruposPesquisaElasticFacil
+from util_pesquisaelastic_semelhantes import termos_unlike, query_semelhantes, CacheTermVectors, BuscaSemelhantes, ElasticTermVectorsLocal
+
+DOCUMENTOS = {'1': {'texto': 'divulgação de imagens íntimas em rede social gera dano moral à vítima'},
+              '2': {'texto': 'dano moral por divulgação de imagens em rede social'},
+              '3': {'texto': 'dano material por acidente de trânsito'},
+              '4': {'texto': 'o dano moral e o dano material'}}
+
+# critérios NÃO, termos do unlike
+TESTES_UNLIKE = (
+    (None, []),
+    ('', []),
+    ('NÃO (dano material) não (Acidente de Trânsito)', ['dano material', 'acidente de transito']),
+    ('nao(lucros)', ['lucros']),
+    ('dano material', ['dano material']),
+    (['Trânsito', ' '], ['transito']),
+)
+
+class Teste(unittest.TestCase):
+
+    def teste_1_query(self):
+        for criterios, esperado in TESTES_UNLIKE:
+            with self.subTest(f'Unlike: {criterios}'):
+                self.assertEqual(termos_unlike(criterios), esperado)
+        mlt = query_semelhantes('1', 'indice', criterios_nao='NÃO (dano material)')['query']['more_like_this']
+        self.assertEqual(mlt['like'], [{'_index': 'indice', '_id': '1'}])
+        self.assertEqual((mlt['unlike'], mlt['fields']), (['dano material'], ['texto']))
+        mlt = query_semelhantes(['1', 2], 'indice', ['texto', 'ementa'])['query']['more_like_this']
+        self.assertEqual(mlt['like'], [{'_index': 'indice', '_id': '1'}, {'_index': 'indice', '_id': '2'}])
+        # filtros dos grupos
+        grupos = GruposPesquisaElasticFacil('.sg_classe.(REsp) .dt_rg_protocolo.(>= 2020-01-01)',
+                                            campos_disponiveis={'sg_classe': '', 'dt_rg_protocolo': '', 'texto': ''})
+        query = query_semelhantes('1', 'indice', grupos=grupos)['query']['bool']
+        self.assertIn('more_like_this', query['must'][0])
+        self.assertEqual(query['filter'], [grupos.as_query()['query']])
+        self.assertEqual(query_semelhantes('1', 'indice', grupos=GruposPesquisaElasticFacil('')), query_semelhantes('1', 'indice'))
+        # sem cache a busca usa o like por id
+        self.assertEqual(BuscaSemelhantes('indice').query('1', 'NÃO (x)'), query_semelhantes('1', 'indice', criterios_nao='NÃO (x)'))
+        with self.assertRaises(ValueError):
+            BuscaSemelhantes('indice').query('1', por_termos=True)
+
+    def teste_2_cache(self):
+        elastic = ElasticTermVectorsLocal(DOCUMENTOS)
+        cache = CacheTermVectors(elastic, maximo=2)
+        retorno = cache.termvectors('indice', '2')
+        self.assertEqual(retorno['term_vectors']['texto']['terms']['dano'], {'term_freq': 1, 'doc_freq': 4})
+        self.assertIs(cache.termvectors('indice', '2'), retorno)
+        self.assertEqual((len(elastic.requisicoes), cache.hits, cache.misses), (1, 1, 1))
+        self.assertEqual((cache.tabela.df['imagens'], cache.tabela.total_documentos), (2, 4))
+        self.assertEqual(cache.frequencias('indice', ['4'])['dano'], 2)
+        cache.termvectors('indice', '1')
+        self.assertEqual(len(cache), 2)
+        cache.termvectors('indice', '2')
+        self.assertEqual(len(elastic.requisicoes), 4)
+        cache.invalidar('indice', '1')
+        self.assertEqual(len(cache), 1)
+        cache.invalidar('outro')
+        self.assertEqual(len(cache), 1)
+        cache.invalidar()
+        self.assertEqual(len(cache), 0)
+        cache = CacheTermVectors(elastic, ttl=0.01)
+        cache.termvectors('indice', '3')
+        sleep(0.02)
+        cache.termvectors('indice', '3')
+        self.assertEqual(cache.estatisticas()['misses'], 2)
+
+    def teste_3_termos(self):
+        elastic = ElasticTermVectorsLocal(DOCUMENTOS)
+        semelhantes = BuscaSemelhantes('indice', cache=CacheTermVectors(elastic))
+        query = semelhantes.query('1', 'NÃO (dano moral)')['query']['bool']
+        mlt = query['must'][0]['more_like_this']
+        termos = mlt['like'].split(' ')
+        self.assertFalse({'dano', 'moral'} & set(termos))
+        # termos que aparecem apenas no documento de origem
+        self.assertEqual(set(termos[:3]), {'intimas', 'gera', 'vitima'})
+        self.assertEqual(mlt['unlike'], ['dano moral'])
+        self.assertEqual(query['must_not'], [{'ids': {'values': ['1']}}])
+        # cliques repetidos não consultam o elastic
+        for _ in range(3):
+            semelhantes.query('1', grupos=GruposPesquisaElasticFacil('.texto.(rede)'))
+        self.assertEqual(len(elastic.requisicoes), 1)
+        self.assertEqual(semelhantes.cache.estatisticas()['hits'], 3)
+        grupos = GruposPesquisaElasticFacil('.texto.(rede)')
+        query = semelhantes.query('1', grupos=grupos)['query']['bool']
+        self.assertEqual(query['filter'], [grupos.as_query()['query']])
+        self.assertEqual(query['must'][0]['bool']['must_not'], [{'ids': {'values': ['1']}}])
+        self.assertEqual(semelhantes.query('1', por_termos=False), query_semelhantes('1', 'indice'))
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+# Search templates (mustache) com o formato das queries criadas pelo componente PesquisaElasticFacil
+# Pesquisas com a mesma estrutura e termos, datas ou classes diferentes usam o mesmo template:
+# - template_da_query: troca os valores literais da query (term, span_term, wildcard, regexp, prefix,
+#   match, terms, range, like/unlike do more_like_this) por parâmetros {{#toJson}}p0{{/toJson}}
+#   e calcula o hash da estrutura (sha256 do template) que ignora os valores
+#   size e from também são parâmetros do template
+# - RegistroTemplates: registra cada estrutura uma única vez no elastic (PUT _scripts/<id>) e depois
+#   envia apenas {id, params} para o _search/template - o id vem do hash da estrutura e é o mesmo
+#   em todos os processos, o registro repetido apenas substitui o template pelo mesmo conteúdo
+#   maximo_templates limita os templates registrados (scripts ficam no estado do cluster), as
+#   pesquisas com estruturas novas acima do limite são enviadas com a query completa
+# - ElasticTemplatesLocal: elastic local para testes (put_script, get_script e search_template
+#   com o template renderizado e os documentos conferidos com o avaliador local das queries)
+# Exemplo:
+#   registro = RegistroTemplates(es)
+#   pe = PesquisaElasticFacil('dano PROX10 moral')
+#   retorno = registro.pesquisar(pe, 'meu_indice', size=20, highlight=True)
+#   print(registro.resumo())
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - templates mustache com hash da estrutura e registro único
+
+import re
+import json
+import hashlib
+from threading import Lock
+from util_pesquisaelastic_canonico import avaliar_query
+from util_pesquisaelastic_execucao import query_da_pesquisa, campo_texto_da_pesquisa
+
+# cláusulas {campo: valor} ou {campo: {chave: valor, ...}} e as chaves com os valores literais
+CLAUSULAS_CAMPO = {'term': ('value',), 'span_term': ('value',), 'wildcard': ('value', 'wildcard'), 'regexp': ('value',),
+                   'prefix': ('value',), 'fuzzy': ('value',), 'match': ('query',), 'match_phrase': ('query',),
+                   'match_phrase_prefix': ('query',), 'match_bool_prefix': ('query',)}
+# cláusulas {campo: {chave: valor, ...}} sem valor direto
+CHAVES_RANGE = ('gt', 'gte', 'lt', 'lte', 'from', 'to')
+# cláusulas com os valores literais nas próprias chaves
+CLAUSULAS_TEXTO = {'more_like_this': ('like', 'unlike'), 'query_string': ('query',), 'simple_query_string': ('query',)}
+PARAMETROS_PAGINACAO = {'size': 10, 'from': 0}
+
+MARCADOR = '\x01'
+RE_MARCADOR = re.compile(r'"\\u0001(\w+)"')
+RE_PARAMETRO = re.compile(r'\{\{#toJson\}\}(\w+)\{\{/toJson\}\}')
+
+###########################################################
+# Estrutura da query com os parâmetros no lugar dos valores
+#----------------------------------------------------------
+def _parametro(valor, parametros, novos):
+    nome = f'p{len(parametros) + len(novos)}'
+    novos[nome] = valor
+    return MARCADOR + nome
+
+# retorna None se a cláusula não tiver o formato esperado (ex.: span_multi.match contém uma query)
+def _moldar_campos(clausula, chaves, parametros, valor_direto):
+    res, novos = {}, {}
+    for campo, valor in clausula.items():
+        if isinstance(valor, dict):
+            if not any(_ in valor for _ in chaves):
+                return None
+            res[campo] = {k: _parametro(v, parametros, novos) if k in chaves else v for k, v in valor.items()}
+        elif valor_direto and not isinstance(valor, list):
+            res[campo] = _parametro(valor, parametros, novos)
+        else:
+            return None
+    parametros.update(novos)
+    return res
+
+def _moldar(no, parametros):
+    if isinstance(no, list):
+        return [_moldar(_, parametros) for _ in no]
+    if not isinstance(no, dict):
+        return no
+    res = {}
+    for chave, valor in no.items():
+        molde = None
+        if isinstance(valor, dict):
+            if chave in CLAUSULAS_CAMPO:
+                molde = _moldar_campos(valor, CLAUSULAS_CAMPO[chave], parametros, True)
+            elif chave == 'range':
+                molde = _moldar_campos(valor, CHAVES_RANGE, parametros, False)
+            elif chave == 'terms':
+                novos = {}
+                molde = {k: _parametro(v, parametros, novos) if isinstance(v, list) else v for k, v in valor.items()}
+                parametros.update(novos)
+            elif chave in CLAUSULAS_TEXTO:
+                novos = {}
+                molde = {k: _parametro(v, parametros, novos) if k in CLAUSULAS_TEXTO[chave] else v for k, v in valor.items()}
+                parametros.update(novos)
+        res[chave] = _moldar(valor, parametros) if molde is None else molde
+    return res
+
+# template mustache, parâmetros e hash da estrutura de uma query
+class TemplatePesquisa():
+    __slots__ = ('id', 'fonte', 'parametros', 'hash')
+
+    def __init__(self, fonte, parametros, prefixo_id = 'pef_'):
+        self.fonte = fonte
+        self.parametros = parametros
+        self.hash = hashlib.sha256(fonte.encode('utf-8')).hexdigest()
+        self.id = f'{prefixo_id}{self.hash[:24]}'
+
+    # corpo do _search/template
+    def corpo(self, size = None, desde = None):
+        parametros = dict(self.parametros)
+        parametros['size'] = PARAMETROS_PAGINACAO['size'] if size is None else int(size)
+        parametros['from'] = PARAMETROS_PAGINACAO['from'] if desde is None else int(desde)
+        return {'id': self.id, 'params': parametros}
+
+    # corpo do PUT _scripts/<id>
+    def script(self):
+        return {'script': {'lang': 'mustache', 'source': self.fonte}}
+
+    def __repr__(self) -> str:
+        return f'TemplatePesquisa({self.id}, {len(self.parametros)} parâmetros)'
+
+# query: dict com query, highlight, _source etc (sem size e from)
+def template_da_query(query, prefixo_id = 'pef_'):
+    parametros = {}
+    molde = _moldar(query, parametros)
+    molde.pop('size', None)
+    molde.pop('from', None)
+    molde['size'] = MARCADOR + 'size'
+    molde['from'] = MARCADOR + 'from'
+    fonte = json.dumps(molde, ensure_ascii=False, separators=(',', ':'))
+    fonte = RE_MARCADOR.sub(lambda m: '{{#toJson}}' + m.group(1) + '{{/toJson}}', fonte)
+    return TemplatePesquisa(fonte, parametros, prefixo_id)
+
+# renderiza o template como o elastic (apenas os parâmetros {{#toJson}}nome{{/toJson}})
+def renderizar_template(fonte, parametros):
+    def _valor(m):
+        if m.group(1) not in parametros:
+            raise KeyError(f'Parâmetro do template não informado: {m.group(1)}')
+        return json.dumps(parametros[m.group(1)], ensure_ascii=False)
+    return json.loads(RE_PARAMETRO.sub(_valor, fonte))
+
+###########################################################
+# Registro dos templates no elastic
+# cliente: Elasticsearch (put_script, search_template e search) ou ElasticTemplatesLocal
+#----------------------------------------------------------
+class RegistroTemplates():
+    def __init__(self, cliente, prefixo_id = 'pef_', maximo_templates = 1000):
+        self.cliente = cliente
+        self.prefixo_id = prefixo_id
+        self.maximo_templates = max(1, int(maximo_templates))
+        self.registrados = set() # ids dos templates registrados por este processo
+        self.__lock__ = Lock()
+        self.reaproveitados = 0
+        self.sem_template = 0
+
+    def __len__(self):
+        return len(self.registrados)
+
+    # template da pesquisa registrado no elastic - None se for uma estrutura nova acima do limite
+    # highlight: True usa o campo de texto da pesquisa ou o nome do campo
+    def template(self, pesquisa, highlight = None):
+        campo_highlight = (highlight if isinstance(highlight, str) else campo_texto_da_pesquisa(pesquisa)) if highlight else ''
+        template = template_da_query(query_da_pesquisa(pesquisa, campo_highlight), self.prefixo_id)
+        with self.__lock__:
+            if template.id in self.registrados:
+                self.reaproveitados += 1
+                return template
+            if len(self.registrados) >= self.maximo_templates:
+                self.sem_template += 1
+                return None
+        self.cliente.put_script(id=template.id, body=template.script())
+        with self.__lock__:
+            self.registrados.add(template.id)
+        return template
+
+    # corpo {id, params} do _search/template ou None (ver template)
+    def corpo(self, pesquisa, size = None, desde = None, highlight = None):
+        template = self.template(pesquisa, highlight)
+        return None if template is None else template.corpo(size, desde)
+
+    # pesquisa com o template ou com a query completa se a estrutura não puder ser registrada
+    def pesquisar(self, pesquisa, index, size = None, desde = None, highlight = None):
+        template = self.template(pesquisa, highlight)
+        if template is not None:
+            return self.cliente.search_template(index=index, body=template.corpo(size, desde))
+        campo_highlight = (highlight if isinstance(highlight, str) else campo_texto_da_pesquisa(pesquisa)) if highlight else ''
+        corpo = dict(query_da_pesquisa(pesquisa, campo_highlight))
+        if size is not None:
+            corpo['size'] = size
+        if desde is not None:
+            corpo['from'] = desde
+        return self.cliente.search(index=index, body=corpo)
+
+    def resumo(self):
+        return {'templates': len(self.registrados), 'reaproveitados': self.reaproveitados,
+                'sem_template': self.sem_template, 'maximo_templates': self.maximo_templates}
+
+###########################################################
+# Elastic local para testes: guarda os scripts, renderiza os templates
+# e retorna os documentos encontrados com o avaliador local das queries
+# documentos: {id: {campo: valor}}
+#----------------------------------------------------------
+class ElasticTemplatesLocal():
+    def __init__(self, documentos = None):
+        self.documentos = documentos or {}
+        self.scripts = {}
+        self.requisicoes = [] # (api, corpo enviado)
+        self.renderizadas = [] # queries renderizadas dos templates
+
+    def put_script(self, id, body):
+        script = body['script']
+        if script.get('lang') != 'mustache':
+            raise ValueError(f'Template {id}: lang mustache esperado')
+        self.scripts[id] = script['source']
+        self.requisicoes.append(('put_script', body))
+        return {'acknowledged': True}
+
+    def get_script(self, id):
+        if id not in self.scripts:
+            raise KeyError(f'Template não encontrado: {id}')
+        return {'_id': id, 'found': True, 'script': {'lang': 'mustache', 'source': self.scripts[id]}}
+
+    def delete_script(self, id):
+        self.get_script(id)
+        del self.scripts[id]
+        return {'acknowledged': True}
+
+    def search_template(self, index = None, body = None):
+        self.requisicoes.append(('search_template', body))
+        fonte = body['source'] if 'source' in body else self.get_script(body['id'])['script']['source']
+        fonte = fonte if isinstance(fonte, str) else json.dumps(fonte)
+        query = renderizar_template(fonte, body.get('params', {}))
+        self.renderizadas.append(query)
+        return self.__retorno__(query)
+
+    def search(self, index = None, body = None):
+        self.requisicoes.append(('search', body))
+        return self.__retorno__(body)
+
+    def __retorno__(self, query):
+        hits = [{'_id': k, '_score': 1.0, '_source': dict(v)} for k, v in self.documentos.items() if avaliar_query(query, v)]
+        desde = query.get('from') or 0
+        return {'took': 1, 'timed_out': False, 'hits': {'total': {'value': len(hits)}, 'hits': hits[desde:desde + query.get('size', 10)]}}
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Teste Search templates:
+# - mesma estrutura com valores diferentes gera o mesmo template (hash da estrutura)
+# - template renderizado igual à query original com size e from
+# - registro único no elastic local, envio apenas de {id, params} e limite de templates
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import unittest
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_execucao import query_da_pesquisa
+from util_pesquisaelastic_template import RegistroTemplates, ElasticTemplatesLocal, template_da_query, renderizar_template
+
+CAMPOS = {'sg_classe': '', 'dt_rg_protocolo': '', 'texto': ''}
+
+def grupos(criterios):
+    return GruposPesquisaElasticFacil(criterios, campos_disponiveis=CAMPOS, numeros_como_termos=True)
+
+# pesquisa a, pesquisa b, mesma estrutura
+TESTES_ESTRUTURA = (
+    (grupos('.sg_classe.(REsp) .dt_rg_protocolo.(>= 2020-01-01 < 2021-01-01) dano PROX10 moral'),
+     grupos('.sg_classe.(HC) .dt_rg_protocolo.(>= 2019-05-01 < 2019-06-01) prova PROX10 ilicita'), True),
+    (grupos('.sg_classe.(REsp) .dt_rg_protocolo.(>= 2020-01-01 < 2021-01-01) dano PROX10 moral'),
+     grupos('.sg_classe.(REsp) .dt_rg_protocolo.(>= 2020-01-01) dano PROX10 moral'), False),
+    (PesquisaElasticFacil('dano adj2 mora*'), PesquisaElasticFacil('prova adj2 ilic*'), True),
+    (PesquisaElasticFacil('dano adj2 mora*'), PesquisaElasticFacil('dano adj3 mora*'), False),
+    (PesquisaElasticFacil('dano adj2 mora*'), PesquisaElasticFacil('dano adj2 mora?'), False),
+    (PesquisaElasticFacil('2020 E dano', numeros_como_termos=True), PesquisaElasticFacil('123.456 E prova', numeros_como_termos=True), True),
+    (PesquisaElasticFacil(':dano E moral'), PesquisaElasticFacil(':dano OU moral'), False),
+    (PesquisaElasticFacil('contém: o réu causou danos morais à autora'), PesquisaElasticFacil('contém: a autora causou danos morais ao réu'), True),
+)
+
+DOCUMENTOS = {'1': {'texto': 'o dano moral foi comprovado', 'sg_classe': 'resp', 'dt_rg_protocolo': '2020-03-01'},
+              '2': {'texto': 'o dano moral', 'sg_classe': 'hc', 'dt_rg_protocolo': '2020-04-01'},
+              '3': {'texto': 'a prova ilicita', 'sg_classe': 'hc', 'dt_rg_protocolo': '2019-05-10'}}
+
+class Teste(unittest.TestCase):
+
+    def teste_1_estrutura(self):
+        for a, b, esperado in TESTES_ESTRUTURA:
+            ta, tb = template_da_query(query_da_pesquisa(a, 'texto')), template_da_query(query_da_pesquisa(b, 'texto'))
+            with self.subTest(f'Estrutura: {ta.parametros} {tb.parametros}'):
+                self.assertEqual(ta.id == tb.id, esperado)
+                self.assertEqual(ta.hash == tb.hash, esperado)
+                if esperado:
+                    self.assertNotEqual(ta.parametros, tb.parametros)
+        # o template não contém os valores
+        template = template_da_query(query_da_pesquisa(TESTES_ESTRUTURA[0][0], 'texto'))
+        self.assertEqual(template.parametros, {'p0': 'resp', 'p1': '2020-01-01', 'p2': '2021-01-01', 'p3': 'dano', 'p4': 'moral'})
+        for valor in template.parametros.values():
+            self.assertNotIn(f'"{valor}"', template.fonte)
+        self.assertTrue(template.id.startswith('pef_'))
+
+    def teste_2_renderizar(self):
+        for a, b, _ in TESTES_ESTRUTURA:
+            for pesquisa in (a, b):
+                for campo in ('', 'texto'):
+                    query = query_da_pesquisa(pesquisa, campo)
+                    template = template_da_query(query)
+                    with self.subTest(f'Renderizar: {template.parametros} {campo}'):
+                        self.assertEqual(renderizar_template(template.fonte, template.corpo()['params']), dict(query, size=10, **{'from': 0}))
+                        self.assertEqual(renderizar_template(template.fonte, template.corpo(5, 20)['params']), dict(query, size=5, **{'from': 20}))
+        with self.assertRaises(KeyError):
+            renderizar_template(template.fonte, {})
+
+    def teste_3_registro(self):
+        elastic = ElasticTemplatesLocal(DOCUMENTOS)
+        registro = RegistroTemplates(elastic)
+        cache = CacheQueriesElastic()
+        pesquisas = [grupos('.sg_classe.(REsp) .dt_rg_protocolo.(>= 2020-01-01 < 2021-01-01) dano PROX10 moral'),
+                     grupos('.sg_classe.(HC) .dt_rg_protocolo.(>= 2019-05-01 < 2019-06-01) prova PROX10 ilicita'),
+                     cache.get_grupos('.sg_classe.(HC) .dt_rg_protocolo.(>= 2020-01-01 < 2021-01-01) dano PROX10 moral', campos_disponiveis=CAMPOS),
+                     PesquisaElasticFacil('dano adj2 moral')]
+        ids = [[_['_id'] for _ in registro.pesquisar(p, 'indice', highlight=True)['hits']['hits']] for p in pesquisas]
+        self.assertEqual(ids, [['1'], ['3'], ['2'], ['1', '2']])
+        # duas estruturas registradas uma única vez e as pesquisas enviam apenas id e params
+        self.assertEqual(len(elastic.scripts), 2)
+        self.assertEqual(registro.resumo()['templates'], 2)
+        self.assertEqual(registro.resumo()['reaproveitados'], 2)
+        envios = [c for api, c in elastic.requisicoes if api == 'search_template']
+        self.assertEqual([sorted(_) for _ in envios], [['id', 'params']] * 4)
+        self.assertEqual(envios[1]['params'], {'p0': 'hc', 'p1': '2019-05-01', 'p2': '2019-06-01', 'p3': 'prova', 'p4': 'ilicita', 'size': 10, 'from': 0})
+        self.assertEqual(elastic.renderizadas[0], dict(pesquisas[0].as_query('texto'), size=10, **{'from': 0}))
+        # paginação
+        retorno = registro.pesquisar(pesquisas[3], 'indice', size=1, desde=1, highlight=True)
+        self.assertEqual([_['_id'] for _ in retorno['hits']['hits']], ['2'])
+        self.assertEqual(registro.corpo(pesquisas[3], size=1, highlight=True)['params'], {'p0': 'dano', 'p1': 'moral', 'size': 1, 'from': 0})
+        # acima do limite as estruturas novas são enviadas com a query completa
+        registro.maximo_templates = 2
+        retorno = registro.pesquisar(PesquisaElasticFacil('dano adj5 moral'), 'indice', size=5)
+        self.assertEqual([_['_id'] for _ in retorno['hits']['hits']], ['1', '2'])
+        self.assertEqual(elastic.requisicoes[-1][0], 'search')
+        self.assertIsNone(registro.corpo(PesquisaElasticFacil('dano adj5 moral')))
+        self.assertEqual(registro.resumo()['sem_template'], 2)
+        self.assertEqual(len(elastic.scripts), 2)
+        with self.assertRaises(KeyError):
+            elastic.search_template('indice', {'id': 'pef_x', 'params': {}})
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)
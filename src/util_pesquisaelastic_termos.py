@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# Termos chave dos textos das pesquisas CONTÉM: (more_like_this) extraídos no python
+# O elastic analisa todo o texto do like a cada pesquisa para escolher max_query_terms termos,
+# com os termos escolhidos localmente o like enviado tem apenas os termos que discriminam o texto
+# - TabelaDF: frequência dos termos nos documentos (document frequency) do índice
+#   - carregar/gravar: arquivo json {"total_documentos": n, "df": {"termo": df, ...}}
+#   - atualizar_de_termvectors: retorno do _termvectors/_mtermvectors com term_statistics=true
+#   - atualizar_de_agregacao: retorno de uma agregação terms no campo de texto (buckets e hits.total)
+# - ExtratorTermos: escolhe os termos com maior tf-idf (idf do more_like_this: log((n+1)/(df+1)) + 1)
+#   em uma leitura do texto com os tokens do raw_analyzer (util_pesquisaelastic_normalizacao)
+#   - modo like: more_like_this com os termos escolhidos no like
+#   - modo should: bool.should com um term por termo e boost proporcional ao peso
+#   - max_query_terms e minimum_should_match de acordo com a quantidade de termos distintos do texto
+#   - termos fora da tabela (df < min_doc_freq) são descartados quando a tabela tem documentos,
+#     sem tabela os pesos usam apenas a frequência dos termos no texto
+#   - os termos dos critérios NÃO (unlike) não são escolhidos, como no more_like_this
+# Exemplo:
+#   extrator = ExtratorTermos(TabelaDF.carregar('df_texto.json'), modo='should')
+#   pe = PesquisaElasticFacil(texto_colado, termos_chave=extrator)
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+# Ver 0.1.0 - 18/10/2026 - tabela de frequência, termos chave e parâmetros adaptativos
+# Ver 0.1.1 - 18/10/2026 - termos_frequencias e as_query_frequencias (term vectors dos documentos semelhantes)
+
+import json
+from math import log, sqrt
+from heapq import nlargest
+from itertools import count
+from collections import Counter
+from util_pesquisaelastic_normalizacao import tokens_documento
+
+CONTADOR_TABELAS = count(1)
+
+###########################################################
+# Frequência dos termos nos documentos do índice
+#----------------------------------------------------------
+class TabelaDF():
+    def __init__(self, df = None, total_documentos = 0):
+        self.df = dict(df or {})
+        self.total_documentos = int(total_documentos)
+        # identifica a tabela e as atualizações na chave do cache de queries
+        self.id = next(CONTADOR_TABELAS)
+        self.versao = 0
+
+    def __len__(self):
+        return len(self.df)
+
+    @classmethod
+    def carregar(self, arquivo):
+        with open(arquivo, encoding='utf-8') as f:
+            dados = json.load(f)
+        return self(dados.get('df'), dados.get('total_documentos', 0))
+
+    def gravar(self, arquivo):
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            json.dump({'total_documentos': self.total_documentos, 'df': self.df}, f, ensure_ascii=False)
+
+    # retorno: _termvectors ou _mtermvectors (docs) com term_statistics e field_statistics
+    def atualizar_de_termvectors(self, retorno, campo = 'texto'):
+        for doc in retorno.get('docs', [retorno]):
+            vetor = doc.get('term_vectors', {}).get(campo, {})
+            total = vetor.get('field_statistics', {}).get('doc_count')
+            if total is not None:
+                self.total_documentos = max(self.total_documentos, int(total))
+            for termo, dados in vetor.get('terms', {}).items():
+                if 'doc_freq' in dados:
+                    self.df[termo] = int(dados['doc_freq'])
+        self.versao += 1
+        return self
+
+    # retorno: pesquisa com a agregação terms (nome) no campo de texto
+    def atualizar_de_agregacao(self, retorno, nome = 'termos'):
+        total = retorno.get('hits', {}).get('total', {})
+        total = total.get('value', 0) if isinstance(total, dict) else int(total or 0)
+        self.total_documentos = max(self.total_documentos, total)
+        for bucket in retorno.get('aggregations', {}).get(nome, {}).get('buckets', []):
+            self.df[str(bucket['key'])] = int(bucket['doc_count'])
+        self.versao += 1
+        return self
+
+    # idf do more_like_this (TFIDFSimilarity)
+    def idf(self, termo):
+        return log((self.total_documentos + 1) / (self.df.get(termo, 0) + 1)) + 1
+
+###########################################################
+# Extrator dos termos chave e query CONTÉM:
+# maximo_termos: limite de max_query_terms
+# min_term_freq, min_doc_freq e max_doc_freq como no more_like_this
+#   (max_doc_freq < 1 é a fração do total de documentos)
+# min_comprimento: tamanho mínimo dos termos
+#----------------------------------------------------------
+class ExtratorTermos():
+    MODOS = ('like', 'should')
+
+    def __init__(self, tabela = None, modo = 'like', maximo_termos = 40, min_term_freq = 1, min_doc_freq = 1,
+                 max_doc_freq = None, min_comprimento = 2):
+        if modo not in self.MODOS:
+            raise ValueError(f'ExtratorTermos: modo "{modo}" inválido, use {self.MODOS}')
+        self.tabela = tabela if tabela is not None else TabelaDF()
+        self.modo = modo
+        self.maximo_termos = max(1, int(maximo_termos))
+        self.min_term_freq = max(1, int(min_term_freq))
+        self.min_doc_freq = max(0, int(min_doc_freq))
+        self.max_doc_freq = max_doc_freq
+        self.min_comprimento = max(1, int(min_comprimento))
+
+    # chave para o cache de queries
+    def chave(self):
+        return (self.modo, self.maximo_termos, self.min_term_freq, self.min_doc_freq, self.max_doc_freq,
+                self.min_comprimento, self.tabela.id, self.tabela.versao)
+
+    # quantidade de termos e minimum_should_match pela quantidade de termos distintos do texto
+    def parametros_adaptativos(self, distintos):
+        n = min(distintos, self.maximo_termos, max(10, round(3 * sqrt(distintos))))
+        if n < 5:
+            return n, '100%'
+        if n <= 12:
+            return n, '75%'
+        if n <= 30:
+            return n, '50%'
+        return n, '30%'
+
+    def __max_doc_freq__(self):
+        if self.max_doc_freq is None:
+            return None
+        if self.max_doc_freq < 1:
+            return self.max_doc_freq * self.tabela.total_documentos
+        return self.max_doc_freq
+
+    # retorna ([(termo, peso), ...] em ordem decrescente de peso, quantidade de termos distintos do texto)
+    # excluir: termos que não podem ser escolhidos (unlike)
+    def termos(self, texto, excluir = ()):
+        return self.termos_frequencias(Counter(tokens_documento(texto)), excluir)
+
+    # frequencias: {termo: frequência no texto} (ex.: term_freq dos term vectors de um documento)
+    def termos_frequencias(self, frequencias, excluir = ()):
+        distintos = len(frequencias)
+        excluir = set(excluir)
+        tabela = self.tabela
+        com_tabela = tabela.total_documentos > 0
+        max_df = self.__max_doc_freq__()
+        candidatos = []
+        for termo, tf in frequencias.items():
+            if tf < self.min_term_freq or len(termo) < self.min_comprimento or termo in excluir:
+                continue
+            if com_tabela:
+                df = tabela.df.get(termo, 0)
+                if df < self.min_doc_freq or (max_df is not None and df > max_df):
+                    continue
+                candidatos.append((termo, tf * tabela.idf(termo)))
+            else:
+                candidatos.append((termo, float(tf)))
+        n, _ = self.parametros_adaptativos(distintos)
+        return nlargest(n, candidatos, key=lambda _: _[1]), distintos
+
+    # query CONTÉM: com os termos chave (chamada pelo PesquisaElasticFacil)
+    # criterios_nao: textos dos critérios NÃO (unlike)
+    def as_query(self, criterios, criterios_nao, campos_texto):
+        return self.as_query_frequencias(Counter(tokens_documento(criterios)), criterios_nao, campos_texto)
+
+    # query com os termos chave das frequências (ver termos_frequencias)
+    def as_query_frequencias(self, frequencias, criterios_nao, campos_texto):
+        _campos = [campos_texto] if type(campos_texto) is str else list(campos_texto)
+        excluir = set()
+        for _ in criterios_nao:
+            excluir.update(tokens_documento(_))
+        termos, distintos = self.termos_frequencias(frequencias, excluir)
+        if not termos:
+            return {"query": {"match_none": {}}}
+        _, minimum_should_match = self.parametros_adaptativos(len(termos))
+        if self.modo == 'like':
+            return {"query": {"more_like_this": {
+                        "fields": _campos,
+                        "like": ' '.join(_[0] for _ in termos),
+                        "unlike": list(criterios_nao),
+                        "min_term_freq": 1,
+                        "min_doc_freq": self.min_doc_freq,
+                        "max_query_terms": len(termos),
+                        "minimum_should_match": minimum_should_match}}}
+        # com mais de um campo cada termo é um bool.should dos campos (minimum_should_match conta os termos)
+        maior = termos[0][1]
+        should = []
+        for termo, peso in termos:
+            _termos = [{"term": {campo: {"value": termo, "boost": max(0.001, round(peso / maior, 3))}}} for campo in _campos]
+            should.append(_termos[0] if len(_termos) == 1 else {"bool": {"should": _termos}})
+        return {"query": {"bool": {"should": should, "minimum_should_match": minimum_should_match}}}
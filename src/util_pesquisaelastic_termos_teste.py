@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Teste Termos chave:
+# - tabela de frequência gravada/carregada e atualizada com _termvectors e agregação terms
+# - termos escolhidos pelo tf-idf, termos fora da tabela e termos do unlike descartados
+# - parâmetros adaptativos, queries like/should e integração com o CONTÉM: e o cache de queries
+# Esse código, dicas de uso e outras informações:
+#   -> https://github.com/luizanisio/PesquisaElasticFacil/
+
+import os
+import tempfile
+import unittest
+from util_pesquisaelastic_facil import PesquisaElasticFacil, GruposPesquisaElasticFacil, CacheQueriesElastic
+from util_pesquisaelastic_termos import TabelaDF, ExtratorTermos
+
+DF = {'o': 900, 'reu': 300, 'causou': 100, 'danos': 400, 'morais': 350, 'a': 950, 'autora': 200, 'ao': 900,
+      'divulgar': 20, 'imagens': 15, 'sem': 700, 'autorizacao': 40, 'em': 950, 'rede': 30, 'social': 60}
+TEXTO = 'O réu causou danos morais à autora ao divulgar imagens sem autorização em rede social. Imagens íntimas.'
+
+# quantidade de termos distintos, (max_query_terms, minimum_should_match)
+TESTES_ADAPTATIVOS = (
+    (3, (3, '100%')),
+    (10, (10, '75%')),
+    (12, (10, '75%')),
+    (50, (21, '50%')),
+    (400, (40, '30%')),
+)
+
+TERMVECTORS = {'docs': [{'_id': '1', 'term_vectors': {'texto': {
+                    'field_statistics': {'doc_count': 1200, 'sum_doc_freq': 1, 'sum_ttf': 1},
+                    'terms': {'dano': {'doc_freq': 410, 'term_freq': 2}, 'moral': {'doc_freq': 380, 'term_freq': 1}}}}},
+               {'_id': '2', 'term_vectors': {'texto': {
+                    'field_statistics': {'doc_count': 1200},
+                    'terms': {'imagem': {'doc_freq': 12, 'term_freq': 1}, 'sem_estatistica': {'term_freq': 1}}}}}]}
+AGREGACAO = {'hits': {'total': {'value': 1500, 'relation': 'eq'}},
+             'aggregations': {'termos': {'buckets': [{'key': 'dano', 'doc_count': 500}, {'key': 2020, 'doc_count': 30}]}}}
+
+class Teste(unittest.TestCase):
+
+    def teste_1_tabela(self):
+        tabela = TabelaDF(DF, 1000)
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'df.json')
+            tabela.gravar(arquivo)
+            carregada = TabelaDF.carregar(arquivo)
+        self.assertEqual((carregada.df, carregada.total_documentos), (DF, 1000))
+        self.assertNotEqual(carregada.id, tabela.id)
+        self.assertGreater(tabela.idf('imagens'), tabela.idf('o'))
+        self.assertGreater(tabela.idf('inexistente'), tabela.idf('imagens'))
+        tabela = TabelaDF().atualizar_de_termvectors(TERMVECTORS)
+        self.assertEqual(tabela.df, {'dano': 410, 'moral': 380, 'imagem': 12})
+        self.assertEqual((tabela.total_documentos, tabela.versao), (1200, 1))
+        tabela.atualizar_de_agregacao(AGREGACAO)
+        self.assertEqual((tabela.df['dano'], tabela.df['2020'], tabela.total_documentos, tabela.versao), (500, 30, 1500, 2))
+        self.assertEqual(TabelaDF().atualizar_de_termvectors(TERMVECTORS['docs'][0]).df, {'dano': 410, 'moral': 380})
+
+    def teste_2_termos(self):
+        extrator = ExtratorTermos(TabelaDF(DF, 1000))
+        termos, distintos = extrator.termos(TEXTO)
+        self.assertEqual(distintos, 16)
+        # imagens aparece duas vezes e tem o menor df, íntimas não está na tabela
+        self.assertEqual([_[0] for _ in termos][:3], ['imagens', 'divulgar', 'rede'])
+        self.assertNotIn('intimas', [_[0] for _ in termos])
+        self.assertEqual(len(termos), 12)
+        self.assertEqual(termos, sorted(termos, key=lambda _: -_[1]))
+        # unlike, max_doc_freq e min_comprimento
+        self.assertNotIn('imagens', [_[0] for _ in extrator.termos(TEXTO, excluir={'imagens'})[0]])
+        extrator = ExtratorTermos(TabelaDF(DF, 1000), max_doc_freq=0.5, min_comprimento=3)
+        escolhidos = [_[0] for _ in extrator.termos(TEXTO)[0]]
+        self.assertFalse({'o', 'a', 'ao', 'em', 'sem'} & set(escolhidos))
+        # sem tabela: frequência no texto
+        self.assertEqual(ExtratorTermos().termos('dano dano moral')[0], [('dano', 2.0), ('moral', 1.0)])
+        for distintos, esperado in TESTES_ADAPTATIVOS:
+            with self.subTest(f'Adaptativos: {distintos}'):
+                self.assertEqual(ExtratorTermos().parametros_adaptativos(distintos), esperado)
+        with self.assertRaises(ValueError):
+            ExtratorTermos(modo='outro')
+
+    def teste_3_queries(self):
+        tabela = TabelaDF(DF, 1000)
+        mlt = ExtratorTermos(tabela).as_query(TEXTO, ['danos morais'], 'texto')['query']['more_like_this']
+        termos = mlt['like'].split(' ')
+        self.assertEqual(termos[:3], ['imagens', 'divulgar', 'rede'])
+        self.assertFalse({'danos', 'morais'} & set(termos))
+        self.assertEqual((mlt['unlike'], mlt['max_query_terms'], mlt['fields']), (['danos morais'], len(termos), ['texto']))
+        should = ExtratorTermos(tabela, modo='should').as_query(TEXTO, [], 'texto')['query']['bool']
+        self.assertEqual(should['should'][0], {'term': {'texto': {'value': 'imagens', 'boost': 1.0}}})
+        self.assertTrue(all(0 < _['term']['texto']['boost'] <= 1 for _ in should['should']))
+        self.assertEqual(should['minimum_should_match'], '75%')
+        campos = ExtratorTermos(tabela, modo='should').as_query('imagens', [], ['texto', 'ementa'])['query']['bool']
+        self.assertEqual(campos['should'], [{'bool': {'should': [{'term': {'texto': {'value': 'imagens', 'boost': 1.0}}},
+                                                                 {'term': {'ementa': {'value': 'imagens', 'boost': 1.0}}}]}}])
+        self.assertEqual(campos['minimum_should_match'], '100%')
+        self.assertEqual(ExtratorTermos(tabela).as_query('termos desconhecidos', [], 'texto'), {'query': {'match_none': {}}})
+
+    def teste_4_pesquisa(self):
+        tabela = TabelaDF(DF, 1000)
+        extrator = ExtratorTermos(tabela)
+        pe = PesquisaElasticFacil(f'contém: {TEXTO}', termos_chave=extrator)
+        self.assertEqual(pe.criterios_elastic, extrator.as_query(TEXTO, [], 'texto'))
+        self.assertNotEqual(PesquisaElasticFacil(f'contém: {TEXTO}').criterios_elastic, pe.criterios_elastic)
+        # outros critérios não usam o extrator
+        pe = PesquisaElasticFacil(':dano E moral', termos_chave=extrator)
+        self.assertEqual(pe.criterios_elastic, PesquisaElasticFacil(':dano E moral').criterios_elastic)
+        # grupos: apenas o campo texto padrão
+        campos = {'texto': '', 'ementa': ''}
+        grupos = GruposPesquisaElasticFacil(f'.texto.(contém: {TEXTO}) .ementa.(contém: imagens divulgar)',
+                                            campos_disponiveis=campos, termos_chave=ExtratorTermos(tabela, modo='should'))
+        self.assertIn('"boost": 1.0', str(grupos.as_query()).replace("'", '"'))
+        self.assertIn('more_like_this', str(grupos.as_query()))
+        # cache: chave com o modo e a versão da tabela
+        cache = CacheQueriesElastic()
+        a = cache.get_pesquisa(f'contém: {TEXTO}', termos_chave=extrator)
+        self.assertIs(cache.get_pesquisa(f'contém: {TEXTO}', termos_chave=extrator), a)
+        self.assertIsNot(cache.get_pesquisa(f'contém: {TEXTO}'), a)
+        self.assertIsNot(cache.get_pesquisa(f'contém: {TEXTO}', termos_chave=ExtratorTermos(tabela, modo='should')), a)
+        tabela.atualizar_de_agregacao(AGREGACAO)
+        self.assertIsNot(cache.get_pesquisa(f'contém: {TEXTO}', termos_chave=extrator), a)
+
+if __name__ == '__main__':
+    unittest.main(buffer=True, failfast = True)